@@ -6,10 +6,12 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtGui import QFont, QColor, QPalette, QIntValidator, QAction, QIcon
 from PyQt6.QtCore import Qt, QProcess, pyqtSignal, QSize
-from pymongo import MongoClient
+from database import get_db, close_client
+from repository import Repository
+from schema import bootstrap
 from timetable_logic import TimetableDialog
 from time_table_ui import Timetable
-from timetable_logic import TimetableGenerator
+from timetable_logic import TimetableGenerator, parse_cohort
 
 class ClickableFrame(QFrame):
     clicked = pyqtSignal(int, int, int, str)
@@ -70,13 +72,13 @@ class ViewTimetableTab(QWidget):
         self.time_layout = QVBoxLayout()
         self.setLayout(self.time_layout)
         self.db = self.connectDB()
+        self.repository = Repository(self.db)
         # List to store tuples of (layout, year, semester, batch, specialization)
         self.timetable_layouts = []
         self.createTimetableBoxes()
 
     def connectDB(self):
-        client = MongoClient("mongodb://localhost:27017/")
-        return client["timetable_db"]
+        return get_db()
 
     def createTimetableBoxes(self):
         vbox = QVBoxLayout()
@@ -84,14 +86,10 @@ class ViewTimetableTab(QWidget):
         vbox.setContentsMargins(10, 10, 10, 10)
 
         # Fetch timetables from the database
-        timetables = list(self.db["timetable"].find())
+        timetables = self.repository.timetable_keys()
         print(f"Fetched timetables: {timetables}")  # Debug output
 
-        for entry in timetables:
-            year = entry["year"]
-            semester = entry["semester"]
-            batch = entry["batch"]
-            specialization = entry.get("specialization", "None")
+        for year, semester, batch, specialization in timetables:
 
             # Create a horizontal layout for each timetable entry
             entry_layout = QHBoxLayout()
@@ -472,8 +470,9 @@ class TimetableManager(QWidget):
                 """)
 
     def connectDB(self):
-        self.client = MongoClient("mongodb://localhost:27017/")
-        self.db = self.client["timetable_db"]
+        self.db = get_db()
+        bootstrap(self.db)
+        self.repository = Repository(self.db)
         self.room_collection = self.db["rooms"]
         self.lab_collection = self.db["labs"]
         self.strength_collection = self.db["strength_details"]
@@ -787,6 +786,9 @@ class TimetableManager(QWidget):
             if inserted_count:
                 QMessageBox.information(dialog, "Success", f"Subject '{new_subject}' updated successfully ({inserted_count} types)!")
                 self.loadSubjects()
+                self.repairTimetables(
+                    [(year, semester, specialization), (new_year, new_semester, new_specialization)], new_subject
+                )
                 dialog.accept()
             else:
                 QMessageBox.information(dialog, "Info", "No new subject types were added.")
@@ -798,6 +800,27 @@ class TimetableManager(QWidget):
         dialog.setLayout(layout)
         dialog.exec()
 
+    def repairTimetables(self, cohorts, subject_name):
+        """Patch the stored timetables of the given (year, semester, specialization) cohorts after an edit"""
+        repaired_cohorts = set()
+        for year, semester, specialization in cohorts:
+            cohort = parse_cohort(year, semester, specialization)
+            if cohort is None or cohort in repaired_cohorts:
+                continue
+            repaired_cohorts.add(cohort)
+            try:
+                generator = TimetableGenerator(*cohort, db=self.db)
+                repaired = generator.repair_timetable(subject_name)
+                if repaired:
+                    self.view_timetable_tab.refreshTimetable()
+            except Exception as e:
+                print(f"Error repairing timetable: {e}")
+                QMessageBox.warning(
+                    self, "Timetable Not Repaired",
+                    f"The stored timetable for {year} - {semester} could not be repaired:\n{e}\n"
+                    "Please regenerate it."
+                )
+
     def updateSemesterDropdown(self, selected_year):
         semesters = self.year_semester_map.get(selected_year, [])
         self.semester_dropdown.clear()
@@ -889,74 +912,39 @@ class TimetableManager(QWidget):
     def loadSubjects(self):
         self.subject_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.subject_table.setRowCount(0)
-        subjects = list(self.subject_collection.find())
-
-        added_keys = set()
-
-        for subject in subjects:
-            year = subject["year"]
-            semester = subject["semester"]
-            specialization = subject.get("specialization", "")
-            subject_name = subject["subject"]
-
-            year_text = year
-            if specialization:
-                year_text += f" ({specialization})"
-
-            key = (subject_name, year, semester, specialization)
-            if key in added_keys:
-                continue
+        for row in self.repository.subject_rows():
+            year_text = row.year
+            if row.specialization:
+                year_text += f" ({row.specialization})"
 
-            types_cursor = self.subject_collection.find({
-                "subject": subject_name,
-                "year": year,
-                "semester": semester,
-                "specialization": specialization
-            })
-
-            theory_names = []
-            lab_tut_names = []
-            theory_types = []
-            lab_tut_types = []
-
-            for sub in types_cursor:
-                if sub["type"] == "Theory":
-                    theory_names.append(sub.get("faculty", ""))
-                    theory_types.append("Theory")
-                else:
-                    lab_tut_names.append(sub.get("ta", ""))
-                    lab_tut_types.append(sub["type"])
-
-            if theory_types:
+            if row.theory_types:
                 self.subject_table.insertRow(self.subject_table.rowCount())
                 values = [
-                    subject_name,
-                    ", ".join(set(theory_names)),
+                    row.subject,
+                    ", ".join(row.theory_faculty),
                     year_text,
-                    semester,
-                    ", ".join(theory_types)
+                    row.semester,
+                    ", ".join(row.theory_types)
                 ]
                 for col, value in enumerate(values):
                     item = QTableWidgetItem(value)
                     item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
                     self.subject_table.setItem(self.subject_table.rowCount() - 1, col, item)
 
-            if lab_tut_types:
+            if row.lab_tutorial_types:
                 self.subject_table.insertRow(self.subject_table.rowCount())
                 values = [
-                    subject_name,
-                    ", ".join(set(lab_tut_names)),
+                    row.subject,
+                    ", ".join(row.lab_tutorial_tas),
                     year_text,
-                    semester,
-                    ", ".join(lab_tut_types)
+                    row.semester,
+                    ", ".join(row.lab_tutorial_types)
                 ]
                 for col, value in enumerate(values):
                     item = QTableWidgetItem(value)
                     item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
                     self.subject_table.setItem(self.subject_table.rowCount() - 1, col, item)
 
-            added_keys.add(key)
-
     def deleteSubject(self):
         row = self.subject_table.currentRow()
         if row == -1:
@@ -1144,6 +1132,7 @@ class TimetableManager(QWidget):
                     "specialization": None if new_specialization == "None" else str(new_specialization)
                 }}
             )
+            self.repository.invalidate("strength_details")
 
             if result.modified_count > 0:
                 QMessageBox.information(dialog, "Success", f"Strength updated for {new_year} year!")
@@ -1176,6 +1165,7 @@ class TimetableManager(QWidget):
             "students": students,
             "specialization": None if specialization == "None" else specialization
         })
+        self.repository.invalidate("strength_details")
 
         QMessageBox.information(self, "Success", f"Strength added for {year} year!")
         self.year_input.clear()
@@ -1187,22 +1177,22 @@ class TimetableManager(QWidget):
     def loadStrengthData(self):
         self.strength_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.strength_table.setRowCount(0)
-        for row, strength in enumerate(self.strength_collection.find()):
+        for row, strength in enumerate(self.repository.strength_details()):
             self.strength_table.insertRow(row)
 
-            year_item = QTableWidgetItem(str(strength["year"]))
+            year_item = QTableWidgetItem(str(strength.year))
             year_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.strength_table.setItem(row, 0, year_item)
 
-            section_item = QTableWidgetItem(str(strength["sections"]))
+            section_item = QTableWidgetItem(str(strength.sections))
             section_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.strength_table.setItem(row, 1, section_item)
 
-            student_item = QTableWidgetItem(str(strength["students"]))
+            student_item = QTableWidgetItem(str(strength.students))
             student_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.strength_table.setItem(row, 2, student_item)
 
-            spec_text = str(strength.get("specialization", ""))
+            spec_text = str(strength.specialization)
             spec_item = QTableWidgetItem(spec_text)
             spec_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.strength_table.setItem(row, 3, spec_item)
@@ -1225,6 +1215,7 @@ class TimetableManager(QWidget):
                 "year": year,
                 "specialization": specialization if specialization else None
             })
+            self.repository.invalidate("strength_details")
             self.loadStrengthData()
             QMessageBox.information(self, "Success", f"Strength record for {year} year deleted!")
 
@@ -1352,6 +1343,7 @@ class TimetableManager(QWidget):
                     "capacity": int(new_capacity)
                 }}
             )
+            self.repository.invalidate("rooms")
 
             QMessageBox.information(dialog, "Success", f"Room {new_room_no} updated successfully!")
             self.loadRooms()
@@ -1372,6 +1364,7 @@ class TimetableManager(QWidget):
             return
 
         self.room_collection.insert_one({"room_no": room_no, "capacity": int(capacity)})
+        self.repository.invalidate("rooms")
         QMessageBox.information(self, "Success", f"Room {room_no} added successfully!")
 
         self.room_no.clear()
@@ -1383,14 +1376,14 @@ class TimetableManager(QWidget):
         self.room_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.room_table.setRowCount(0)
 
-        for row, room in enumerate(self.room_collection.find()):
+        for row, room in enumerate(self.repository.rooms()):
             self.room_table.insertRow(row)
 
-            room_item = QTableWidgetItem(room["room_no"])
+            room_item = QTableWidgetItem(room.room_no)
             room_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.room_table.setItem(row, 0, room_item)
 
-            capacity_item = QTableWidgetItem(str(room["capacity"]))
+            capacity_item = QTableWidgetItem(str(room.capacity))
             capacity_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.room_table.setItem(row, 1, capacity_item)
 
@@ -1414,6 +1407,7 @@ class TimetableManager(QWidget):
                 return
 
             self.room_collection.delete_one({"room_no": room_no})
+            self.repository.invalidate("rooms")
             QMessageBox.information(self, "Success", f"Room {room_no} deleted successfully!")
             self.loadRooms()
         except Exception as e:
@@ -1543,6 +1537,7 @@ class TimetableManager(QWidget):
                     "strength": int(new_strength)
                 }}
             )
+            self.repository.invalidate("labs")
 
             QMessageBox.information(dialog, "Success", f"Lab {new_lab_no} updated successfully!")
             self.loadLabs()
@@ -1563,6 +1558,7 @@ class TimetableManager(QWidget):
             return
 
         self.lab_collection.insert_one({"lab_no": lab, "strength": int(strength)})
+        self.repository.invalidate("labs")
         QMessageBox.information(self, "Success", f"Lab {lab} added successfully!")
         
         self.lab_no.clear()
@@ -1574,14 +1570,14 @@ class TimetableManager(QWidget):
         self.lab_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.lab_table.setRowCount(0)
 
-        for row, lab in enumerate(self.lab_collection.find()):
+        for row, lab in enumerate(self.repository.labs()):
             self.lab_table.insertRow(row)
 
-            lab_item = QTableWidgetItem(lab["lab_no"])
+            lab_item = QTableWidgetItem(lab.lab_no)
             lab_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.lab_table.setItem(row, 0, lab_item)
 
-            capacity_item = QTableWidgetItem(str(lab["strength"]))
+            capacity_item = QTableWidgetItem(str(lab.strength))
             capacity_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
             self.lab_table.setItem(row, 1, capacity_item)
 
@@ -1607,6 +1603,7 @@ class TimetableManager(QWidget):
                 return
 
             delete_result = self.lab_collection.delete_one({"lab_no": lab_no})
+            self.repository.invalidate("labs")
 
             if delete_result.deleted_count > 0:
                 self.loadLabs()
@@ -1621,4 +1618,5 @@ if __name__ == "__main__":
     app = QApplication([])
     window = TimetableManager()
     window.show()
-    app.exec()
\ No newline at end of file
+    app.exec()
+    close_client()
\ No newline at end of file
@@ -0,0 +1,202 @@
+import math
+import random
+import time
+
+from occupancy import DAYS, TIME_SLOTS
+from progress import ProgressEvent
+from scoring import WEIGHTS, WeekScore, back_to_back_pairs, instructor_back_to_back
+from solver import LUNCH_SLOT_INDEX
+
+
+class ScheduleAnnealer:
+    """Simulated-annealing improvement pass over generated weekly schedules.
+
+    Each step either moves one session (a lab block, tutorial, lecture or office
+    hour) of a random batch to free slots, or swaps two sessions of equal length.
+    A step is only made if the moved sessions still satisfy the solver's hard
+    constraints (free batch slots, tracked instructor free, one lab per day, no
+    lab across lunch, no lab/tutorial on a day with that subject's lecture, one
+    lecture of a subject per day). The cost (scoring.WeekScore per batch plus
+    tracked instructors' back-to-back pairs) is updated incrementally as sessions
+    are taken and put back, steps are accepted by the Metropolis rule, and the
+    best state seen is kept.
+    """
+
+    def __init__(self, faculty_ta_to_track, faculty_ta_occupancy, seed=None, iterations=20000, time_budget=None,
+                 start_temperature=2.0, end_temperature=0.01, should_stop=None, progress=None):
+        self.faculty_ta_to_track = faculty_ta_to_track
+        self.faculty_ta_occupancy = faculty_ta_occupancy
+        self.rng = random.Random(seed)
+        self.iterations = iterations
+        self.time_budget = time_budget  # seconds; stops early when reached
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+        self.should_stop = should_stop  # callable; stops early, keeping the best state so far
+        self.progress = progress  # callable receiving ProgressEvent objects
+
+    def improve(self, schedules):
+        """Anneal the schedules in place, re-booking tracked instructors; return (initial cost, final cost)."""
+        if not schedules:
+            return 0, 0
+        self.scores = {id(weekly_schedule): WeekScore(weekly_schedule) for weekly_schedule in schedules}
+        self.cost = sum(score.total() for score in self.scores.values()) + WEIGHTS["back_to_back"] * (
+            instructor_back_to_back(self.faculty_ta_occupancy, self.faculty_ta_to_track)
+        )
+        initial = self.cost
+        best_cost, best = self.cost, self._snapshot(schedules)
+        deadline = None if self.time_budget is None else time.monotonic() + self.time_budget
+        ratio = self.end_temperature / self.start_temperature
+
+        for step in range(self.iterations):
+            if step % 256 == 0:
+                if self.progress is not None:
+                    self.progress(ProgressEvent("anneal", placed=step, total=self.iterations, best_score=best_cost))
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                if self.should_stop is not None and self.should_stop():
+                    break
+            temperature = self.start_temperature * ratio ** (step / self.iterations)
+            before = self.cost
+            undo = self._random_move(self.rng.choice(schedules))
+            if undo is None:
+                continue
+            delta = self.cost - before
+            if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+                if self.cost < best_cost - 1e-9:
+                    best_cost, best = self.cost, self._snapshot(schedules)
+            else:
+                undo()
+
+        self._restore(schedules, best)
+        return initial, best_cost
+
+    def _snapshot(self, schedules):
+        weeks = [{day: dict(slots) for day, slots in weekly_schedule.items()} for weekly_schedule in schedules]
+        return weeks, list(self.faculty_ta_occupancy.masks)
+
+    def _restore(self, schedules, snapshot):
+        weeks, masks = snapshot
+        for weekly_schedule, week in zip(schedules, weeks):
+            for day, slots in week.items():
+                weekly_schedule[day].update(slots)
+        self.faculty_ta_occupancy.masks[:len(masks)] = masks
+
+    def _random_block(self, weekly_schedule):
+        """A random movable session as (day, slot, length), or None when the sampled slot holds none."""
+        d = self.rng.randrange(len(DAYS))
+        s = self.rng.randrange(len(TIME_SLOTS))
+        slots = weekly_schedule[DAYS[d]]
+        cell = slots[TIME_SLOTS[s]]
+        if not cell:
+            return None
+        if cell["type"] != "Lab":
+            return d, s, 1
+        # Normalise to the first slot of the two-slot lab block
+        for start in (s - 1, s):
+            if 0 <= start < len(TIME_SLOTS) - 1:
+                first, second = slots[TIME_SLOTS[start]], slots[TIME_SLOTS[start + 1]]
+                if (first and second and first["type"] == second["type"] == "Lab"
+                        and first["subject"] == second["subject"] and (first is cell or second is cell)):
+                    return d, start, 2
+        return None  # a half lab block stays where it is
+
+    def _take(self, weekly_schedule, block):
+        d, s, length = block
+        slots = weekly_schedule[DAYS[d]]
+        cells = [slots[TIME_SLOTS[s + k]] for k in range(length)]
+        for k in range(length):
+            slots[TIME_SLOTS[s + k]] = None
+        self._rescore(weekly_schedule, cells, d, s, False)
+        return cells
+
+    def _put(self, weekly_schedule, cells, d, s):
+        slots = weekly_schedule[DAYS[d]]
+        for k, cell in enumerate(cells):
+            slots[TIME_SLOTS[s + k]] = cell
+        self._rescore(weekly_schedule, cells, d, s, True)
+
+    def _rescore(self, weekly_schedule, cells, d, s, add):
+        """Update the week score, the instructor booking and self.cost for one taken or put session."""
+        score = self.scores[id(weekly_schedule)]
+        self.cost -= score.total()
+        if add:
+            score.add(cells[0], d, s, len(cells))
+        else:
+            score.remove(cells[0], d, s, len(cells))
+        self.cost += score.total()
+
+        instructor = cells[0].get("instructor")
+        if instructor in self.faculty_ta_to_track:
+            occupancy = self.faculty_ta_occupancy
+            self.cost -= WEIGHTS["back_to_back"] * back_to_back_pairs(occupancy.mask(instructor), d)
+            if add:
+                occupancy.book(instructor, d, s, len(cells))
+            else:
+                occupancy.release(instructor, d, s, len(cells))
+            self.cost += WEIGHTS["back_to_back"] * back_to_back_pairs(occupancy.mask(instructor), d)
+
+    def _fits(self, weekly_schedule, cells, d, s):
+        """Hard-constraint check for putting `cells` at (d, s); the cells themselves are ignored if still placed."""
+        length = len(cells)
+        if s + length > len(TIME_SLOTS):
+            return False
+        session = cells[0]
+        if session["type"] == "Lab" and s == LUNCH_SLOT_INDEX:
+            return False
+        slots = weekly_schedule[DAYS[d]]
+        if any(slots[TIME_SLOTS[s + k]] for k in range(length)):
+            return False
+        instructor = session.get("instructor")
+        if instructor in self.faculty_ta_to_track and not self.faculty_ta_occupancy.is_free(instructor, d, s, length):
+            return False
+        for other in slots.values():
+            if not other or other["type"] == "Office" or any(other is cell for cell in cells):
+                continue
+            if session["type"] == "Lab" and other["type"] == "Lab":
+                return False
+            if other["subject"] == session["subject"] and "Theory" in (session["type"], other["type"]):
+                return False
+        return True
+
+    def _random_move(self, weekly_schedule):
+        """Try one random move or swap; return a callable that undoes it, or None if it was not legal."""
+        first = self._random_block(weekly_schedule)
+        if first is None:
+            return None
+        d, s, length = first
+
+        if self.rng.random() < 0.5:
+            # Move to free slots; checked before anything is taken, so rejected moves cost no rescoring.
+            # The target must not overlap the session's own slots, so its own booking cannot mask a clash.
+            target = (self.rng.randrange(len(DAYS)), self.rng.randrange(len(TIME_SLOTS) - length + 1))
+            slots = weekly_schedule[DAYS[d]]
+            cells = [slots[TIME_SLOTS[s + k]] for k in range(length)]
+            if not self._fits(weekly_schedule, cells, *target):
+                return None
+            self._put(weekly_schedule, self._take(weekly_schedule, first), *target)
+
+            def undo():
+                self._put(weekly_schedule, self._take(weekly_schedule, target + (length,)), d, s)
+            return undo
+
+        second = self._random_block(weekly_schedule)
+        if second is None or second == first or second[2] != length:
+            return None
+        d2, s2, _ = second
+        cells = self._take(weekly_schedule, first)
+        other_cells = self._take(weekly_schedule, second)
+        if self._fits(weekly_schedule, cells, d2, s2):
+            self._put(weekly_schedule, cells, d2, s2)
+            if self._fits(weekly_schedule, other_cells, d, s):
+                self._put(weekly_schedule, other_cells, d, s)
+
+                def undo():
+                    moved = self._take(weekly_schedule, (d2, s2, length))
+                    moved_other = self._take(weekly_schedule, first)
+                    self._put(weekly_schedule, moved, d, s)
+                    self._put(weekly_schedule, moved_other, d2, s2)
+                return undo
+            self._take(weekly_schedule, second)
+        self._put(weekly_schedule, cells, d, s)
+        self._put(weekly_schedule, other_cells, d2, s2)
+        return None
@@ -0,0 +1,242 @@
+import random
+
+from occupancy import DAYS, TIME_SLOTS, window_mask
+from progress import ProgressEvent
+from solver import TimetableSolver
+
+BACKENDS = {}  # engine name -> backend class
+
+
+def register_backend(name):
+    """Class decorator that makes a backend selectable as TimetableGenerator(engine=name)."""
+    def register(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return register
+
+
+def get_backend(name):
+    """A new instance of the backend registered under `name`; ValueError for unknown names."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown scheduling engine '{name}'; available: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name]()
+
+
+class SchedulingBackend:
+    """A scheduling algorithm selectable by name.
+
+    schedule() receives cohorts as (label, model, num_batches) tuples, where model
+    is the cohort's ProblemModel compiled against `faculty_ta_occupancy`, and
+    returns one list of weekly schedules ({day: {slot: session or None}}) per
+    cohort. Tracked instructors are booked into `faculty_ta_occupancy`. The
+    generator turns the weeks into timetable documents, so every backend
+    produces the same document shape. After a run, `complete` is False if the
+    backend stopped early (should_stop) and `summary` describes the run.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.complete = True
+        self.summary = ""
+
+    def schedule(self, cohorts, faculty_ta_to_track, faculty_ta_occupancy, seed=None, should_stop=None,
+                 progress=None):
+        raise NotImplementedError
+
+
+@register_backend("greedy")
+class GreedyBackend(SchedulingBackend):
+    """Randomised greedy placement (the original algorithm); may leave sessions unassigned."""
+
+    def schedule(self, cohorts, faculty_ta_to_track, faculty_ta_occupancy, seed=None, should_stop=None,
+                 progress=None):
+        if seed is not None:
+            random.seed(seed)
+        self.complete = True
+
+        def stop():
+            if should_stop is not None and should_stop():
+                self.complete = False
+            return not self.complete
+
+        results = [schedule_greedy(model, num_batches, faculty_ta_occupancy, label, stop, progress)
+                   for label, model, num_batches in cohorts]
+        self.summary = f"Greedy placement finished for {len(cohorts)} cohort(s)."
+        return results
+
+
+@register_backend("solver")
+class SolverBackend(SchedulingBackend):
+    """Constraint-propagation search (solver.TimetableSolver) over all cohorts jointly."""
+
+    def __init__(self, max_backtracks=20000):
+        super().__init__()
+        self.max_backtracks = max_backtracks
+
+    def schedule(self, cohorts, faculty_ta_to_track, faculty_ta_occupancy, seed=None, should_stop=None,
+                 progress=None):
+        solver = TimetableSolver.for_cohorts(cohorts, faculty_ta_to_track, faculty_ta_occupancy, seed=seed,
+                                             max_backtracks=self.max_backtracks, should_stop=should_stop,
+                                             progress=progress)
+        results = solver.solve_all()
+        self.complete = solver.complete
+        if solver.complete:
+            self.summary = f"Solver placed all sessions for {len(cohorts)} cohort(s) with {solver.backtracks} backtracks."
+        else:
+            self.summary = f"Solver was stopped after {solver.backtracks} backtracks; keeping its best partial placement."
+        return results
+
+
+def schedule_greedy(model, num_batches, faculty_ta_occupancy, label=None, should_stop=None, progress=None):
+    """Greedy weeks for one cohort's batches, drawing from the global `random` state."""
+    time_slots = TIME_SLOTS
+    days = DAYS
+    subject_names = model.subject_names
+    instructor_names = model.instructor_names
+    occupancy_ids = model.occupancy_ids
+    masks = faculty_ta_occupancy.masks
+    label_note = f", {label}" if label else ""
+    schedules = []
+
+    def busy(instructor_id, day_index, slot_index, length=1):
+        """True if a tracked instructor is booked anywhere in the window."""
+        occupancy_id = occupancy_ids[instructor_id]
+        return occupancy_id >= 0 and bool(masks[occupancy_id] & window_mask(day_index, slot_index, length))
+
+    def busy_or_adjacent(instructor_id, day_index, slot_index):
+        occupancy_id = occupancy_ids[instructor_id]
+        if occupancy_id < 0:
+            return False
+        first = slot_index - 1 if slot_index > 0 else slot_index
+        last = slot_index + 1 if slot_index + 1 < len(time_slots) else slot_index
+        return bool(masks[occupancy_id] & window_mask(day_index, first, last - first + 1))
+
+    def book(instructor_id, day_index, slot_index, length=1):
+        occupancy_id = occupancy_ids[instructor_id]
+        if occupancy_id >= 0:
+            masks[occupancy_id] |= window_mask(day_index, slot_index, length)
+
+    def session(subject_id, session_type, instructor_id):
+        return {
+            "subject": subject_names[subject_id],
+            "type": session_type,
+            "instructor": instructor_names[instructor_id]
+        }
+
+    for batch in range(1, num_batches + 1):
+        weekly_schedule = {day: {slot: None for slot in time_slots} for day in days}
+        if should_stop is not None and should_stop():
+            # Out of time: the remaining batches get empty weeks, which count as unassigned sessions, and
+            # complete is False, so the generator reports the result as incomplete instead of saving it
+            print(f"Greedy placement stopped before batch {batch}{label_note}.")
+            schedules.append(weekly_schedule)
+            continue
+        if progress is not None:
+            progress(ProgressEvent("schedule", batch=batch, placed=batch - 1, total=num_batches))
+        grid = [[False] * len(time_slots) for _ in days]  # occupied cells
+        day_subjects = [set() for _ in days]  # subject ids placed on each day
+        lab_days = set()
+
+        for subject_id, ta_id in model.lab_sessions:
+            assigned = False
+            attempts = 0
+            while not assigned and attempts < 100:
+                day_index = random.randrange(len(days))
+                slot_index = random.randint(0, len(time_slots) - 2)
+
+                if (slot_index != 2 and
+                    not grid[day_index][slot_index] and
+                    not grid[day_index][slot_index + 1] and
+                    not busy(ta_id, day_index, slot_index, 2) and
+                    day_index not in lab_days):
+
+                    day = days[day_index]
+                    weekly_schedule[day][time_slots[slot_index]] = session(subject_id, "Lab", ta_id)
+                    weekly_schedule[day][time_slots[slot_index + 1]] = session(subject_id, "Lab", ta_id)
+                    grid[day_index][slot_index] = grid[day_index][slot_index + 1] = True
+                    day_subjects[day_index].add(subject_id)
+                    lab_days.add(day_index)
+                    book(ta_id, day_index, slot_index, 2)
+                    assigned = True
+                attempts += 1
+
+            if not assigned:
+                print(f"Warning: Could not assign lab {subject_names[subject_id]} for batch {batch}{label_note}.")
+
+        for subject_id, ta_id in model.tutorial_sessions:
+            assigned = False
+            attempts = 0
+            while not assigned and attempts < 100:
+                day_index = random.randrange(len(days))
+                slot_index = random.randrange(len(time_slots))
+
+                if not grid[day_index][slot_index] and not busy(ta_id, day_index, slot_index):
+                    weekly_schedule[days[day_index]][time_slots[slot_index]] = session(subject_id, "Tutorial", ta_id)
+                    grid[day_index][slot_index] = True
+                    day_subjects[day_index].add(subject_id)
+                    book(ta_id, day_index, slot_index)
+                    assigned = True
+                attempts += 1
+
+            if not assigned:
+                print(f"Warning: Could not assign tutorial {subject_names[subject_id]} for batch {batch}{label_note}.")
+
+        theory_sessions = model.theory_sessions
+        subject_counts = [0] * len(subject_names)
+
+        for day_index, day in enumerate(days):
+            lecture_count = 0
+            for slot_index, slot in enumerate(time_slots):
+                if not grid[day_index][slot_index]:
+                    available_subjects = [
+                        (subject_id, faculty_id) for subject_id, faculty_id in theory_sessions
+                        if subject_counts[subject_id] < 3 and
+                        subject_id not in day_subjects[day_index] and
+                        not busy_or_adjacent(faculty_id, day_index, slot_index)
+                    ]
+
+                    if available_subjects and lecture_count < 3:
+                        subject_id, faculty_id = random.choice(available_subjects)
+                        weekly_schedule[day][slot] = session(subject_id, "Theory", faculty_id)
+                        grid[day_index][slot_index] = True
+                        day_subjects[day_index].add(subject_id)
+                        subject_counts[subject_id] += 1
+                        lecture_count += 1
+                        book(faculty_id, day_index, slot_index)
+                    elif lecture_count >= 3:
+                        weekly_schedule[day][slot] = {"subject": "Office Hour", "type": "Office"}
+                        grid[day_index][slot_index] = True
+
+            if lecture_count < 3:
+                print(f"Warning: Less than 3 lectures assigned on {day} for batch {batch}{label_note}.")
+
+        for day_index, day in enumerate(days):
+            if not any(grid[day_index]):
+                slot_index = random.randrange(len(time_slots))
+                available_subjects = [
+                    (subject_id, faculty_id) for subject_id, faculty_id in theory_sessions
+                    if subject_counts[subject_id] < 3 and not busy(faculty_id, day_index, slot_index)
+                ]
+                if available_subjects:
+                    subject_id, faculty_id = random.choice(available_subjects)
+                    weekly_schedule[day][time_slots[slot_index]] = session(subject_id, "Theory", faculty_id)
+                    grid[day_index][slot_index] = True
+                    subject_counts[subject_id] += 1
+                    book(faculty_id, day_index, slot_index)
+
+        for day_index, day in enumerate(days):
+            for slot_index in range(3, len(time_slots)):
+                if not grid[day_index][slot_index]:
+                    for subject_id, faculty_id in theory_sessions:
+                        if subject_counts[subject_id] < 3 and not busy(faculty_id, day_index, slot_index):
+                            weekly_schedule[day][time_slots[slot_index]] = session(subject_id, "Theory", faculty_id)
+                            grid[day_index][slot_index] = True
+                            subject_counts[subject_id] += 1
+                            book(faculty_id, day_index, slot_index)
+                            break
+
+        schedules.append(weekly_schedule)
+
+    return schedules
@@ -0,0 +1,129 @@
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+from backends import BACKENDS
+from database import get_db
+from schema import report_index_usage
+from storage import EmbeddedClient, copy_database
+from solver import SchedulingError
+from timetable_logic import TimetableGenerator, InstitutionGenerator, parse_cohort
+from scoring import evaluate_timetables
+
+
+def benchmark_backend(generator, inputs, engine, seed, measure_memory=True):
+    """Run one attempt of `engine` on loaded inputs; return a result row (nothing is written to the database).
+
+    The timed run is untraced; peak memory comes from a second, traced run of
+    the same seed because tracemalloc slows allocation-heavy code considerably.
+    """
+    generator.engine = engine
+    row = {"dataset": generator.label(), "engine": engine, "seed": seed, "error": None}
+    start = time.perf_counter()
+    try:
+        # The attempts print every step; keep the benchmark output to the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            timetables, faculty_ta_occupancy, _, _ = generator.run_attempt(inputs, seed)
+    except SchedulingError as e:
+        timetables, row["error"] = None, str(e)
+    row["seconds"] = time.perf_counter() - start
+
+    row["peak_kib"] = float("nan")
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                generator.run_attempt(inputs, seed)
+        except SchedulingError:
+            pass
+        row["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    if timetables is not None:
+        row.update(evaluate_timetables(timetables, inputs["subjects"], faculty_ta_occupancy,
+                                       inputs["faculty_ta_to_track"], inputs["rooms"], inputs["labs"]))
+    return row
+
+
+def run_benchmark(datasets=None, engines=None, seeds=(1, 2, 3), db=None, room_assignment="matching",
+                  measure_memory=True):
+    """Run every engine on every dataset with the same seeds and inputs; return one row per run.
+
+    `datasets` is a list of (year, semester, specialization) generator arguments
+    (default: every cohort found in the subjects) and `engines` a list of backend
+    names (default: all registered). Each run reports its runtime, peak traced
+    memory and the scoring.evaluate_timetables terms, or the error when the
+    engine could not produce a timetable.
+    """
+    engines = engines or sorted(BACKENDS)
+    if datasets is None:
+        institution = InstitutionGenerator(db=db)
+        institution.load_dataset()
+        db = institution.db
+        datasets = [(g.year, g.semester, g.specialization) for g in institution.cohort_generators()]
+
+    rows = []
+    for year, semester, specialization in datasets:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = TimetableGenerator(year, semester, specialization, room_assignment=room_assignment, db=db,
+                                           use_cache=False)
+            inputs = generator.load_inputs()
+        if inputs is None:
+            print(f"Skipping {generator.label()}: no subjects or strength details.")
+            continue
+        for engine in engines:
+            for seed in seeds:
+                rows.append(benchmark_backend(generator, inputs, engine, seed, measure_memory))
+    return rows
+
+
+def _mean(rows, key):
+    return sum(row[key] for row in rows) / len(rows) if rows else float("nan")
+
+
+def summarize(rows):
+    """Per (dataset, engine) averages over the seeds, as printable table lines."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["dataset"], row["engine"]), []).append(row)
+
+    lines = [f"{'dataset':<28} {'engine':<10} {'runs':>4} {'failed':>6} {'seconds':>8} {'peak KiB':>9} "
+             f"{'unassigned':>10} {'no room':>7} {'penalty':>8}"]
+    for (dataset, engine), group in groups.items():
+        ok = [row for row in group if row["error"] is None]
+        lines.append(f"{dataset:<28} {engine:<10} {len(group):>4} {len(group) - len(ok):>6} "
+                     f"{_mean(group, 'seconds'):>8.3f} {_mean(group, 'peak_kib'):>9.0f} "
+                     f"{_mean(ok, 'unassigned'):>10.1f} {_mean(ok, 'room_failures'):>7.1f} {_mean(ok, 'total'):>8.1f}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the registered scheduling engines on the same datasets.")
+    parser.add_argument("--engine", action="append", choices=sorted(BACKENDS),
+                        help="engine to run (repeatable, default: all)")
+    parser.add_argument("--dataset", action="append", nargs="+", metavar="COHORT",
+                        help='cohort as shown in the UI, e.g. --dataset "3rd Year" "Semester 5" AI (repeatable)')
+    parser.add_argument("--seeds", type=int, default=3, help="seeded runs per engine and dataset")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="copy the configured database into an in-memory store first, so database I/O is not timed")
+    parser.add_argument("--index-usage", action="store_true",
+                        help="afterwards, print how often each index has served a query (MongoDB $indexStats)")
+    args = parser.parse_args()
+
+    db = None
+    if args.in_memory:
+        db = EmbeddedClient()["timetable_db"]
+        copy_database(get_db(), db, ["Subject_collection", "strength_details", "rooms", "labs", "timetable",
+                                     "reservations"])
+
+    datasets = None
+    if args.dataset:
+        datasets = [parse_cohort(d[0], d[1], d[2] if len(d) > 2 else None) for d in args.dataset]
+        if None in datasets:
+            parser.error('datasets look like "1st Year" "Semester 1" [specialization]')
+    for line in summarize(run_benchmark(datasets, args.engine, seeds=range(1, args.seeds + 1), db=db)):
+        print(line)
+    if args.index_usage:
+        report_index_usage(db if db is not None else get_db())
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+
+import pymongo
+
+from storage import EmbeddedClient
+
+BACKENDS = ("mongo", "sqlite", "memory")
+DEFAULT_CONFIG = {
+    "backend": "mongo",  # "mongo" (MongoDB server), "sqlite" (embedded, one file) or "memory" (embedded, not saved)
+    "uri": "mongodb://localhost:27017/",
+    "database": "timetable_db",
+    "max_pool_size": 20,
+    "sqlite_path": os.path.join(os.path.dirname(os.path.abspath(__file__)), "timetable.sqlite3")
+}
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_config.json")
+
+_client = None
+_config = None
+_lock = threading.Lock()
+
+
+def load_config():
+    """Connection settings: the defaults, then db_config.json (or the file named by
+    TIMETABLE_DB_CONFIG), then the TIMETABLE_DB_BACKEND, TIMETABLE_MONGO_URI,
+    TIMETABLE_DB_NAME, TIMETABLE_MONGO_POOL_SIZE and TIMETABLE_SQLITE_PATH
+    environment variables."""
+    config = dict(DEFAULT_CONFIG)
+    path = os.environ.get("TIMETABLE_DB_CONFIG", CONFIG_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error reading database config {path}: {e}")
+
+    config["backend"] = os.environ.get("TIMETABLE_DB_BACKEND", config["backend"])
+    config["uri"] = os.environ.get("TIMETABLE_MONGO_URI", config["uri"])
+    config["database"] = os.environ.get("TIMETABLE_DB_NAME", config["database"])
+    config["max_pool_size"] = int(os.environ.get("TIMETABLE_MONGO_POOL_SIZE", config["max_pool_size"]))
+    config["sqlite_path"] = os.environ.get("TIMETABLE_SQLITE_PATH", config["sqlite_path"])
+    if config["backend"] not in BACKENDS:
+        raise ValueError(f"Unknown database backend {config['backend']!r}; choose one of {', '.join(BACKENDS)}")
+    return config
+
+
+def get_client():
+    """The process-wide client, created on first use: a MongoClient with the configured URI and pool
+    size, or a storage.EmbeddedClient for the "sqlite" and "memory" backends. The "sqlite" file
+    is locked to one process at a time; a second one gets ConnectionFailure."""
+    global _client, _config
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _config = load_config()
+                if _config["backend"] == "sqlite":
+                    print(f"Opening embedded database {_config['sqlite_path']}")
+                    _client = EmbeddedClient(_config["sqlite_path"])
+                elif _config["backend"] == "memory":
+                    print("Using an in-memory database (nothing is saved)")
+                    _client = EmbeddedClient()
+                else:
+                    print(f"Connecting to MongoDB (pool size {_config['max_pool_size']})")
+                    _client = pymongo.MongoClient(_config["uri"], maxPoolSize=_config["max_pool_size"])
+    return _client
+
+
+def get_db():
+    """The application database on the shared client."""
+    client = get_client()
+    return client[_config["database"]]
+
+
+def close_client():
+    """Close the shared client (on application exit); the next get_client() reconnects."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,94 @@
+from occupancy import DAYS, SLOTS_PER_DAY, WEEK_BITS, window_mask
+from solver import SchedulingError, LUNCH_SLOT_INDEX, LECTURES_PER_SUBJECT
+
+
+class InfeasibleInputError(SchedulingError):
+    """Raised before scheduling when capacity or load bounds prove the inputs cannot fit."""
+
+
+def free_slots(mask):
+    """Number of free slots in a week mask."""
+    return WEEK_BITS - bin(mask & ((1 << WEEK_BITS) - 1)).count("1")
+
+
+def free_lab_windows(mask):
+    """Most disjoint two-slot lab windows (never across lunch) that fit in the free slots of a week mask."""
+    windows = 0
+    for d in range(len(DAYS)):
+        s = 0
+        while s < SLOTS_PER_DAY - 1:
+            if s != LUNCH_SLOT_INDEX and not mask & window_mask(d, s, 2):
+                windows += 1
+                s += 2
+            else:
+                s += 1
+    return windows
+
+
+def feasibility_problems(cohorts, faculty_ta_occupancy, room_occupancy, lab_occupancy):
+    """Necessary conditions for scheduling cohorts; returns one message per violated bound (empty if none).
+
+    `cohorts` is a list of (label, model, num_batches, batch_strength) where model is
+    the cohort's ProblemModel (compiled with the tracked instructors, the faculty
+    occupancy, and the rooms and labs). All cohorts share the given occupancy.
+    """
+    problems = []
+    instructor_slots = {}
+    instructor_labs = {}
+    room_demand = []  # (batch strength, lectures needing a room)
+    lab_demand = []  # (batch strength, lab blocks)
+    room_capacity = {}
+    lab_capacity = {}
+
+    for label, model, num_batches, batch_strength in cohorts:
+        labs, tutorials, theories = len(model.lab_sessions), len(model.tutorial_sessions), len(model.theory_sessions)
+        per_batch = 2 * labs + tutorials + LECTURES_PER_SUBJECT * theories
+        if per_batch > WEEK_BITS:
+            problems.append(f"{label}: each batch needs {per_batch} slots but the week only has {WEEK_BITS}.")
+        if labs > len(DAYS):
+            problems.append(f"{label}: each batch has {labs} labs but at most one lab fits per day ({len(DAYS)}).")
+
+        for sessions, slots_each in ((model.lab_sessions, 2), (model.tutorial_sessions, 1),
+                                     (model.theory_sessions, LECTURES_PER_SUBJECT)):
+            for _, instructor_id in sessions:
+                occupancy_id = model.occupancy_ids[instructor_id]
+                if occupancy_id < 0:
+                    continue
+                instructor_slots[occupancy_id] = instructor_slots.get(occupancy_id, 0) + slots_each * num_batches
+                if slots_each == 2:
+                    instructor_labs[occupancy_id] = instructor_labs.get(occupancy_id, 0) + num_batches
+
+        room_demand.append((batch_strength, (tutorials + LECTURES_PER_SUBJECT * theories) * num_batches))
+        lab_demand.append((batch_strength, labs * num_batches))
+        for name, capacity in zip(model.room_names, model.room_capacity):
+            room_capacity.setdefault(name, capacity)
+        for name, capacity in zip(model.lab_names, model.lab_capacity):
+            lab_capacity.setdefault(name, capacity)
+
+    for occupancy_id, needed in sorted(instructor_slots.items()):
+        name = faculty_ta_occupancy.names[occupancy_id]
+        mask = faculty_ta_occupancy.masks[occupancy_id]
+        available = free_slots(mask)
+        if needed > available:
+            problems.append(f"{name} needs {needed} slots but only {available} are free this week.")
+        blocks = instructor_labs.get(occupancy_id, 0)
+        windows = free_lab_windows(mask)
+        if blocks > windows:
+            problems.append(f"{name} needs {blocks} two-slot lab windows but only {windows} fit in the free slots.")
+
+    # Every batch at least as large as a threshold competes for the rooms at least that large
+    for threshold in sorted({strength for strength, _ in room_demand}):
+        needed = sum(count for strength, count in room_demand if strength >= threshold)
+        available = sum(free_slots(room_occupancy.mask(name)) for name, capacity in room_capacity.items()
+                        if capacity >= threshold)
+        if needed > available:
+            problems.append(f"{needed} lectures/tutorials need a room with at least {threshold} seats "
+                            f"but only {available} such room slots are free.")
+    for threshold in sorted({strength for strength, blocks in lab_demand if blocks}):
+        needed = sum(blocks for strength, blocks in lab_demand if strength >= threshold)
+        available = sum(free_lab_windows(lab_occupancy.mask(name)) for name, capacity in lab_capacity.items()
+                        if capacity >= threshold)
+        if needed > available:
+            problems.append(f"{needed} lab sessions need a lab with at least {threshold} seats "
+                            f"but only {available} such two-slot lab windows are free.")
+    return problems
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from progress import CancellationToken, ProgressEvent
+from scoring import evaluate_timetables
+from solver import GenerationCancelled
+
+POLL_SECONDS = 0.25  # how often the main process checks the cancellation token and reports progress
+
+_worker_token = None
+
+
+def _init_worker(stop_event):
+    global _worker_token
+    _worker_token = CancellationToken(stop_event)
+
+
+def _run_attempt(generator, inputs, seed):
+    """Worker entry point: one seeded attempt on private copies of the occupancy; returns (result, complete)."""
+    generator.cancel_token = _worker_token
+    return generator.run_attempt(inputs, seed), generator.complete
+
+
+def run_multistart(generator, inputs, attempts, workers=None, base_seed=None, cancel_token=None, progress=None):
+    """Run `attempts` independently seeded attempts on a process pool and return the best one.
+
+    Attempts are compared by unassigned sessions, then sessions without a room or
+    lab, then the weighted quality total of scoring.evaluate_timetables. Workers
+    stop by themselves at generator.deadline; when that passes or `cancel_token`
+    fires, attempts that have not started are dropped, running ones are told to
+    stop and hand back their best partial result, and the best result so far is
+    returned, with generator.complete set to whether it ran to the end. Raises
+    the last attempt's error when every attempt failed. `progress` gets an
+    "attempt" event on every poll, not only when an attempt finishes, so a
+    caller's event loop and Cancel button keep working while attempts run.
+    """
+    workers = workers or os.cpu_count() or 1
+    if base_seed is None:
+        base_seed = int(time.time() * 1000) % (2 ** 31)
+    seeds = [base_seed + k for k in range(attempts)]
+
+    best = None
+    best_complete = False
+    best_score = None
+    last_error = None
+    finished = 0
+
+    # Workers are spawned, not forked: a fork would copy the parent's MongoClient, whose pool and monitor
+    # threads are not fork-safe. Spawned workers start clean and get the generator without its database
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    executor = ProcessPoolExecutor(max_workers=min(workers, attempts), mp_context=context,
+                                   initializer=_init_worker, initargs=(stop_event,))
+    try:
+        pending = {executor.submit(_run_attempt, generator, inputs, seed): seed for seed in seeds}
+        while pending:
+            if not stop_event.is_set() and generator.should_stop():
+                print(f"Multi-start stopping after {finished} attempts; collecting running attempts.")
+                stop_event.set()
+                for future in pending:
+                    future.cancel()
+            done, _ = wait(pending, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                seed = pending.pop(future)
+                if future.cancelled():
+                    continue
+                finished += 1
+                try:
+                    result, complete = future.result()
+                except Exception as e:
+                    print(f"Attempt with seed {seed} failed: {e}")
+                    last_error = e
+                    continue
+                report = evaluate_timetables(result[0], inputs["subjects"], result[1], inputs["faculty_ta_to_track"],
+                                             inputs["rooms"], inputs["labs"])
+                score = (report["unassigned"], report["room_failures"], round(report["total"], 2))
+                print(f"Attempt with seed {seed} scored {score}")
+                if best_score is None or score < best_score:
+                    best, best_complete, best_score = result, complete, score
+            if progress is not None:
+                progress(ProgressEvent("attempt", placed=finished, total=attempts, best_score=best_score))
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if best is None:
+        raise last_error or GenerationCancelled("Generation was cancelled before any attempt finished.")
+    print(f"Best of {finished} attempts scored {best_score} (unassigned, room failures, quality penalty).")
+    generator.complete = best_complete
+    return best
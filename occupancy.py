@@ -0,0 +1,122 @@
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+TIME_SLOTS = [
+    "9:30 - 10:30", "10:30 - 11:30", "11:30 - 12:30",
+    "1:30 - 2:30", "2:30 - 3:30", "3:30 - 4:30", "4:30 - 5:30"
+]
+
+SLOTS_PER_DAY = len(TIME_SLOTS)
+WEEK_BITS = len(DAYS) * SLOTS_PER_DAY  # 5 days x 7 slots = 35 bits per resource
+
+
+def slot_bit(day, slot):
+    """Bit for (day index, slot index) inside a week mask."""
+    return 1 << (day * SLOTS_PER_DAY + slot)
+
+
+def window_mask(day, slot, length=1):
+    """Mask covering `length` consecutive slots starting at (day, slot)."""
+    return ((1 << length) - 1) << (day * SLOTS_PER_DAY + slot)
+
+
+class BitsetOccupancy:
+    """Weekly occupancy of a set of named resources (instructors, rooms or labs).
+
+    Each resource gets a dense integer id on first use and a 35-bit week mask,
+    so every availability test is a single AND against that mask.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.masks = []
+
+    def id_for(self, name):
+        """Return the integer id of a resource, registering it if needed."""
+        rid = self.ids.get(name)
+        if rid is None:
+            rid = len(self.names)
+            self.ids[name] = rid
+            self.names.append(name)
+            self.masks.append(0)
+        return rid
+
+    def mask(self, name):
+        rid = self.ids.get(name)
+        return 0 if rid is None else self.masks[rid]
+
+    def is_free(self, name, day, slot, length=1):
+        """True if the resource is free for `length` consecutive slots from (day, slot)."""
+        return not self.mask(name) & window_mask(day, slot, length)
+
+    def is_free_window(self, name, day, slot):
+        """True if the resource is free for the two consecutive slots a lab needs."""
+        return self.is_free(name, day, slot, 2)
+
+    def adjacent_free(self, name, day, slot, length=1):
+        """True if the slots just before and after the window on the same day are free."""
+        mask = self.mask(name)
+        if slot > 0 and mask & slot_bit(day, slot - 1):
+            return False
+        if slot + length < SLOTS_PER_DAY and mask & slot_bit(day, slot + length):
+            return False
+        return True
+
+    def book(self, name, day, slot, length=1):
+        rid = self.id_for(name)
+        self.masks[rid] |= window_mask(day, slot, length)
+
+    def release(self, name, day, slot, length=1):
+        rid = self.ids.get(name)
+        if rid is not None:
+            self.masks[rid] &= ~window_mask(day, slot, length)
+
+    def copy(self):
+        other = BitsetOccupancy()
+        other.ids = dict(self.ids)
+        other.names = list(self.names)
+        other.masks = list(self.masks)
+        return other
+
+    @classmethod
+    def from_slot_lists(cls, doc, key=None):
+        """Build from a Mongo-style {day: {slot: [names]}} document (or {slot: {key: [names]}})."""
+        occupancy = cls()
+        for d, day in enumerate(DAYS):
+            day_slots = (doc or {}).get(day, {})
+            for s, slot in enumerate(TIME_SLOTS):
+                names = day_slots.get(slot, [])
+                if key is not None:
+                    names = (names or {}).get(key, [])
+                for name in names:
+                    occupancy.book(name, d, s)
+        return occupancy
+
+
+def faculty_occupancy_from_document(doc):
+    """Convert the faculty_ta_occupancy document into a BitsetOccupancy."""
+    return BitsetOccupancy.from_slot_lists(doc)
+
+
+def room_lab_occupancy_from_document(doc):
+    """Convert the room_lab_occupancy document into (rooms, labs) BitsetOccupancy objects."""
+    rooms = BitsetOccupancy.from_slot_lists(doc, key="rooms")
+    labs = BitsetOccupancy.from_slot_lists(doc, key="labs")
+    return rooms, labs
+
+
+def booking_changes(before, after):
+    """(booked, released) lists of (name, day index, slot index) that turn `before` into `after`."""
+    booked, released = [], []
+    for name in set(before.names) | set(after.names):
+        old, new = before.mask(name), after.mask(name)
+        if old == new:
+            continue
+        for d in range(len(DAYS)):
+            for s in range(SLOTS_PER_DAY):
+                bit = slot_bit(d, s)
+                if new & bit and not old & bit:
+                    booked.append((name, d, s))
+                elif old & bit and not new & bit:
+                    released.append((name, d, s))
+    return booked, released
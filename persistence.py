@@ -0,0 +1,154 @@
+from pymongo import UpdateOne, InsertOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+from reservations import RESERVATIONS, DUPLICATE_KEY, DoubleBookingError
+from solver import SchedulingError
+
+# Topologies on which MongoDB supports multi-document transactions, plus storage.EmbeddedClient's
+TRANSACTION_TOPOLOGIES = {"ReplicaSetWithPrimary", "Sharded", "LoadBalanced", "Embedded"}
+
+
+class VersionConflictError(SchedulingError):
+    """Raised when a timetable was rewritten by another save since this one read its version."""
+
+
+def timetable_identity(timetable):
+    """(year, semester, batch, specialization): the key of the unique timetable_identity index."""
+    return timetable.get("year"), timetable.get("semester"), timetable.get("batch"), timetable.get("specialization")
+
+
+def timetable_upserts(timetables, versions=None):
+    """One upsert per timetable document, keyed by its (year, semester, batch, specialization) identity.
+
+    A document saved without an input fingerprint also drops any stored one,
+    so a partial result never answers a later cache lookup. With `versions`
+    ({timetable_identity: version read at load time}; missing for a timetable
+    that was not stored)
+    each upsert is a compare-and-swap: it only matches the document at that
+    version and stores version + 1. A document another save has moved on
+    misses the filter, and the upsert then collides with it on the unique
+    timetable_identity index, which persist() reports as VersionConflictError.
+    """
+    requests = []
+    for timetable in timetables:
+        query = {"year": timetable["year"], "semester": timetable["semester"], "batch": timetable["batch"],
+                 "specialization": timetable["specialization"]}
+        update = {"$set": {key: value for key, value in timetable.items() if key not in ("_id", "version")}}
+        if "input_fingerprint" not in timetable:
+            update["$unset"] = {"input_fingerprint": ""}
+        if versions is not None:
+            version = versions.get(timetable_identity(timetable))
+            query["version"] = version
+            update["$set"]["version"] = (version or 0) + 1
+        requests.append(UpdateOne(query, update, upsert=True))
+    return requests
+
+
+def supports_transactions(db):
+    """True when the server behind `db` is a replica set or sharded cluster (a standalone server has no transactions)."""
+    description = getattr(db.client, "topology_description", None)
+    return description is not None and description.topology_type_name in TRANSACTION_TOPOLOGIES
+
+
+def give_back(db, claims=(), moves=()):
+    """Undo claims and moves written without a session before a save failed."""
+    requests = [DeleteOne(claim) for claim in claims]
+    requests += [UpdateOne(dict(reservation, holder=holder), {"$set": {"holder": reservation["holder"]}})
+                 for reservation, holder in moves]
+    if requests:
+        db[RESERVATIONS].bulk_write(requests, ordered=False)
+
+
+def claim_reservations(db, claims, session=None):
+    """Insert reservation documents; DoubleBookingError if any slot is already reserved.
+
+    Without a session the claims that did go in are deleted again before raising,
+    so a failed claim never leaves part of a booking behind.
+    """
+    try:
+        db[RESERVATIONS].bulk_write([InsertOne(dict(claim)) for claim in claims], ordered=False, session=session)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        taken = {error["index"] for error in errors}
+        if session is None:
+            give_back(db, [claim for index, claim in enumerate(claims) if index not in taken])
+        conflicts = [claims[index] for index in sorted(taken)]
+        raise DoubleBookingError(
+            "These slots were booked by another save in the meantime: "
+            + ", ".join(f"{c['resource']} {c['day']} {c['slot']}" for c in conflicts[:10])
+            + (f" and {len(conflicts) - 10} more" if len(conflicts) > 10 else "")
+        )
+
+
+def move_reservations(db, moves, claims, session=None):
+    """Hand reservations over to a new holder; VersionConflictError if another save released or moved one.
+
+    `moves` are (reservation document, new holder) pairs. Without a session the
+    moves and claims are given back before raising.
+    """
+    result = db[RESERVATIONS].bulk_write(
+        [UpdateOne(reservation, {"$set": {"holder": holder}}) for reservation, holder in moves],
+        ordered=False, session=session
+    )
+    if result.matched_count < len(moves):
+        if session is None:
+            give_back(db, claims, moves)
+        raise VersionConflictError(
+            f"{len(moves) - result.matched_count} reservations were released or moved by another save in the meantime."
+        )
+
+
+def write_timetables(db, timetable_requests, claims, moves=(), session=None):
+    """bulk_write the timetable requests; VersionConflictError if a versioned write found its document changed.
+
+    Without a session the claims and moves are given back when no timetable was
+    written at all; once some were, they stay, since a slot left reserved is
+    harmless and a saved timetable without its reservations is not.
+    """
+    try:
+        db["timetable"].bulk_write(timetable_requests, ordered=False, session=session)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        written = sum(e.details.get(count, 0) for count in ("nInserted", "nUpserted", "nMatched", "nRemoved"))
+        if session is None and not written:
+            give_back(db, claims, moves)
+        raise VersionConflictError(
+            f"{len(errors)} of {len(timetable_requests)} timetables were changed by another save in the meantime."
+        )
+
+
+def persist(db, timetable_requests, claims=(), releases=(), moves=()):
+    """Write timetables and their reservations together; returns True if it ran as one transaction.
+
+    `timetable_requests` go out in one unordered bulk_write; `claims`, `releases`
+    and `moves` come from ReservationStore.changes. A claim of an already
+    reserved slot raises DoubleBookingError before any timetable is written, and
+    a versioned timetable write (see timetable_upserts) that finds its document
+    changed, or a move whose reservation another save released, raises
+    VersionConflictError. On a replica set everything commits or nothing does.
+    On a standalone server the writes run without a transaction, claims and
+    moves first and releases last, so an interrupted save can leave slots
+    reserved but never a timetable whose slots are not.
+    """
+    def write(session=None):
+        if claims:
+            claim_reservations(db, claims, session)
+        if moves:
+            move_reservations(db, moves, claims, session)
+        if timetable_requests:
+            write_timetables(db, timetable_requests, claims, moves, session)
+        if releases:
+            db[RESERVATIONS].bulk_write([DeleteOne(release) for release in releases], ordered=False,
+                                        session=session)
+
+    if supports_transactions(db):
+        with db.client.start_session() as session:
+            session.with_transaction(write)
+        return True
+
+    write()
+    return False
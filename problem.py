@@ -0,0 +1,51 @@
+class ProblemModel:
+    """Integer-indexed view of one generation's inputs, compiled once from the Mongo documents.
+
+    Subjects and instructors get dense ids, sessions are grouped by type as
+    (subject id, instructor id) pairs, tracked instructors carry their id in the
+    faculty/TA BitsetOccupancy, and rooms and labs become parallel name/capacity
+    lists. Placement phases work on these ids and lists instead of re-filtering
+    the subject documents and looking up dict keys in their inner loops.
+    """
+
+    def __init__(self, subjects=(), faculty_ta_to_track=(), faculty_ta_occupancy=None, rooms=(), labs=()):
+        self.subject_names = []  # subject id -> name
+        self.instructor_names = []  # instructor id -> name
+        self.occupancy_ids = []  # instructor id -> id in faculty_ta_occupancy, or -1 when untracked
+        self.lab_sessions = []  # (subject id, instructor id), in document order
+        self.tutorial_sessions = []
+        self.theory_sessions = []
+
+        subject_ids = {}
+        instructor_ids = {}
+        seen = set()
+        by_type = {"Lab": self.lab_sessions, "Tutorial": self.tutorial_sessions, "Theory": self.theory_sessions}
+        for sub in subjects:
+            sessions = by_type.get(sub["type"])
+            key = (sub["type"], sub["subject"])
+            if sessions is None or key in seen:
+                continue
+            seen.add(key)
+
+            subject_id = subject_ids.get(sub["subject"])
+            if subject_id is None:
+                subject_id = subject_ids[sub["subject"]] = len(self.subject_names)
+                self.subject_names.append(sub["subject"])
+
+            instructor = sub.get("faculty" if sub["type"] == "Theory" else "ta", "N/A")
+            instructor_id = instructor_ids.get(instructor)
+            if instructor_id is None:
+                instructor_id = instructor_ids[instructor] = len(self.instructor_names)
+                self.instructor_names.append(instructor)
+                tracked = instructor in faculty_ta_to_track and faculty_ta_occupancy is not None
+                self.occupancy_ids.append(faculty_ta_occupancy.id_for(instructor) if tracked else -1)
+            sessions.append((subject_id, instructor_id))
+
+        self.subject_ids = subject_ids
+        self.instructor_ids = instructor_ids
+
+        # Rows keep duplicates so random picks over them match the document lists
+        self.room_names = [room["room_no"] for room in rooms]
+        self.room_capacity = [room.get("capacity", 0) for room in rooms]
+        self.lab_names = [lab["lab_no"] for lab in labs]
+        self.lab_capacity = [lab.get("strength", 0) for lab in labs]
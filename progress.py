@@ -0,0 +1,38 @@
+import threading
+
+
+class CancellationToken:
+    """Cooperative cancellation flag shared between the caller and a running generation.
+
+    Backed by a threading.Event by default; multi-start workers wrap a
+    multiprocessing Event so one cancel() stops every process.
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class ProgressEvent:
+    """One structured progress report: phase, batch, placed/total sessions and the best score so far."""
+
+    __slots__ = ("phase", "batch", "placed", "total", "best_score", "message")
+
+    def __init__(self, phase, batch=None, placed=None, total=None, best_score=None, message=""):
+        self.phase = phase  # "load", "feasibility", "schedule", "anneal", "attempt", "rooms", "save", "done"
+        self.batch = batch
+        self.placed = placed
+        self.total = total
+        self.best_score = best_score
+        self.message = message
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__
+                           if getattr(self, name) not in (None, ""))
+        return f"ProgressEvent({fields})"
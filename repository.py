@@ -0,0 +1,179 @@
+import threading
+from collections import namedtuple
+
+from database import get_db
+
+CURSOR_BATCH_SIZE = 500  # documents per round trip for the larger listings
+CACHED_COLLECTIONS = ("rooms", "labs", "strength_details")  # small reference data, read through the cache
+
+# Typed rows for the listing views
+Room = namedtuple("Room", ["room_no", "capacity"])
+Lab = namedtuple("Lab", ["lab_no", "strength"])
+StrengthDetail = namedtuple("StrengthDetail", ["year", "sections", "students", "specialization"])
+TimetableKey = namedtuple("TimetableKey", ["year", "semester", "batch", "specialization"])
+SubjectRow = namedtuple("SubjectRow", ["subject", "year", "semester", "specialization", "theory_faculty",
+                                       "theory_types", "lab_tutorial_tas", "lab_tutorial_types"])
+
+# Projections: only the fields the application reads
+SUBJECT_FIELDS = {"_id": 0, "subject": 1, "year": 1, "semester": 1, "specialization": 1, "type": 1,
+                  "faculty": 1, "ta": 1}
+ROOM_FIELDS = {"_id": 0, "room_no": 1, "capacity": 1}
+LAB_FIELDS = {"_id": 0, "lab_no": 1, "strength": 1}
+STRENGTH_FIELDS = {"_id": 0, "year": 1, "sections": 1, "students": 1, "specialization": 1}
+TIMETABLE_KEY_FIELDS = {"_id": 0, "year": 1, "semester": 1, "batch": 1, "specialization": 1}
+
+
+def _sessions(condition):
+    return {"$filter": {"input": "$sessions", "as": "session", "cond": condition}}
+
+
+def _session_field(sessions, field):
+    return {"$map": {"input": "$" + sessions, "as": "session", "in": "$$session." + field}}
+
+
+# One document per (subject, year, semester, specialization), in first-insertion order, with the
+# theory faculty and the lab/tutorial TAs already collected: the rows of the subject grid
+SUBJECT_ROWS_PIPELINE = [
+    {"$group": {
+        "_id": {"subject": "$subject", "year": "$year", "semester": "$semester",
+                "specialization": {"$ifNull": ["$specialization", ""]}},
+        "first": {"$min": "$_id"},
+        "sessions": {"$push": {"type": "$type", "faculty": {"$ifNull": ["$faculty", ""]},
+                               "ta": {"$ifNull": ["$ta", ""]}}}
+    }},
+    {"$sort": {"first": 1}},
+    {"$project": {
+        "_id": 0, "subject": "$_id.subject", "year": "$_id.year", "semester": "$_id.semester",
+        "specialization": "$_id.specialization",
+        "theory": _sessions({"$eq": ["$$session.type", "Theory"]}),
+        "lab_tutorial": _sessions({"$ne": ["$$session.type", "Theory"]})
+    }},
+    {"$project": {
+        "subject": 1, "year": 1, "semester": 1, "specialization": 1,
+        "theory_faculty": {"$setUnion": [_session_field("theory", "faculty")]},
+        "theory_types": _session_field("theory", "type"),
+        "lab_tutorial_tas": {"$setUnion": [_session_field("lab_tutorial", "ta")]},
+        "lab_tutorial_types": _session_field("lab_tutorial", "type")
+    }},
+]
+
+
+# (client, database name, collection) -> projected documents, shared by every Repository in the process
+_cache = {}
+_generations = {}  # same keys -> invalidation count, so a read racing an invalidation is not cached
+_cache_lock = threading.Lock()
+
+
+def group_subject_rows(subjects):
+    """SUBJECT_ROWS_PIPELINE in Python, for stores without aggregation (storage.EmbeddedDatabase)."""
+    groups = {}
+    for doc in subjects:
+        key = (doc["subject"], doc["year"], doc["semester"], doc.get("specialization") or "")
+        groups.setdefault(key, []).append(doc)
+    rows = []
+    for (subject, year, semester, specialization), docs in groups.items():
+        theory = [doc for doc in docs if doc["type"] == "Theory"]
+        lab_tutorial = [doc for doc in docs if doc["type"] != "Theory"]
+        rows.append(SubjectRow(subject, year, semester, specialization,
+                               sorted({doc.get("faculty") or "" for doc in theory}), [doc["type"] for doc in theory],
+                               sorted({doc.get("ta") or "" for doc in lab_tutorial}),
+                               [doc["type"] for doc in lab_tutorial]))
+    return rows
+
+
+class Repository:
+    """The reads the application needs, each with a field projection and a cursor batch size.
+
+    Listing views get typed rows (Room, Lab, StrengthDetail, TimetableKey);
+    the generators get projected plain documents, which is what the scheduling
+    code and the input fingerprint work on.
+
+    Rooms, labs and strength details are read through a process-wide cache, so
+    the UI tabs and the generators share one copy; whoever writes one of those
+    collections calls invalidate() with its name. Writes made by another
+    process are seen after the next invalidation (or restart).
+    """
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_db()
+
+    def _find(self, collection, query, fields):
+        return self.db[collection].find(query or {}, fields).batch_size(CURSOR_BATCH_SIZE)
+
+    def _cache_key(self, collection):
+        return repr(getattr(self.db, "client", None)), self.db.name, collection
+
+    def _cached(self, collection, fields):
+        key = self._cache_key(collection)
+        with _cache_lock:
+            docs = _cache.get(key)
+            generation = _generations.get(key, 0)
+        if docs is None:
+            docs = list(self._find(collection, None, fields))
+            with _cache_lock:
+                if _generations.get(key, 0) == generation:
+                    _cache[key] = docs
+        return docs
+
+    def invalidate(self, *collections):
+        """Drop the cached copy of the given collections (default: all cached ones) after a write."""
+        with _cache_lock:
+            for collection in collections or CACHED_COLLECTIONS:
+                key = self._cache_key(collection)
+                _cache.pop(key, None)
+                _generations[key] = _generations.get(key, 0) + 1
+
+    def rooms(self):
+        return [Room(doc["room_no"], doc.get("capacity")) for doc in self._cached("rooms", ROOM_FIELDS)]
+
+    def labs(self):
+        return [Lab(doc["lab_no"], doc.get("strength")) for doc in self._cached("labs", LAB_FIELDS)]
+
+    def strength_details(self):
+        return [
+            StrengthDetail(doc["year"], doc["sections"], doc["students"], doc.get("specialization", ""))
+            for doc in self._cached("strength_details", STRENGTH_FIELDS)
+        ]
+
+    def timetable_keys(self):
+        """(year, semester, batch, specialization) of every stored timetable, without the weekly grids."""
+        return [
+            TimetableKey(doc["year"], doc["semester"], doc["batch"], doc.get("specialization", "None"))
+            for doc in self._find("timetable", None, TIMETABLE_KEY_FIELDS)
+        ]
+
+    def timetable_data(self, query):
+        """The weekly grid of the timetable matching `query`, or None."""
+        doc = self.db["timetable"].find_one(query, {"_id": 0, "data": 1})
+        return doc.get("data", {}) if doc else None
+
+    def subject_rows(self):
+        """The subject grid in one aggregation: a SubjectRow per subject of each cohort."""
+        if not getattr(self.db, "supports_aggregation", True):
+            return group_subject_rows(self.subject_documents())
+        return [
+            SubjectRow(doc["subject"], doc["year"], doc["semester"], doc["specialization"], doc["theory_faculty"],
+                       doc["theory_types"], doc["lab_tutorial_tas"], doc["lab_tutorial_types"])
+            for doc in self.db["Subject_collection"].aggregate(SUBJECT_ROWS_PIPELINE,
+                                                               batchSize=CURSOR_BATCH_SIZE)
+        ]
+
+    def subject_documents(self, query=None):
+        return list(self._find("Subject_collection", query, SUBJECT_FIELDS))
+
+    # The document readers hand out copies, so callers never modify the cached ones
+    def room_documents(self):
+        return [dict(doc) for doc in self._cached("rooms", ROOM_FIELDS)]
+
+    def lab_documents(self):
+        return [dict(doc) for doc in self._cached("labs", LAB_FIELDS)]
+
+    def strength_documents(self):
+        return [dict(doc) for doc in self._cached("strength_details", STRENGTH_FIELDS)]
+
+    def strength_document(self, query):
+        """The first strength details document whose fields equal `query` (a missing field equals None)."""
+        for doc in self._cached("strength_details", STRENGTH_FIELDS):
+            if all(doc.get(key) == value for key, value in query.items()):
+                return dict(doc)
+        return None
@@ -0,0 +1,170 @@
+from occupancy import DAYS, TIME_SLOTS, BitsetOccupancy
+from solver import SchedulingError
+
+RESERVATIONS = "reservations"
+KINDS = ("faculty_ta", "room", "lab")  # one BitsetOccupancy each, in this order
+DEFAULT_TERM = "current"  # every timetable currently shares one teaching term
+DUPLICATE_KEY = 11000
+
+
+class DoubleBookingError(SchedulingError):
+    """Raised when a save claims a slot that another save reserved since this one loaded the occupancy."""
+
+
+def reservation_key(term, kind, resource, day, slot):
+    return {"term": term, "kind": kind, "resource": resource, "day": day, "slot": slot}
+
+
+def reservation_holder(timetable):
+    """Identity of the timetable document holding a reservation.
+
+    Always built here, with the fields in this order: MongoDB compares embedded
+    documents field by field, so a holder written in another order would not match.
+    """
+    return {"year": timetable.get("year"), "semester": timetable.get("semester"), "batch": timetable.get("batch"),
+            "specialization": timetable.get("specialization")}
+
+
+def reservation_slot(reservation):
+    """(term, kind, resource, day, slot): the key of the unique reservation_slot index."""
+    return reservation["term"], reservation["kind"], reservation["resource"], reservation["day"], reservation["slot"]
+
+
+def _bookings(occupancies, reservations):
+    by_kind = dict(zip(KINDS, occupancies))
+    for reservation in reservations:
+        occupancy = by_kind.get(reservation["kind"])
+        if occupancy is not None:
+            day, slot = DAYS.index(reservation["day"]), TIME_SLOTS.index(reservation["slot"])
+            yield occupancy, reservation["resource"], day, slot
+
+
+def book_reservations(occupancies, reservations):
+    """Book reservation documents into a (faculty_ta, rooms, labs) triple; None members are skipped."""
+    for occupancy, resource, day, slot in _bookings(occupancies, reservations):
+        occupancy.book(resource, day, slot)
+
+
+def release_reservations(occupancies, reservations):
+    """Release reservation documents from a (faculty_ta, rooms, labs) triple; None members are skipped."""
+    for occupancy, resource, day, slot in _bookings(occupancies, reservations):
+        occupancy.release(resource, day, slot)
+
+
+def timetable_bookings(timetable_data):
+    """(kind, resource, day, slot) of every room, lab and instructor booking held by one stored timetable document."""
+    for day, slots in timetable_data.get("data", {}).items():
+        if day not in DAYS:
+            continue
+        for slot, session in slots.items():
+            if slot not in TIME_SLOTS or not session:
+                continue
+            if session["type"] in ["Theory", "Tutorial"] and session.get("room"):
+                yield "room", session["room"], day, slot
+            elif session["type"] == "Lab" and session.get("lab"):
+                yield "lab", session["lab"], day, slot
+            if "instructor" in session:
+                yield "faculty_ta", session["instructor"], day, slot
+
+
+class ReservationStore:
+    """Occupancy stored as one reservations document per (term, kind, resource, day, slot).
+
+    The unique index on that key (see schema.INDEXES) makes claiming a slot an
+    atomic insert that fails on a double booking. Each document also names its
+    holder, the timetable that booked it (see reservation_holder), and is only
+    ever released or handed over by a filter on that holder, so a save never
+    frees a slot another timetable holds. In memory the scheduling code keeps
+    working on BitsetOccupancy objects: load() reads the reservations into
+    (faculty_ta, rooms, labs) and changes() turns the reservations the saved
+    timetables hold and the ones the new timetables need into the claims,
+    releases and moves that persistence.persist() writes.
+    """
+
+    def __init__(self, db, term=DEFAULT_TERM):
+        self.db = db
+        self.term = term
+
+    def load(self, kinds=KINDS, resources=None):
+        """(faculty_ta, rooms, labs) occupancy of the term; only `kinds`, and only `resources` if given, are read."""
+        occupancies = tuple(BitsetOccupancy() for _ in KINDS)
+        by_kind = dict(zip(KINDS, occupancies))
+        day_index = {day: d for d, day in enumerate(DAYS)}
+        slot_index = {slot: s for s, slot in enumerate(TIME_SLOTS)}
+        query = {"term": self.term}
+        if tuple(kinds) != KINDS:
+            query["kind"] = {"$in": list(kinds)}
+        if resources is not None:
+            query["resource"] = {"$in": sorted(resources)}
+        cursor = self.db[RESERVATIONS].find(
+            query, {"_id": 0, "kind": 1, "resource": 1, "day": 1, "slot": 1}
+        ).batch_size(1000)
+        for doc in cursor:
+            occupancy = by_kind.get(doc["kind"])
+            if occupancy is not None and doc["day"] in day_index and doc["slot"] in slot_index:
+                occupancy.book(doc["resource"], day_index[doc["day"]], slot_index[doc["slot"]])
+        return occupancies
+
+    def held(self, timetables):
+        """Reservation documents held by the given timetable documents."""
+        holders = [reservation_holder(timetable) for timetable in timetables]
+        if not holders:
+            return []
+        return list(self.db[RESERVATIONS].find({"term": self.term, "holder": {"$in": holders}}, {"_id": 0}))
+
+    def timetable_reservations(self, timetable_data, tracked):
+        """Reservation documents one timetable holds: its rooms, labs and `tracked` instructors."""
+        holder = reservation_holder(timetable_data)
+        return [dict(reservation_key(self.term, kind, resource, day, slot), holder=holder)
+                for kind, resource, day, slot in timetable_bookings(timetable_data)
+                if kind != "faculty_ta" or resource in tracked]
+
+    def changes(self, held, wanted):
+        """(claims, releases, moves) turning the `held` reservation documents into the `wanted` ones.
+
+        A slot wanted by another timetable than the one holding it is a move,
+        (held document, new holder), rather than a release and a claim.
+        """
+        held_by_slot = {reservation_slot(reservation): reservation for reservation in held}
+        claims, moves, seen = [], [], set()
+        for reservation in wanted:
+            slot = reservation_slot(reservation)
+            if slot in seen:
+                continue
+            seen.add(slot)
+            current = held_by_slot.get(slot)
+            if current is None:
+                claims.append(reservation)
+            elif current["holder"] != reservation["holder"]:
+                moves.append((current, reservation["holder"]))
+        releases = [reservation for slot, reservation in held_by_slot.items() if slot not in seen]
+        return claims, releases, moves
+
+    def unreserved(self, reserved_faculty, instructors, timetables=None, skip=None):
+        """Reservation documents for stored sessions of `instructors` that `reserved_faculty` lacks.
+
+        Instructors who became tracked since their timetables were saved have no
+        reservations for those sessions. `timetables` are the stored documents if
+        already read (else only the fields needed are read); those for which `skip`
+        returns True are left out.
+        """
+        if timetables is None:
+            projection = {"_id": 0, "year": 1, "semester": 1, "batch": 1, "specialization": 1, "data": 1}
+            timetables = self.db["timetable"].find({}, projection)
+        reservations, seen = [], set()
+        for timetable_data in timetables:
+            if skip is not None and skip(timetable_data):
+                continue
+            for reservation in self.timetable_reservations(timetable_data, instructors):
+                if reservation["kind"] != "faculty_ta":
+                    continue
+                booking = (reservation["resource"], DAYS.index(reservation["day"]),
+                           TIME_SLOTS.index(reservation["slot"]))
+                if booking in seen:
+                    print(f"{reservation['resource']} is booked twice on {reservation['day']} {reservation['slot']} "
+                          f"in the stored timetables.")
+                    continue
+                seen.add(booking)
+                if reserved_faculty.is_free(*booking):
+                    reservations.append(reservation)
+        return reservations
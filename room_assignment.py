@@ -0,0 +1,232 @@
+import random
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; place_rooms_and_labs falls back to the plain loop
+    np = None
+
+from occupancy import DAYS, TIME_SLOTS, SLOTS_PER_DAY
+
+
+HAS_NUMPY = np is not None
+
+
+def masks_to_array(occupancy, names):
+    """Expand the bitset masks of `names` into a (len(names), days, slots) boolean array."""
+    masks = np.array([occupancy.mask(name) for name in names], dtype=np.int64)
+    bits = (masks[:, None] >> np.arange(len(DAYS) * SLOTS_PER_DAY, dtype=np.int64)) & 1
+    return bits.astype(bool).reshape(len(names), len(DAYS), SLOTS_PER_DAY)
+
+
+class VectorizedRoomAssigner:
+    """Room and lab assignment over rooms x days x slots boolean arrays.
+
+    Candidate filtering for one batch-day is a single masked array operation
+    (capacity fit AND not busy for every slot of the day); the per-session pick
+    is still random.choice over the candidates, so the output matches the loop
+    in TimetableGenerator.place_rooms_and_labs.
+    """
+
+    def __init__(self, model, room_occupancy, lab_occupancy):
+        self.room_occupancy = room_occupancy
+        self.lab_occupancy = lab_occupancy
+        self.room_names = model.room_names
+        self.lab_names = model.lab_names
+        self.room_capacity = np.array(model.room_capacity, dtype=np.int64)
+        self.lab_capacity = np.array(model.lab_capacity, dtype=np.int64)
+        self.room_busy = masks_to_array(room_occupancy, self.room_names)
+        self.lab_busy = masks_to_array(lab_occupancy, self.lab_names)
+        # Rows sharing a room/lab number must be booked together
+        self.room_rows = {}
+        for index, name in enumerate(self.room_names):
+            self.room_rows.setdefault(name, []).append(index)
+        self.lab_rows = {}
+        for index, name in enumerate(self.lab_names):
+            self.lab_rows.setdefault(name, []).append(index)
+
+    def assign(self, timetables):
+        """Fill in session["room"] / session["lab"] and book the chosen resources."""
+        for timetable in timetables:
+            batch_strength = timetable["batch_strength"]
+            room_fits = self.room_capacity >= batch_strength
+            lab_fits = self.lab_capacity >= batch_strength
+
+            for day, slots in timetable["data"].items():
+                d = DAYS.index(day)
+                # rooms x slots candidates for the whole day, one masked operation each
+                room_free = room_fits[:, None] & ~self.room_busy[:, d, :]
+                lab_free = lab_fits[:, None] & ~self.lab_busy[:, d, :]
+                lab_pair_free = lab_free[:, :-1] & lab_free[:, 1:]
+
+                for slot_index, slot in enumerate(TIME_SLOTS):
+                    session = slots.get(slot)
+                    if session and session["type"] == "Lab":
+                        if slot_index < len(TIME_SLOTS) - 1:
+                            next_slot = TIME_SLOTS[slot_index + 1]
+                            next_session = slots.get(next_slot)
+                            if next_session and next_session["type"] == "Lab":
+                                candidates = np.flatnonzero(lab_pair_free[:, slot_index])
+                                if len(candidates):
+                                    index = random.choice(candidates.tolist())
+                                    assigned_lab = self.lab_names[index]
+                                    rows = self.lab_rows[assigned_lab]
+                                    self.lab_busy[rows, d, slot_index:slot_index + 2] = True
+                                    lab_free[rows, slot_index:slot_index + 2] = False
+                                    lab_pair_free = lab_free[:, :-1] & lab_free[:, 1:]
+                                    self.lab_occupancy.book(assigned_lab, d, slot_index, 2)
+                                    session["lab"] = assigned_lab
+                                    next_session["lab"] = assigned_lab
+                                else:
+                                    print(f"Warning: No available lab for {session['subject']} on {day} at {slot} and {next_slot} with capacity >= {batch_strength}.")
+
+                    elif session and session["type"] in ["Theory", "Tutorial"]:
+                        candidates = np.flatnonzero(room_free[:, slot_index])
+                        if len(candidates):
+                            index = random.choice(candidates.tolist())
+                            assigned_room = self.room_names[index]
+                            rows = self.room_rows[assigned_room]
+                            self.room_busy[rows, d, slot_index] = True
+                            room_free[rows, slot_index] = False
+                            self.room_occupancy.book(assigned_room, d, slot_index)
+                            session["room"] = assigned_room
+                        else:
+                            print(f"Warning: No available room for {session['subject']} on {day} at {slot} with capacity >= {batch_strength}.")
+
+
+UNMATCHED_COST = 10 ** 6  # cost of leaving a session without a room; dominates any seat waste
+
+
+def min_cost_assignment(cost):
+    """Hungarian algorithm: for an n x m cost matrix (n <= m), the column assigned to each row minimising the total."""
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    infinity = float("inf")
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    owner = [0] * (m + 1)  # row (1-based) matched to each column, 0 = free
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_slack = [infinity] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            delta = infinity
+            j1 = 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    slack = row[j - 1] - u[i0] - v[j]
+                    if slack < min_slack[j]:
+                        min_slack[j] = slack
+                        way[j] = j0
+                    if min_slack[j] < delta:
+                        delta = min_slack[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    assignment = [None] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
+
+
+def match_sessions(strengths, capacities):
+    """Assign sessions (by batch strength) to resources (by capacity), one each.
+
+    Maximises the number of sessions placed and, among those placements, minimises
+    the empty seats. Returns the resource index per session, or None when unplaced.
+    """
+    if not strengths:
+        return []
+    cost = []
+    for strength in strengths:
+        row = [capacity - strength if capacity >= strength else 2 * UNMATCHED_COST for capacity in capacities]
+        cost.append(row + [UNMATCHED_COST] * len(strengths))  # one "no room" column per session
+    return [
+        column if column is not None and column < len(capacities) else None
+        for column in min_cost_assignment(cost)
+    ]
+
+
+class MatchingRoomAssigner:
+    """Room and lab assignment as a bipartite matching per (day, slot).
+
+    For every slot, the sessions of all batches that need a room are matched to the
+    rooms that are free and large enough, placing as many sessions as possible
+    and wasting as few seats as possible (best fit). Labs are matched the same way
+    per two-slot window, windows in slot order, against labs free for both slots.
+    """
+
+    def __init__(self, model, room_occupancy, lab_occupancy):
+        self.room_occupancy = room_occupancy
+        self.lab_occupancy = lab_occupancy
+        # One entry per room/lab number; duplicates share a booking anyway
+        self.room_capacity = {}
+        for name, capacity in zip(model.room_names, model.room_capacity):
+            self.room_capacity.setdefault(name, capacity)
+        self.lab_capacity = {}
+        for name, capacity in zip(model.lab_names, model.lab_capacity):
+            self.lab_capacity.setdefault(name, capacity)
+
+    def assign(self, timetables):
+        """Fill in session["room"] / session["lab"] and book the chosen resources."""
+        for d, day in enumerate(DAYS):
+            block_tails = set()  # ids of second lab slots already matched with their first slot
+            for slot_index, slot in enumerate(TIME_SLOTS):
+                lab_blocks = []
+                lectures = []
+                for timetable in timetables:
+                    slots = timetable["data"].get(day, {})
+                    session = slots.get(slot)
+                    if not session:
+                        continue
+                    if session["type"] == "Lab":
+                        if slot_index < len(TIME_SLOTS) - 1 and id(session) not in block_tails:
+                            next_session = slots.get(TIME_SLOTS[slot_index + 1])
+                            if next_session and next_session["type"] == "Lab":
+                                block_tails.add(id(next_session))
+                                lab_blocks.append((timetable, session, next_session))
+                    elif session["type"] in ["Theory", "Tutorial"]:
+                        lectures.append((timetable, session))
+
+                self._assign_labs(lab_blocks, d, day, slot_index)
+                self._assign_rooms(lectures, d, day, slot_index)
+
+    def _assign_rooms(self, lectures, d, day, slot_index):
+        names = [name for name in self.room_capacity if self.room_occupancy.is_free(name, d, slot_index)]
+        strengths = [timetable["batch_strength"] for timetable, _ in lectures]
+        matches = match_sessions(strengths, [self.room_capacity[name] for name in names])
+        for (timetable, session), match in zip(lectures, matches):
+            if match is None:
+                print(f"Warning: No available room for {session['subject']} on {day} at {TIME_SLOTS[slot_index]} with capacity >= {timetable['batch_strength']}.")
+                continue
+            self.room_occupancy.book(names[match], d, slot_index)
+            session["room"] = names[match]
+
+    def _assign_labs(self, lab_blocks, d, day, slot_index):
+        names = [name for name in self.lab_capacity if self.lab_occupancy.is_free_window(name, d, slot_index)]
+        strengths = [timetable["batch_strength"] for timetable, _, _ in lab_blocks]
+        matches = match_sessions(strengths, [self.lab_capacity[name] for name in names])
+        for (timetable, session, next_session), match in zip(lab_blocks, matches):
+            if match is None:
+                print(f"Warning: No available lab for {session['subject']} on {day} at {TIME_SLOTS[slot_index]} and {TIME_SLOTS[slot_index + 1]} with capacity >= {timetable['batch_strength']}.")
+                continue
+            self.lab_occupancy.book(names[match], d, slot_index, 2)
+            session["lab"] = names[match]
+            next_session["lab"] = names[match]
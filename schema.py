@@ -0,0 +1,148 @@
+from pymongo import ASCENDING, InsertOne, UpdateOne
+from pymongo.errors import PyMongoError, BulkWriteError
+
+from occupancy import (DAYS, TIME_SLOTS, BitsetOccupancy, booking_changes, faculty_occupancy_from_document,
+                       room_lab_occupancy_from_document)
+from reservations import (RESERVATIONS, DUPLICATE_KEY, KINDS, DEFAULT_TERM, reservation_key, reservation_holder,
+                          timetable_bookings)
+
+# collection -> [(index name, keys, unique)]; unique only where the code already treats the key as an identity
+INDEXES = {
+    "timetable": [
+        ("timetable_identity", [("year", ASCENDING), ("semester", ASCENDING), ("batch", ASCENDING),
+                                ("specialization", ASCENDING)], True),
+    ],
+    "Subject_collection": [
+        ("subject_identity", [("year", ASCENDING), ("semester", ASCENDING), ("specialization", ASCENDING),
+                              ("subject", ASCENDING), ("type", ASCENDING)], True),
+        ("subject_cohort_type", [("year", ASCENDING), ("semester", ASCENDING), ("specialization", ASCENDING),
+                                 ("type", ASCENDING)], False),
+    ],
+    "strength_details": [
+        ("strength_cohort", [("year", ASCENDING), ("specialization", ASCENDING)], False),
+    ],
+    "rooms": [
+        ("room_no", [("room_no", ASCENDING)], False),
+    ],
+    "labs": [
+        ("lab_no", [("lab_no", ASCENDING)], False),
+    ],
+    RESERVATIONS: [
+        ("reservation_slot", [("term", ASCENDING), ("kind", ASCENDING), ("resource", ASCENDING),
+                              ("day", ASCENDING), ("slot", ASCENDING)], True),
+        ("reservation_holder", [("term", ASCENDING), ("holder", ASCENDING)], False),
+    ],
+}
+
+_bootstrapped = set()  # (client address, database name) already checked in this process
+
+
+def bootstrap(db, force=False):
+    """Bring a database up to the current schema: indexes first, then data migrations.
+
+    Safe to run on every startup; runs once per database per process unless
+    `force` is set.
+    """
+    key = (repr(getattr(db, "client", None)), db.name)
+    if key in _bootstrapped and not force:
+        return
+    ensure_indexes(db)
+    migrate_occupancy_documents(db)
+    migrate_reservation_holders(db)
+    _bootstrapped.add(key)
+
+
+def ensure_indexes(db):
+    """Create the indexes in INDEXES that are missing.
+
+    A unique index that cannot be built because of existing duplicates is
+    reported and skipped, so the application still starts; the duplicates have
+    to be cleaned up first.
+    """
+    for collection, indexes in INDEXES.items():
+        for name, keys, unique in indexes:
+            try:
+                db[collection].create_index(keys, name=name, unique=unique)
+            except PyMongoError as e:
+                print(f"Could not create index {name} on {collection}: {e}")
+
+
+def migrate_occupancy_documents(db):
+    """Move the old faculty_ta_occupancy and room_lab_occupancy singleton documents into reservations.
+
+    Bookings already reserved are skipped, and each singleton is deleted only
+    once its bookings are in, so an interrupted migration simply runs again.
+    """
+    faculty_doc = db["faculty_ta_occupancy"].find_one()
+    room_lab_doc = db["room_lab_occupancy"].find_one()
+    if not faculty_doc and not room_lab_doc:
+        return
+    loaded = (faculty_occupancy_from_document(faculty_doc),) + room_lab_occupancy_from_document(room_lab_doc)
+    claims = [reservation_key(DEFAULT_TERM, kind, name, DAYS[d], TIME_SLOTS[s])
+              for kind, occupancy in zip(KINDS, loaded)
+              for name, d, s in booking_changes(BitsetOccupancy(), occupancy)[0]]
+    if claims:
+        try:
+            db[RESERVATIONS].bulk_write([InsertOne(claim) for claim in claims], ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                print(f"Could not migrate occupancy documents: {e}")
+                return
+    db["faculty_ta_occupancy"].delete_many({})
+    db["room_lab_occupancy"].delete_many({})
+    print(f"Migrated {len(claims)} occupancy bookings into {RESERVATIONS}.")
+
+
+def migrate_reservation_holders(db):
+    """Record the holding timetable on reservations saved before reservations had holders.
+
+    Each such reservation goes to the first stored timetable that books its
+    slot. One no timetable books is reported and gets an empty holder: no save
+    releases it, so it stays reserved until deleted by hand.
+    """
+    if db[RESERVATIONS].find_one({"term": DEFAULT_TERM, "holder": None}, {"_id": 1}) is None:
+        return
+    requests = []
+    projection = {"_id": 0, "year": 1, "semester": 1, "batch": 1, "specialization": 1, "data": 1}
+    for timetable_data in db["timetable"].find({}, projection):
+        holder = reservation_holder(timetable_data)
+        for booking in timetable_bookings(timetable_data):
+            requests.append(UpdateOne(dict(reservation_key(DEFAULT_TERM, *booking), holder=None),
+                                      {"$set": {"holder": holder}}))
+    try:
+        if requests:
+            db[RESERVATIONS].bulk_write(requests, ordered=True)
+    except PyMongoError as e:
+        print(f"Could not record reservation holders: {e}")
+        return
+    orphans = [UpdateOne({"_id": doc["_id"]}, {"$set": {"holder": {}}})
+               for doc in db[RESERVATIONS].find({"term": DEFAULT_TERM, "holder": None}, {"_id": 1})]
+    if orphans:
+        db[RESERVATIONS].bulk_write(orphans, ordered=False)
+    print(f"Recorded the holding timetable on {RESERVATIONS}"
+          + (f"; {len(orphans)} reservations belong to no stored timetable and stay reserved." if orphans else "."))
+
+
+def index_usage(db):
+    """{collection: {index name: operations since server start}} from $indexStats (empty where unsupported)."""
+    usage = {}
+    for collection in INDEXES:
+        try:
+            stats = db[collection].aggregate([{"$indexStats": {}}])
+            usage[collection] = {row["name"]: row["accesses"]["ops"] for row in stats}
+        except PyMongoError as e:
+            print(f"Index statistics unavailable for {collection}: {e}")
+            usage[collection] = {}
+    return usage
+
+
+def report_index_usage(db):
+    """Print index usage, flagging the bootstrap indexes that have never served a query."""
+    expected = {collection: {name for name, _, _ in indexes} for collection, indexes in INDEXES.items()}
+    for collection, counts in index_usage(db).items():
+        for name, ops in sorted(counts.items()):
+            note = " (unused)" if ops == 0 and name in expected[collection] else ""
+            print(f"{collection}.{name}: {ops} operations{note}")
+        missing = expected[collection] - set(counts)
+        if counts and missing:
+            print(f"{collection}: missing indexes {sorted(missing)}")
@@ -0,0 +1,202 @@
+from occupancy import DAYS, TIME_SLOTS, SLOTS_PER_DAY
+from solver import LECTURES_PER_SUBJECT, LUNCH_SLOT_INDEX
+
+MIN_LECTURES_PER_DAY = 3
+
+
+def expected_sessions(subjects):
+    """Number of sessions (lab blocks, tutorials, theory lectures) one batch should get."""
+    seen = set()
+    total = 0
+    for sub in subjects:
+        key = (sub["type"], sub["subject"])
+        if key in seen:
+            continue
+        seen.add(key)
+        if sub["type"] in ["Lab", "Tutorial"]:
+            total += 1
+        elif sub["type"] == "Theory":
+            total += LECTURES_PER_SUBJECT
+    return total
+
+
+def score_timetables(timetables, subjects):
+    """Score a cohort's timetables as (unassigned sessions, room failures); lower is better."""
+    expected = expected_sessions(subjects)
+    unassigned = 0
+    room_failures = 0
+
+    for timetable in timetables:
+        placed = 0
+        for day in DAYS:
+            slots = timetable["data"].get(day, {})
+            for slot_index, slot in enumerate(TIME_SLOTS):
+                session = slots.get(slot)
+                if not session:
+                    continue
+                if session["type"] == "Lab":
+                    # A lab block spans two slots; count it (and its lab) once, on the first slot
+                    previous = slots.get(TIME_SLOTS[slot_index - 1]) if slot_index > 0 else None
+                    if previous and previous["type"] == "Lab" and previous["subject"] == session["subject"]:
+                        continue
+                    placed += 1
+                    if not session.get("lab"):
+                        room_failures += 1
+                elif session["type"] in ["Theory", "Tutorial"]:
+                    placed += 1
+                    if not session.get("room"):
+                        room_failures += 1
+        unassigned += max(0, expected - placed)
+
+    return unassigned, room_failures
+
+
+# Weights of the soft terms in WeekScore.total / evaluate_timetables
+WEIGHTS = {
+    "underfilled_days": 3,
+    "load_balance": 2,
+    "spread": 1,
+    "gaps": 1,
+    "back_to_back": 1,
+    "capacity_waste": 0.05
+}
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+def day_gaps(day_mask):
+    """Idle slots between the first and last busy slot of a day mask."""
+    if not day_mask:
+        return 0
+    first = (day_mask & -day_mask).bit_length() - 1
+    return day_mask.bit_length() - first - _popcount(day_mask)
+
+
+def back_to_back_pairs(week_mask, day):
+    """Pairs of directly consecutive busy slots of one resource on a day (the lunch break splits a pair)."""
+    day_mask = (week_mask >> (day * SLOTS_PER_DAY)) & ((1 << SLOTS_PER_DAY) - 1)
+    return _popcount(day_mask & (day_mask >> 1) & ~(1 << LUNCH_SLOT_INDEX))
+
+
+class WeekScore:
+    """Incrementally maintained soft-constraint score of one batch's week.
+
+    add() and remove() touch only the affected day and subject terms, so the cost
+    of moving a session is known after O(days) work instead of rescoring the
+    whole weekly_schedule.
+    """
+
+    def __init__(self, weekly_schedule=None):
+        self.day_masks = [0] * len(DAYS)
+        self.lectures = [0] * len(DAYS)
+        self.subject_days = {}
+        self.gaps = 0
+        self.spread = 0
+        self.underfilled_days = len(DAYS)
+        self.lecture_total = 0
+        self.lecture_squares = 0
+        if weekly_schedule:
+            for d, day in enumerate(DAYS):
+                for s, slot in enumerate(TIME_SLOTS):
+                    session = weekly_schedule[day][slot]
+                    if session:
+                        self.add(session, d, s)
+
+    def add(self, session, d, s, length=1):
+        self._update(session, d, s, length, 1)
+
+    def remove(self, session, d, s, length=1):
+        self._update(session, d, s, length, -1)
+
+    def _update(self, session, d, s, length, sign):
+        if session["type"] == "Office":
+            return
+        window = ((1 << length) - 1) << s
+        self.gaps -= day_gaps(self.day_masks[d])
+        self.day_masks[d] = self.day_masks[d] | window if sign > 0 else self.day_masks[d] & ~window
+        self.gaps += day_gaps(self.day_masks[d])
+        if session["type"] != "Theory":
+            return
+
+        lectures = self.lectures[d]
+        self.underfilled_days -= lectures < MIN_LECTURES_PER_DAY
+        self.lecture_squares -= lectures * lectures
+        lectures += sign * length
+        self.lectures[d] = lectures
+        self.lecture_total += sign * length
+        self.underfilled_days += lectures < MIN_LECTURES_PER_DAY
+        self.lecture_squares += lectures * lectures
+
+        # spread: a subject's same-day lecture pairs count double, consecutive-day pairs once;
+        # only the pairs involving day d change
+        day_counts = self.subject_days.setdefault(session["subject"], [0] * len(DAYS))
+        count = day_counts[d]
+        new_count = count + sign * length
+        neighbours = (day_counts[d - 1] if d > 0 else 0) + (day_counts[d + 1] if d + 1 < len(DAYS) else 0)
+        self.spread += new_count * (new_count - 1) - count * (count - 1) + (new_count - count) * neighbours
+        day_counts[d] = new_count
+
+    def load_balance(self):
+        """Squared deviation of the daily lecture counts from their mean."""
+        return self.lecture_squares - self.lecture_total * self.lecture_total / len(DAYS)
+
+    def breakdown(self):
+        return {
+            "underfilled_days": self.underfilled_days,
+            "load_balance": self.load_balance(),
+            "spread": self.spread,
+            "gaps": self.gaps
+        }
+
+    def total(self):
+        return (WEIGHTS["underfilled_days"] * self.underfilled_days + WEIGHTS["load_balance"] * self.load_balance()
+                + WEIGHTS["spread"] * self.spread + WEIGHTS["gaps"] * self.gaps)
+
+
+def instructor_back_to_back(faculty_ta_occupancy, instructors=None):
+    """Back-to-back slot pairs summed over the given (default: all) instructors of a BitsetOccupancy."""
+    total = 0
+    for name, mask in zip(faculty_ta_occupancy.names, faculty_ta_occupancy.masks):
+        if instructors is None or name in instructors:
+            total += sum(back_to_back_pairs(mask, d) for d in range(len(DAYS)))
+    return total
+
+
+def capacity_waste(timetables, rooms, labs):
+    """Empty seats summed over every session that has a room or lab."""
+    room_capacity = {room["room_no"]: room.get("capacity", 0) for room in rooms}
+    lab_capacity = {lab["lab_no"]: lab.get("strength", 0) for lab in labs}
+    waste = 0
+    for timetable in timetables:
+        for slots in timetable["data"].values():
+            for session in slots.values():
+                if not session:
+                    continue
+                if session.get("room") in room_capacity:
+                    waste += max(0, room_capacity[session["room"]] - timetable["batch_strength"])
+                elif session.get("lab") in lab_capacity:
+                    waste += max(0, lab_capacity[session["lab"]] - timetable["batch_strength"])
+    return waste
+
+
+def evaluate_timetables(timetables, subjects, faculty_ta_occupancy=None, faculty_ta_to_track=None,
+                        rooms=None, labs=None):
+    """Full quality report of a set of timetables: every hard and soft term plus the weighted total.
+
+    unassigned (missing sessions) and room_failures (sessions without a room or
+    lab) are reported separately and not folded into "total".
+    """
+    unassigned, room_failures = score_timetables(timetables, subjects)
+    report = {"unassigned": unassigned, "room_failures": room_failures,
+              "underfilled_days": 0, "load_balance": 0, "spread": 0, "gaps": 0}
+    for timetable in timetables:
+        for term, value in WeekScore(timetable["data"]).breakdown().items():
+            report[term] += value
+    report["back_to_back"] = (
+        instructor_back_to_back(faculty_ta_occupancy, faculty_ta_to_track) if faculty_ta_occupancy else 0
+    )
+    report["capacity_waste"] = capacity_waste(timetables, rooms, labs) if rooms is not None else 0
+    report["total"] = sum(WEIGHTS[term] * report[term] for term in WEIGHTS)
+    return report
@@ -0,0 +1,150 @@
+import argparse
+import datetime
+import glob
+import gzip
+import os
+
+import bson
+from pymongo import InsertOne
+
+from database import get_db
+from persistence import supports_transactions
+from repository import Repository
+from reservations import RESERVATIONS
+
+SNAPSHOT_MAGIC = b"TTSNAP\n"
+SNAPSHOT_FORMAT = 1  # bump when the layout below changes; import refuses newer formats
+SNAPSHOT_COLLECTIONS = ("Subject_collection", "strength_details", "rooms", "labs", "timetable", RESERVATIONS)
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+KEEP_SNAPSHOTS = 10  # automatic snapshots kept in SNAPSHOT_DIR
+COMPRESS_LEVEL = 6
+INSERT_BATCH = 1000  # documents per bulk insert on restore
+
+# File layout, gzip-compressed: SNAPSHOT_MAGIC, a BSON header {"format", "created", "database"}, then for
+# each collection a {"$collection": name} marker followed by its documents, one BSON document each, and a
+# {"$end": {name: count}} trailer that import checks so a truncated file is never restored.
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is not one this code can restore."""
+
+
+def export_snapshot(db, path, collections=SNAPSHOT_COLLECTIONS):
+    """Stream `collections` of `db` into a compressed snapshot file at `path`; returns {collection: count}.
+
+    The file is written next to `path` and renamed into place, so an interrupted
+    export never replaces a good snapshot.
+    """
+    counts = {}
+    partial = path + ".partial"
+    with gzip.open(partial, "wb", compresslevel=COMPRESS_LEVEL) as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(bson.encode({"format": SNAPSHOT_FORMAT, "created": datetime.datetime.now(datetime.timezone.utc),
+                             "database": db.name}))
+        for name in collections:
+            f.write(bson.encode({"$collection": name}))
+            counts[name] = 0
+            for document in db[name].find().batch_size(INSERT_BATCH):
+                f.write(bson.encode(document))
+                counts[name] += 1
+        f.write(bson.encode({"$end": counts}))
+    os.replace(partial, path)
+    print(f"Snapshot of {sum(counts.values())} documents written to {path}: {counts}")
+    return counts
+
+
+def read_snapshot(path):
+    """(header, {collection: [documents]}) from a snapshot file; SnapshotError if it is damaged or too new."""
+    try:
+        with gzip.open(path, "rb") as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"{path} is not a timetable snapshot")
+            records = bson.decode_file_iter(f)
+            header = next(records, None)
+            if not header or header.get("format", SNAPSHOT_FORMAT + 1) > SNAPSHOT_FORMAT:
+                raise SnapshotError(f"{path} was written by a newer version (format {header and header.get('format')})")
+            collections, current, trailer = {}, None, None
+            for record in records:
+                if "$collection" in record:
+                    current = collections.setdefault(record["$collection"], [])
+                elif "$end" in record:
+                    trailer = record["$end"]
+                    break
+                elif current is None:
+                    raise SnapshotError(f"{path} has documents outside any collection")
+                else:
+                    current.append(record)
+    except (OSError, EOFError, bson.errors.BSONError) as e:
+        raise SnapshotError(f"{path} could not be read: {e}")
+
+    if trailer is None or trailer != {name: len(documents) for name, documents in collections.items()}:
+        raise SnapshotError(f"{path} is incomplete")
+    return header, collections
+
+
+def import_snapshot(db, path):
+    """Replace the snapshot's collections in `db` with its contents; returns {collection: count}.
+
+    The whole file is read and checked before anything is deleted. The
+    collections are then emptied and refilled with bulk inserts, in one
+    transaction where the server supports it. Indexes are kept.
+    """
+    header, collections = read_snapshot(path)
+
+    def restore(session=None):
+        for name, documents in collections.items():
+            db[name].delete_many({}, session=session)
+            for start in range(0, len(documents), INSERT_BATCH):
+                db[name].bulk_write([InsertOne(document) for document in documents[start:start + INSERT_BATCH]],
+                                    ordered=False, session=session)
+
+    if supports_transactions(db):
+        with db.client.start_session() as session:
+            session.with_transaction(restore)
+    else:
+        restore()
+    Repository(db).invalidate()
+
+    counts = {name: len(documents) for name, documents in collections.items()}
+    print(f"Restored snapshot {path} taken {header.get('created')}: {counts}")
+    return counts
+
+
+def take_snapshot(db, directory=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    """Write a timestamped snapshot into `directory` and delete all but the newest `keep`; returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, datetime.datetime.now().strftime("snapshot-%Y%m%d-%H%M%S-%f.ttsnap"))
+    export_snapshot(db, path)
+    for old in list_snapshots(directory)[:-keep]:
+        os.remove(old)
+    return path
+
+
+def list_snapshots(directory=SNAPSHOT_DIR):
+    """Snapshot files in `directory`, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, "snapshot-*.ttsnap")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or restore the scheduling dataset.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="write a snapshot").add_argument("path", nargs="?",
+                                                                     help=f"file (default: a new one in {SNAPSHOT_DIR})")
+    commands.add_parser("restore", help="replace the dataset with a snapshot").add_argument(
+        "path", nargs="?", help="file (default: the newest one in the snapshots directory)")
+    commands.add_parser("list", help="list the automatic snapshots")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for snapshot_path in list_snapshots():
+            print(snapshot_path)
+    elif args.command == "export":
+        if args.path:
+            export_snapshot(get_db(), args.path)
+        else:
+            take_snapshot(get_db())
+    else:
+        snapshot_path = args.path or (list_snapshots() or [None])[-1]
+        if snapshot_path is None:
+            parser.error(f"no snapshots in {SNAPSHOT_DIR}")
+        import_snapshot(get_db(), snapshot_path)
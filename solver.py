@@ -0,0 +1,500 @@
+import random
+
+from occupancy import DAYS, TIME_SLOTS, window_mask
+from problem import ProblemModel
+from progress import ProgressEvent
+
+LUNCH_SLOT_INDEX = 2  # A lab starting here would run across the lunch break
+LECTURES_PER_SUBJECT = 3
+
+
+class SchedulingError(Exception):
+    """Raised when the solver cannot produce a complete placement for a cohort."""
+
+
+class GenerationCancelled(SchedulingError):
+    """Raised when a generation is cancelled or runs out of time before it has any result to return."""
+
+
+class GenerationIncomplete(GenerationCancelled):
+    """Raised when a generation stopped early with a partial result, which is not saved.
+
+    `timetables` holds the partial result for preview and `unassigned` the number
+    of sessions it is missing.
+    """
+
+    def __init__(self, message, timetables, unassigned):
+        super().__init__(message)
+        self.timetables = timetables
+        self.unassigned = unassigned
+
+
+class Session:
+    """One schedulable item (a lab block, a tutorial or a single theory lecture) for one batch."""
+
+    __slots__ = ("index", "cohort", "batch", "group", "subject", "subject_id", "type", "instructor",
+                 "instructor_id", "tracked", "length", "occurrence", "domain", "neighbors", "value")
+
+    def __init__(self, index, cohort, batch, group, subject, session_type, instructor, tracked, length,
+                 occurrence=0):
+        self.index = index
+        self.cohort = cohort
+        self.batch = batch
+        self.group = group  # dense id of the (cohort, batch) pair; keys the per-batch state
+        self.subject = subject
+        self.subject_id = None  # dense id from the cohort's ProblemModel
+        self.type = session_type
+        self.instructor = instructor
+        self.instructor_id = None
+        self.tracked = tracked
+        self.length = length
+        self.occurrence = occurrence
+        self.domain = set()
+        self.neighbors = []
+        self.value = None
+
+    def describe(self):
+        cohort = f"{self.cohort}, " if self.cohort else ""
+        return f"{self.type} '{self.subject}' ({self.instructor}) for {cohort}batch {self.batch}"
+
+
+class TimetableSolver:
+    """Constraint-propagation solver for the weekly schedules of one or more cohorts.
+
+    Every lab, tutorial and theory lecture of every batch becomes a variable whose
+    domain is the set of (day, slot) start positions it may take. Variables are
+    assigned most-constrained-first, each assignment is forward-checked against the
+    per-batch grid masks and the shared faculty/TA BitsetOccupancy, and the search
+    backtracks until it either completes the cohort or exhausts the domains (proving
+    no placement exists) or the backtrack budget.
+
+    Several cohorts can be solved jointly (see for_cohorts) so that the most
+    constrained sessions of the whole institution are placed first.
+    """
+
+    def __init__(self, subjects, num_batches, faculty_ta_to_track, faculty_ta_occupancy,
+                 seed=None, max_backtracks=20000, label=None, model=None, should_stop=None, progress=None):
+        self.cohorts = [(label, subjects, num_batches)]
+        self.model = model  # precompiled ProblemModel of `subjects`, reused instead of compiling again
+        self.should_stop = should_stop  # callable; when it returns True the search stops with its best partial result
+        self.progress = progress  # callable receiving ProgressEvent objects
+        self.complete = True
+        self.faculty_ta_to_track = faculty_ta_to_track
+        self.faculty_ta_occupancy = faculty_ta_occupancy
+        self.rng = random.Random(seed)
+        self.max_backtracks = max_backtracks
+        self.backtracks = 0
+
+    @classmethod
+    def for_cohorts(cls, cohorts, faculty_ta_to_track, faculty_ta_occupancy, seed=None, max_backtracks=20000,
+                    should_stop=None, progress=None):
+        """Build a solver over several cohorts given as (label, subjects, num_batches) tuples.
+
+        `subjects` may also be the cohort's already compiled ProblemModel.
+        """
+        solver = cls([], 0, faculty_ta_to_track, faculty_ta_occupancy, seed=seed, max_backtracks=max_backtracks,
+                     should_stop=should_stop, progress=progress)
+        solver.cohorts = list(cohorts)
+        return solver
+
+    def build_sessions(self):
+        """Expand every cohort into one variable per session per batch."""
+        sessions = []
+        self.groups = []
+        for label, subjects, num_batches in self.cohorts:
+            if isinstance(subjects, ProblemModel):
+                model = subjects
+            elif self.model is not None and len(self.cohorts) == 1:
+                model = self.model
+            else:
+                model = ProblemModel(subjects, self.faculty_ta_to_track, self.faculty_ta_occupancy)
+            for batch in range(1, num_batches + 1):
+                self._add_batch_sessions(sessions, label, batch, len(self.groups), model)
+                self.groups.append((label, batch))
+        return sessions
+
+    def _add_batch_sessions(self, sessions, label, batch, group, model):
+        def add(subject_id, instructor_id, session_type, length, occurrence=0):
+            occupancy_id = model.occupancy_ids[instructor_id]
+            session = Session(len(sessions), label, batch, group, model.subject_names[subject_id], session_type,
+                              model.instructor_names[instructor_id], occupancy_id >= 0, length, occurrence)
+            session.subject_id = subject_id
+            if occupancy_id >= 0:
+                session.instructor_id = occupancy_id
+            sessions.append(session)
+
+        for subject_id, instructor_id in model.lab_sessions:
+            add(subject_id, instructor_id, "Lab", 2)
+        for subject_id, instructor_id in model.tutorial_sessions:
+            add(subject_id, instructor_id, "Tutorial", 1)
+        for subject_id, instructor_id in model.theory_sessions:
+            for occurrence in range(LECTURES_PER_SUBJECT):
+                add(subject_id, instructor_id, "Theory", 1, occurrence)
+
+    def solve(self):
+        """Return one weekly schedule per batch of the (single) cohort.
+
+        Tracked instructors are booked into the shared occupancy. Raises
+        SchedulingError when no complete placement exists or the backtrack budget
+        runs out first. If should_stop fires first, the largest partial placement
+        found is returned instead and self.complete is False.
+        """
+        return self.solve_all()[0]
+
+    def solve_all(self):
+        """Return, for every cohort in order, its list of weekly schedules (one per batch)."""
+        self._prepare()
+        self._search_remaining()
+
+        schedules = [{day: {slot: None for slot in TIME_SLOTS} for day in DAYS} for _ in self.groups]
+        for session in self.sessions:
+            if session.value is None:
+                continue  # unplaced in an interrupted search
+            d, s = session.value
+            for k in range(session.length):
+                schedules[session.group][DAYS[d]][TIME_SLOTS[s + k]] = {
+                    "subject": session.subject,
+                    "type": session.type,
+                    "instructor": session.instructor
+                }
+
+        results = []
+        group = 0
+        for _, _, num_batches in self.cohorts:
+            results.append(schedules[group:group + num_batches])
+            group += num_batches
+        return results
+
+    def repair(self, schedules):
+        """Re-place only the sessions of a cohort's existing weekly schedules that are no longer valid.
+
+        A stored session keeps its slot when its subject and type still exist and
+        it does not clash with the current instructor's bookings; its instructor is
+        updated in place. Everything else (clashing sessions and sessions missing from
+        the schedules) is searched for around the kept ones, and sessions of removed
+        subjects are dropped. If that search fails, the affected batches are re-solved
+        from scratch around the untouched ones. Returns (schedules, changed) where
+        changed is the set of batch indexes whose schedule differs; unchanged
+        schedules are returned as is.
+        """
+        try:
+            return self._repair(schedules, set())
+        except SchedulingError as e:
+            print(f"Keeping the valid sessions of the affected batches failed ({e}); re-solving those batches.")
+            return self._repair(schedules, self.changed)
+
+    def _repair(self, schedules, free_groups):
+        self._prepare()
+        changed = self.changed = set(free_groups)
+        kept = {}
+        for group, weekly_schedule in enumerate(schedules):
+            if group in free_groups:
+                continue
+            placements = self._stored_placements(weekly_schedule)
+            for session in self.sessions:
+                if session.group != group:
+                    continue
+                candidates = placements.get((session.type, session.subject))
+                if not candidates:
+                    changed.add(group)
+                    continue
+                value, cells = candidates.pop(0)
+                if self._clashes(session, value):
+                    changed.add(group)
+                    continue
+                session.value = value
+                self._place(session, value, True)
+                kept[session.index] = cells
+                if any(cell.get("instructor") != session.instructor for cell in cells):
+                    changed.add(group)
+            if any(placements.values()):
+                changed.add(group)  # sessions of removed subjects
+
+        self._search_remaining()
+
+        results = []
+        for group, weekly_schedule in enumerate(schedules):
+            if group not in changed:
+                results.append(weekly_schedule)
+                continue
+            repaired = {
+                day: {slot: cell if cell and cell.get("type") == "Office" else None for slot, cell in slots.items()}
+                for day, slots in weekly_schedule.items()
+            }
+            for session in self.sessions:
+                if session.group != group:
+                    continue
+                d, s = session.value
+                cells = kept.get(session.index) or [
+                    {"subject": session.subject, "type": session.type} for _ in range(session.length)
+                ]
+                for k, cell in enumerate(cells):
+                    cell["instructor"] = session.instructor
+                    repaired[DAYS[d]][TIME_SLOTS[s + k]] = cell
+            results.append(repaired)
+        return results, changed
+
+    def _stored_placements(self, weekly_schedule):
+        """Group the cells of a stored schedule into {(type, subject): [((day, slot), cells), ...]}."""
+        placements = {}
+        for d, day in enumerate(DAYS):
+            slots = weekly_schedule.get(day, {})
+            s = 0
+            while s < len(TIME_SLOTS):
+                cell = slots.get(TIME_SLOTS[s])
+                if not cell or cell.get("type") not in ["Lab", "Tutorial", "Theory"]:
+                    s += 1
+                    continue
+                length = 1
+                if cell["type"] == "Lab":
+                    following = slots.get(TIME_SLOTS[s + 1]) if s + 1 < len(TIME_SLOTS) else None
+                    if not following or following.get("type") != "Lab" or following.get("subject") != cell["subject"]:
+                        s += 1  # a half lab block cannot be kept
+                        continue
+                    length = 2
+                cells = [slots[TIME_SLOTS[s + k]] for k in range(length)]
+                placements.setdefault((cell["type"], cell["subject"]), []).append(((d, s), cells))
+                s += length
+        return placements
+
+    def _clashes(self, session, value):
+        """True if a kept session would overlap its batch or a booking of its tracked instructor."""
+        window = window_mask(value[0], value[1], session.length)
+        if self.batch_masks[session.group] & window:
+            return True
+        return session.tracked and bool(self.faculty_ta_occupancy.masks[session.instructor_id] & window)
+
+    def _prepare(self):
+        self.sessions = self.build_sessions()
+        self.placed = 0
+        self.best_placed = -1
+        self.best_values = {}
+        self.complete = True
+        groups = range(len(self.groups))
+        self.batch_masks = [0 for _ in groups]
+        self.lab_days = [set() for _ in groups]
+        self.subject_days = [{} for _ in groups]
+        self.theory_days = [{} for _ in groups]
+        self.theory_per_day = [[0] * len(DAYS) for _ in groups]
+        self._link_neighbors()
+
+    def _search_remaining(self):
+        """Compute domains for every unassigned session and search for a complete placement."""
+        for session in self.sessions:
+            if session.value is not None:
+                continue
+            starts = range(len(TIME_SLOTS) - session.length + 1)
+            session.domain = {
+                (d, s) for d in range(len(DAYS)) for s in starts
+                if not (session.length == 2 and s == LUNCH_SLOT_INDEX) and self._fits(session, (d, s))
+            }
+            if not session.domain:
+                self._release_all()
+                raise SchedulingError(f"No placement exists: {session.describe()} has no free slot in the week.")
+
+        self.trail = []
+        self.backtracks = 0
+        try:
+            solved = self._search()
+        except SchedulingError:
+            self._release_all()
+            raise
+        if solved is None:
+            # Interrupted: fall back to the largest partial placement seen
+            self._release_all()
+            for index, value in self.best_values.items():
+                session = self.sessions[index]
+                session.value = value
+                self._place(session, value, True)
+            self.complete = False
+            print(f"Search stopped early; returning the best partial placement "
+                  f"({self.placed}/{len(self.sessions)} sessions).")
+            return
+        if not solved:
+            self._release_all()
+            raise SchedulingError(
+                f"No placement exists after exploring {self.backtracks} dead ends; "
+                f"most contested session: {self.most_contested.describe()}."
+            )
+
+    def _release_all(self):
+        """Undo every assignment so a failed search leaves the shared occupancy untouched."""
+        for session in self.sessions:
+            if session.value is not None:
+                self._place(session, session.value, False)
+                session.value = None
+
+    def _link_neighbors(self):
+        """Connect sessions that constrain each other: same batch, or same tracked instructor."""
+        by_batch = {}
+        by_instructor = {}
+        for session in self.sessions:
+            by_batch.setdefault(session.group, []).append(session)
+            if session.tracked:
+                by_instructor.setdefault(session.instructor, []).append(session)
+        for session in self.sessions:
+            linked = {other.index: other for other in by_batch[session.group]}
+            if session.tracked:
+                linked.update((other.index, other) for other in by_instructor[session.instructor])
+            linked.pop(session.index)
+            session.neighbors = list(linked.values())
+        self.failures = [0] * len(self.sessions)
+        self.most_contested = self.sessions[0] if self.sessions else None
+
+    def _fits(self, session, value):
+        """Check a start position against the current partial assignment."""
+        d, s = value
+        window = window_mask(d, s, session.length)
+        if self.batch_masks[session.group] & window:
+            return False
+        if session.tracked and self.faculty_ta_occupancy.masks[session.instructor_id] & window:
+            return False
+        if session.type == "Lab":
+            if d in self.lab_days[session.group]:
+                return False
+            if d in self.theory_days[session.group].get(session.subject_id, ()):
+                return False
+        elif session.type == "Tutorial":
+            if d in self.theory_days[session.group].get(session.subject_id, ()):
+                return False
+        else:
+            if d in self.subject_days[session.group].get(session.subject_id, ()):
+                return False
+        return True
+
+    def _place(self, session, value, add):
+        d, s = value
+        group = session.group
+        window = window_mask(d, s, session.length)
+        self.placed += 1 if add else -1
+        if add:
+            self.batch_masks[group] |= window
+            if session.tracked:
+                self.faculty_ta_occupancy.masks[session.instructor_id] |= window
+        else:
+            self.batch_masks[group] &= ~window
+            if session.tracked:
+                self.faculty_ta_occupancy.masks[session.instructor_id] &= ~window
+        days = self.subject_days[group].setdefault(session.subject_id, [])
+        if add:
+            days.append(d)
+        else:
+            days.remove(d)
+        if session.type == "Lab":
+            if add:
+                self.lab_days[group].add(d)
+            else:
+                self.lab_days[group].discard(d)
+        elif session.type == "Theory":
+            theory = self.theory_days[group].setdefault(session.subject_id, [])
+            if add:
+                theory.append(d)
+                self.theory_per_day[group][d] += 1
+            else:
+                theory.remove(d)
+                self.theory_per_day[group][d] -= 1
+
+    def _assign(self, session, value):
+        """Assign a value and forward-check its neighbours.
+
+        Returns (ok, mark) where mark is the trail position to undo back to.
+        """
+        session.value = value
+        self._place(session, value, True)
+        mark = len(self.trail)
+        for other in session.neighbors:
+            if other.value is not None:
+                continue
+            removed = {v for v in other.domain if not self._fits(other, v)}
+            if (other.type == "Theory" and session.type == "Theory" and other.group == session.group
+                    and other.subject_id == session.subject_id):
+                # Interchangeable lectures of one subject are kept in day order
+                if other.occurrence > session.occurrence:
+                    removed.update(v for v in other.domain if v[0] <= value[0])
+                else:
+                    removed.update(v for v in other.domain if v[0] >= value[0])
+            for v in removed:
+                other.domain.discard(v)
+                self.trail.append((other, v))
+            if not other.domain:
+                self.failures[other.index] += 1
+                if self.failures[other.index] > self.failures[self.most_contested.index]:
+                    self.most_contested = other
+                return False, mark
+        return True, mark
+
+    def _unassign(self, session, mark):
+        while len(self.trail) > mark:
+            other, v = self.trail.pop()
+            other.domain.add(v)
+        self._place(session, session.value, False)
+        session.value = None
+
+    def _select(self):
+        """Most-constrained-first: smallest live domain, then longest session, then most neighbours."""
+        best = None
+        best_key = None
+        for session in self.sessions:
+            if session.value is not None:
+                continue
+            key = (len(session.domain), -session.length, not session.tracked, -len(session.neighbors))
+            if best is None or key < best_key:
+                best, best_key = session, key
+        return best
+
+    def _order_values(self, session):
+        """Spread lectures across the week and keep tracked faculty off back-to-back slots."""
+        load = self.theory_per_day[session.group]
+        occupancy = self.faculty_ta_occupancy
+
+        def cost(value):
+            d, s = value
+            adjacent = session.tracked and not occupancy.adjacent_free(session.instructor, d, s, session.length)
+            return (load[d] if session.type == "Theory" else 0, adjacent, s, self.rng.random())
+
+        return sorted(session.domain, key=cost)
+
+    def _search(self):
+        """Iterative depth-first search; True when complete, False when exhausted, None when stopped early."""
+        first = self._select()
+        if first is None:
+            return True
+        stack = [[first, self._order_values(first), 0, None]]
+        steps = 0
+        while stack:
+            steps += 1
+            if steps % 256 == 0:
+                if self.progress is not None:
+                    self.progress(ProgressEvent("schedule", placed=self.placed, total=len(self.sessions)))
+                if self.should_stop is not None and self.should_stop():
+                    return None
+            frame = stack[-1]
+            session, values, position, mark = frame
+            if mark is not None:
+                self._unassign(session, mark)
+                frame[3] = None
+            if position >= len(values):
+                stack.pop()
+                self.backtracks += 1
+                if self.backtracks > self.max_backtracks:
+                    raise SchedulingError(
+                        f"Search budget of {self.max_backtracks} backtracks exhausted; "
+                        f"most contested session: {self.most_contested.describe()}."
+                    )
+                continue
+            value = values[position]
+            frame[2] = position + 1
+            ok, trail_mark = self._assign(session, value)
+            if not ok:
+                # Forward checking wiped out a neighbour's domain
+                self._unassign(session, trail_mark)
+                continue
+            frame[3] = trail_mark
+            if self.should_stop is not None and self.placed > self.best_placed:
+                self.best_placed = self.placed
+                self.best_values = {other.index: other.value for other in self.sessions if other.value is not None}
+            following = self._select()
+            if following is None:
+                return True
+            stack.append([following, self._order_values(following), 0, None])
+        return False
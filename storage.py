@@ -0,0 +1,444 @@
+import copy
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from bson import ObjectId, json_util
+from pymongo import InsertOne, UpdateOne, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, OperationFailure
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DUPLICATE_KEY = 11000  # MongoDB's duplicate key error code, which persistence and schema check for
+
+InsertResult = namedtuple("InsertResult", ["inserted_id"])
+UpdateResult = namedtuple("UpdateResult", ["matched_count", "modified_count", "upserted_id"])
+DeleteResult = namedtuple("DeleteResult", ["deleted_count"])
+BulkResult = namedtuple("BulkResult", ["inserted_count", "upserted_count", "matched_count", "modified_count",
+                                       "deleted_count"])
+TopologyDescription = namedtuple("TopologyDescription", ["topology_type_name"])
+
+
+def _matches(document, query):
+    """Equality (or {"$in": [...]}) match on top-level fields; as in MongoDB, a missing field equals None."""
+    for key, value in (query or {}).items():
+        if isinstance(value, dict) and list(value) == ["$in"]:
+            if document.get(key) not in value["$in"]:
+                return False
+            continue
+        if key.startswith("$") or (isinstance(value, dict) and any(k.startswith("$") for k in value)):
+            raise OperationFailure(f"Query operators ({key}) are not supported by the embedded store")
+        if document.get(key) != value:
+            return False
+    return True
+
+
+def _project(document, projection):
+    """A deep copy of `document` limited to an inclusion or exclusion projection."""
+    if projection:
+        included = [key for key, value in projection.items() if value and key != "_id"]
+        if included:
+            keep = set(included) | ({"_id"} if projection.get("_id", 1) else set())
+            document = {key: value for key, value in document.items() if key in keep}
+        else:
+            document = {key: value for key, value in document.items() if projection.get(key, 1)}
+    return copy.deepcopy(document)
+
+
+def _apply_update(document, update):
+    for operator, fields in update.items():
+        if operator == "$set":
+            for key, value in fields.items():
+                document[key] = copy.deepcopy(value)
+        elif operator == "$unset":
+            for key in fields:
+                document.pop(key, None)
+        else:
+            raise OperationFailure(f"Update operator {operator} is not supported by the embedded store")
+
+
+def _id_first(document):
+    """The document with its _id (a new ObjectId if missing) as the first field, as MongoDB stores it."""
+    return dict({"_id": document.get("_id", ObjectId())}, **{k: v for k, v in document.items() if k != "_id"})
+
+
+def _lock_file(path):
+    """Open `path` and lock it exclusively without waiting; None if another process holds the lock."""
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def _index_key(document, fields):
+    return json_util.dumps([document.get(field) for field in fields])
+
+
+class EmbeddedCursor:
+    """The documents of a find(), already materialized."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class EmbeddedCollection:
+    """The part of pymongo's Collection API the application uses, over documents held in memory.
+
+    Queries are equality filters. One that fixes _id, or every field of a
+    unique index, is answered by a dict lookup; any other is evaluated by a
+    scan. Unique indexes are enforced (DuplicateKeyError, or BulkWriteError with code 11000 in a
+    bulk_write), other indexes are only recorded.
+    """
+
+    def __init__(self, database, name):
+        self.database = database
+        self.client = database.client
+        self.name = name
+        self.documents = {}  # _id -> document, in insertion order
+        self.indexes = {}  # index name -> (fields, unique)
+        self.unique_keys = {}  # unique index name -> {key: _id}
+
+    def _put(self, _id, document):
+        """Replace the document stored under _id (None removes it), keeping the unique index maps in step."""
+        old = self.documents.get(_id)
+        for name, keys in self.unique_keys.items():
+            fields = self.indexes[name][0]
+            if old is not None and keys.get(_index_key(old, fields)) == _id:
+                del keys[_index_key(old, fields)]
+            if document is not None:
+                keys[_index_key(document, fields)] = _id
+        if document is None:
+            self.documents.pop(_id, None)
+        else:
+            self.documents[_id] = document
+        return old
+
+    def _write(self, _id, document):
+        if document is not None:
+            for name, keys in self.unique_keys.items():
+                key = _index_key(document, self.indexes[name][0])
+                if keys.get(key, _id) != _id:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: {name} "
+                        f"dup key: {key}", DUPLICATE_KEY
+                    )
+        old = self._put(_id, document)
+        self.client._changed(self, _id, old, document)
+
+    def _candidates(self, filter):
+        """(_id, document) pairs that can match `filter`: at most one when it fixes _id or every field of a
+        unique index to a plain value, otherwise all of them. Callers still check each with _matches."""
+        filter = filter or {}
+        if "_id" in filter and not isinstance(filter["_id"], (dict, list)):
+            document = self.documents.get(filter["_id"])
+            return [] if document is None else [(filter["_id"], document)]
+        for name, keys in self.unique_keys.items():
+            fields = self.indexes[name][0]
+            if all(field in filter and not isinstance(filter[field], dict) for field in fields):
+                _id = keys.get(_index_key(filter, fields))
+                return [] if _id is None else [(_id, self.documents[_id])]
+        return self.documents.items()
+
+    def find(self, filter=None, projection=None, session=None):
+        with self.client._lock:
+            return EmbeddedCursor([
+                _project(document, projection) for _, document in self._candidates(filter) if _matches(document, filter)
+            ])
+
+    def find_one(self, filter=None, projection=None, session=None):
+        with self.client._lock:
+            for _, document in self._candidates(filter):
+                if _matches(document, filter):
+                    return _project(document, projection)
+        return None
+
+    def count_documents(self, filter, session=None):
+        with self.client._lock:
+            return sum(1 for _, document in self._candidates(filter) if _matches(document, filter))
+
+    def insert_one(self, document, session=None):
+        with self.client._lock:
+            document.setdefault("_id", ObjectId())
+            if document["_id"] in self.documents:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.database.name}.{self.name} "
+                                        f"index: _id_ dup key: {document['_id']}", DUPLICATE_KEY)
+            self._write(document["_id"], _id_first(copy.deepcopy(document)))
+            return InsertResult(document["_id"])
+
+    def insert_many(self, documents, ordered=True, session=None):
+        with self.client._lock, self.client._batch():
+            return [self.insert_one(document).inserted_id for document in documents]
+
+    def update_one(self, filter, update, upsert=False, session=None):
+        with self.client._lock:
+            for _id, document in self._candidates(filter):
+                if _matches(document, filter):
+                    updated = dict(document)
+                    _apply_update(updated, update)
+                    if updated.get("_id") != _id:
+                        raise OperationFailure("Performing an update on the path '_id' would modify the immutable field")
+                    if updated == document:
+                        return UpdateResult(1, 0, None)
+                    self._write(_id, updated)
+                    return UpdateResult(1, 1, None)
+            if not upsert:
+                return UpdateResult(0, 0, None)
+
+            document = copy.deepcopy(filter or {})
+            _apply_update(document, update)
+            document = _id_first(document)
+            if document["_id"] in self.documents:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.database.name}.{self.name} "
+                                        f"index: _id_ dup key: {document['_id']}", DUPLICATE_KEY)
+            self._write(document["_id"], document)
+            return UpdateResult(0, 0, document["_id"])
+
+    def delete_one(self, filter, session=None):
+        with self.client._lock:
+            for _id, document in self._candidates(filter):
+                if _matches(document, filter):
+                    self._write(_id, None)
+                    return DeleteResult(1)
+        return DeleteResult(0)
+
+    def delete_many(self, filter, session=None):
+        with self.client._lock, self.client._batch():
+            matched = [_id for _id, document in self._candidates(filter) if _matches(document, filter)]
+            for _id in matched:
+                self._write(_id, None)
+        return DeleteResult(len(matched))
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        """InsertOne, UpdateOne, DeleteOne and DeleteMany requests; duplicate keys are reported like pymongo's."""
+        counts = dict.fromkeys(("nInserted", "nUpserted", "nMatched", "nModified", "nRemoved"), 0)
+        errors = []
+        with self.client._lock, self.client._batch():
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self.insert_one(request._doc)
+                        counts["nInserted"] += 1
+                    elif isinstance(request, UpdateOne):
+                        result = self.update_one(request._filter, request._doc, upsert=request._upsert)
+                        counts["nMatched"] += result.matched_count
+                        counts["nModified"] += result.modified_count
+                        counts["nUpserted"] += result.upserted_id is not None
+                    elif isinstance(request, DeleteOne):
+                        counts["nRemoved"] += self.delete_one(request._filter).deleted_count
+                    elif isinstance(request, DeleteMany):
+                        counts["nRemoved"] += self.delete_many(request._filter).deleted_count
+                    else:
+                        raise OperationFailure(f"{type(request).__name__} is not supported by the embedded store")
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError(dict(counts, writeErrors=errors, writeConcernErrors=[], upserted=[]))
+        return BulkResult(counts["nInserted"], counts["nUpserted"], counts["nMatched"], counts["nModified"],
+                          counts["nRemoved"])
+
+    def create_index(self, keys, name=None, unique=False, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        fields = [field for field, _ in keys]
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        with self.client._lock:
+            if name in self.indexes:
+                return name
+            if unique:
+                seen = {}
+                for _id, document in self.documents.items():
+                    key = _index_key(document, fields)
+                    if key in seen:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.database.name}."
+                                                f"{self.name} index: {name} dup key: {key}", DUPLICATE_KEY)
+                    seen[key] = _id
+                self.unique_keys[name] = seen
+            self.indexes[name] = (fields, unique)
+        return name
+
+    def aggregate(self, pipeline, **kwargs):
+        raise OperationFailure("Aggregation pipelines are not supported by the embedded store")
+
+
+class EmbeddedDatabase:
+    supports_aggregation = False  # Repository groups the subject rows itself
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name):
+        with self.client._lock:
+            if name not in self.collections:
+                self.collections[name] = EmbeddedCollection(self, name)
+            return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self):
+        return [name for name, collection in self.collections.items() if collection.documents]
+
+
+class EmbeddedSession:
+    """Session whose with_transaction runs the callback under the client lock and undoes it on error."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def with_transaction(self, callback):
+        with self.client._lock:
+            self.client._begin()
+            try:
+                result = callback(self)
+            except BaseException:
+                self.client._rollback()
+                raise
+            self.client._commit()
+            return result
+
+
+class EmbeddedClient:
+    """A MongoClient stand-in that keeps every database in this process, for machines without a MongoDB server.
+
+    With `path` the documents are also written through to that SQLite file and
+    read back from it on start; without one they live only in memory (tests and
+    benchmarks). Every query is answered from memory, so the file is only
+    consistent with one client: opening it takes `path`.lock, and a second
+    client, in this process or another, gets ConnectionFailure until the first
+    is closed (or its process exits). Several processes sharing one database
+    need the MongoDB backend. Transactions are supported: with_transaction
+    holds the client lock, the only writer, and a failure restores the
+    documents it changed. Index definitions are not stored in the file;
+    schema.bootstrap recreates them on every start.
+    """
+
+    topology_description = TopologyDescription("Embedded")
+
+    def __init__(self, path=None):
+        self.path = path
+        self.databases = {}
+        self._lock = threading.RLock()
+        self._undo = None  # (collection, _id, old document) of the running transaction
+        self._connection = None
+        self._lock_handle = None
+        if path:
+            self._lock_handle = _lock_file(path + ".lock")
+            if self._lock_handle is None:
+                raise ConnectionFailure(f"{path} is already open; the embedded database allows one client at a "
+                                        f"time (use the MongoDB backend to share it between processes)")
+            self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents (database TEXT, collection TEXT, id TEXT, document TEXT, "
+                "PRIMARY KEY (database, collection, id))"
+            )
+            rows = self._connection.execute("SELECT database, collection, document FROM documents ORDER BY rowid")
+            for database, collection, document in rows:
+                document = json_util.loads(document)
+                self[database][collection]._put(document["_id"], document)
+
+    def __repr__(self):
+        return f"EmbeddedClient({self.path or 'memory'!r}, id={id(self):#x})"
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self.databases:
+                self.databases[name] = EmbeddedDatabase(self, name)
+            return self.databases[name]
+
+    def start_session(self):
+        return EmbeddedSession(self)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def _changed(self, collection, _id, old, document):
+        if self._undo is not None:
+            self._undo.append((collection, _id, old))
+        if self._connection is None:
+            return
+        key = (collection.database.name, collection.name, json_util.dumps(_id))
+        if document is None:
+            self._connection.execute("DELETE FROM documents WHERE database = ? AND collection = ? AND id = ?", key)
+        else:
+            self._connection.execute(
+                "INSERT INTO documents (database, collection, id, document) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (database, collection, id) DO UPDATE SET document = excluded.document",
+                key + (json_util.dumps(document),)
+            )
+
+    @contextmanager
+    def _batch(self):
+        """Group the SQLite writes of one bulk operation into one commit (inside a transaction: its commit)."""
+        if self._connection is None or self._undo is not None or self._connection.in_transaction:
+            yield
+            return
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self._connection.execute("COMMIT")
+
+    def _begin(self):
+        if self._undo is not None:
+            raise OperationFailure("Transaction already in progress")
+        self._undo = []
+        if self._connection is not None:
+            self._connection.execute("BEGIN")
+
+    def _commit(self):
+        self._undo = None
+        if self._connection is not None:
+            self._connection.execute("COMMIT")
+
+    def _rollback(self):
+        undo, self._undo = self._undo, None
+        for collection, _id, old in reversed(undo):
+            collection._put(_id, old)
+        if self._connection is not None:
+            self._connection.execute("ROLLBACK")
+
+
+def copy_database(source, target, collections=None):
+    """Copy the documents of `collections` (default: all) from one database handle to another, Mongo or embedded."""
+    for name in collections or source.list_collection_names():
+        documents = list(source[name].find())
+        if documents:
+            target[name].bulk_write([InsertOne(document) for document in documents], ordered=False)
+        print(f"Copied {len(documents)} documents of {name}")
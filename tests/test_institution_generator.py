@@ -0,0 +1,146 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import EmbeddedClient
+from timetable_logic import InstitutionGenerator, TimetableGenerator, find_faculty_ta_to_track
+from repository import Repository
+from reservations import ReservationStore, reservation_slot
+
+YEARS = {1: "1st Year", 2: "2nd Year"}
+
+
+def populate(db, seed=0):
+    """Two cohorts sharing a pool of instructors, rooms and labs, three sections each."""
+    rnd = random.Random(seed)
+    db["rooms"].insert_many([{"room_no": f"R{i}", "capacity": 60} for i in range(12)])
+    db["labs"].insert_many([{"lab_no": f"L{i}", "strength": 60} for i in range(4)])
+    faculty = [f"Prof{i}" for i in range(8)]
+    tas = [f"TA{i}" for i in range(6)]
+    for year, year_text in YEARS.items():
+        semester = f"Semester {2 * year - 1}"
+        for index in range(4):
+            name = f"Y{year}S{index}"
+            db["Subject_collection"].insert_one({"subject": name, "year": year_text, "semester": semester,
+                                                 "type": "Theory", "specialization": "", "faculty": rnd.choice(faculty)})
+            if index < 2:
+                db["Subject_collection"].insert_one({"subject": name, "year": year_text, "semester": semester,
+                                                     "type": "Lab", "specialization": "", "ta": rnd.choice(tas)})
+        db["strength_details"].insert_one({"year": str(year), "sections": "3", "students": "180",
+                                           "specialization": None})
+
+
+def generate_all(db):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return InstitutionGenerator(seed=1, db=db).generate_all()
+
+
+def repair(db, year, semester, subject):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return TimetableGenerator(year, semester, db=db, seed=1).repair_timetable(subject)
+
+
+class InstitutionGeneratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = EmbeddedClient()["timetable_db"]
+        populate(self.db)
+
+    def wanted(self):
+        """Reservation documents the stored timetables should hold."""
+        tracked = find_faculty_ta_to_track(list(self.db["Subject_collection"].find()))
+        store = ReservationStore(self.db)
+        return [reservation for timetable in self.db["timetable"].find()
+                for reservation in store.timetable_reservations(timetable, tracked)]
+
+    def reserved(self):
+        return {reservation_slot(doc): doc["holder"] for doc in self.db["reservations"].find()}
+
+    def assert_consistent(self):
+        """No resource is double-booked across stored timetables, and each reservation is held by its booker."""
+        wanted = self.wanted()
+        bookings = Counter(reservation_slot(reservation) for reservation in wanted)
+        self.assertEqual([key for key, count in bookings.items() if count > 1], [])
+        self.assertEqual(self.reserved(),
+                         {reservation_slot(reservation): reservation["holder"] for reservation in wanted})
+
+    def test_shrinking_sections_keeps_bookings_consistent(self):
+        generate_all(self.db)
+        self.assert_consistent()
+
+        self.db["strength_details"].update_one({"year": "1"}, {"$set": {"sections": "2", "students": "120"}})
+        Repository(self.db).invalidate()
+        generate_all(self.db)
+
+        batches = sorted(t["batch"] for t in self.db["timetable"].find({"year": 1}))
+        self.assertEqual(batches, [1, 2, 3])  # the stale batch is kept, with its own bookings
+        self.assert_consistent()
+
+    def test_repair_sees_sessions_of_a_newly_tracked_instructor(self):
+        generate_all(self.db)
+        subjects = list(self.db["Subject_collection"].find())
+        tracked = find_faculty_ta_to_track(subjects)
+        # A year 2 lecturer with one subject holds no reservations; giving them a year 1 subject tracks them
+        newcomer = next(sub["faculty"] for sub in subjects
+                        if sub["year"] == "2nd Year" and sub.get("faculty") and sub["faculty"] not in tracked)
+        self.assertEqual(self.db["reservations"].count_documents({"resource": newcomer}), 0)
+        edited = next(sub for sub in subjects if sub["year"] == "1st Year" and sub.get("faculty"))
+        self.db["Subject_collection"].update_one({"_id": edited["_id"]}, {"$set": {"faculty": newcomer}})
+        Repository(self.db).invalidate()
+
+        repair(self.db, 1, 1, edited["subject"])
+
+        # Year 2's own batches may share the newcomer's slots (they were not tracked there), but no
+        # year 1 session may land on any of them, and year 1's bookings must all be reserved by year 1
+        holders = {}
+        for reservation in self.wanted():
+            holders.setdefault(reservation_slot(reservation), []).append(reservation["holder"]["year"])
+        year_1 = {key: years for key, years in holders.items() if 1 in years}
+        self.assertEqual({key: years for key, years in year_1.items() if len(years) > 1}, {})
+        reserved = self.reserved()
+        self.assertEqual({key: reserved.get(key, {}).get("year") for key in year_1}, dict.fromkeys(year_1, 1))
+        self.assertGreater(self.db["reservations"].count_documents({"resource": newcomer}), 0)
+
+    def test_delete_releases_only_the_reservations_its_timetables_hold(self):
+        generate_all(self.db)
+        # A year 2 session in a room year 1 holds at that time, as a clash left by an older save would be
+        clash = next(doc for doc in self.db["reservations"].find({"kind": "room"}) if doc["holder"]["year"] == 1)
+        timetable = self.db["timetable"].find_one({"year": 2, "batch": 1})
+        timetable["data"][clash["day"]][clash["slot"]] = {"subject": "Y2S0", "type": "Theory", "room": clash["resource"]}
+        self.db["timetable"].update_one({"_id": timetable["_id"]}, {"$set": {"data": timetable["data"]}})
+        year_1 = {key: holder for key, holder in self.reserved().items() if holder["year"] == 1}
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            TimetableGenerator.delete_timetables(self.db, {"year": 2})
+
+        self.assertEqual(self.reserved(), year_1)
+        self.assert_consistent()
+
+    def test_conflicting_concurrent_save_is_replanned(self):
+        generate_all(self.db)
+        events = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            generators = [TimetableGenerator(1, 1, db=self.db, seed=seed, use_cache=False) for seed in (2, 3)]
+            # Both load the same reservations and versions, then save one after the other
+            inputs = [generator.load_inputs() for generator in generators]
+            results = [generator.run_attempt(loaded, generator.seed) for generator, loaded in zip(generators, inputs)]
+            generators[0].save_with_replan(results[0], inputs[0])
+            generators[1].progress = events.append
+            saved = generators[1].save_with_replan(results[1], inputs[1])
+
+        # The second save conflicts (DoubleBookingError or VersionConflictError), is re-planned, and goes in
+        self.assertEqual([event.phase for event in events], ["save", "replan", "save"])
+        stored = sorted(self.db["timetable"].find({"year": 1}), key=lambda timetable: timetable["batch"])
+        self.assertEqual([timetable["version"] for timetable in stored], [3, 3, 3])
+        self.assertEqual([timetable["data"] for timetable in stored], [timetable["data"] for timetable in saved])
+        self.assert_consistent()
+
+
+if __name__ == "__main__":
+    unittest.main()
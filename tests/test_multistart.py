@@ -0,0 +1,37 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import EmbeddedClient
+from timetable_logic import TimetableGenerator
+from multistart import run_multistart
+from test_institution_generator import populate
+
+
+class MultistartTest(unittest.TestCase):
+
+    def test_progress_is_reported_while_attempts_run(self):
+        db = EmbeddedClient()["timetable_db"]
+        populate(db)
+        events = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = TimetableGenerator(1, 1, db=db, seed=1, use_cache=False)
+            inputs = generator.load_inputs()
+            run_multistart(generator, inputs, 2, workers=2, base_seed=1, progress=events.append)
+
+        # Starting the worker processes alone takes longer than a poll, so the caller hears from
+        # the pool before any attempt is done, and more often than attempts finish
+        self.assertEqual(events[0].placed, 0)
+        self.assertGreater(len(events), 2)
+        self.assertEqual({event.phase for event in events}, {"attempt"})
+        self.assertEqual(events[-1].placed, 2)
+        self.assertIsNotNone(events[-1].best_score)
+
+
+if __name__ == "__main__":
+    unittest.main()
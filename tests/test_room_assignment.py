@@ -0,0 +1,68 @@
+import itertools
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_assignment import min_cost_assignment, match_sessions
+
+
+def best_matching(strengths, capacities):
+    """(sessions placed, empty seats) of the best assignment, by trying every one."""
+    best = None
+    options = [[None] + [index for index, capacity in enumerate(capacities) if capacity >= strength]
+               for strength in strengths]
+    for choice in itertools.product(*options):
+        used = [index for index in choice if index is not None]
+        if len(used) != len(set(used)):
+            continue
+        waste = sum(capacities[index] - strength for strength, index in zip(strengths, choice) if index is not None)
+        key = (-len(used), waste)
+        if best is None or key < best:
+            best = key
+    return -best[0], best[1]
+
+
+class MatchingTest(unittest.TestCase):
+
+    def test_min_cost_assignment_matches_brute_force(self):
+        rnd = random.Random(0)
+        for _ in range(300):
+            n = rnd.randint(1, 4)
+            m = rnd.randint(n, 6)
+            cost = [[rnd.randint(0, 20) for _ in range(m)] for _ in range(n)]
+            assignment = min_cost_assignment(cost)
+            self.assertEqual(len(set(assignment)), n)
+            self.assertEqual(sum(cost[row][column] for row, column in enumerate(assignment)),
+                             min(sum(cost[row][column] for row, column in enumerate(columns))
+                                 for columns in itertools.permutations(range(m), n)))
+
+    def test_match_sessions_places_most_sessions_with_least_waste(self):
+        rnd = random.Random(1)
+        for _ in range(300):
+            # Up to twice as many sessions as rooms, some too large for any room
+            capacities = [rnd.choice([30, 40, 60, 90]) for _ in range(rnd.randint(0, 4))]
+            strengths = [rnd.choice([25, 40, 55, 60, 100]) for _ in range(rnd.randint(1, 5))]
+            result = match_sessions(strengths, capacities)
+
+            self.assertEqual(len(result), len(strengths))
+            used = [index for index in result if index is not None]
+            self.assertEqual(len(used), len(set(used)))
+            for strength, index in zip(strengths, result):
+                if index is not None:
+                    self.assertGreaterEqual(capacities[index], strength)
+            waste = sum(capacities[index] - strength for strength, index in zip(strengths, result) if index is not None)
+            self.assertEqual((len(used), waste), best_matching(strengths, capacities), (strengths, capacities))
+
+    def test_match_sessions_leaves_sessions_without_a_room_unplaced(self):
+        # Three sessions, two rooms, and one session no room can seat
+        self.assertEqual(match_sessions([100, 50, 40], [60, 45]), [None, 0, 1])
+        self.assertEqual(match_sessions([50, 40, 30], [45]), [None, 0, None])  # best fit
+        self.assertEqual(match_sessions([20], []), [None])
+        self.assertEqual(match_sessions([], [60]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from occupancy import DAYS, TIME_SLOTS
+from scoring import WeekScore
+
+
+class WeekScoreTest(unittest.TestCase):
+
+    def test_add_and_remove_match_a_fresh_score(self):
+        rnd = random.Random(0)
+        sessions = [{"subject": subject, "type": "Theory"} for subject in ("A", "B", "C")]
+        sessions += [{"subject": "A", "type": "Tutorial"}, {"subject": "Meeting", "type": "Office"}]
+        lab = {"subject": "L", "type": "Lab"}
+        grid = {day: {slot: None for slot in TIME_SLOTS} for day in DAYS}
+        placed = []  # (session, day index, slot index, length)
+        score = WeekScore()
+
+        for _ in range(2000):
+            if placed and rnd.random() < 0.4:
+                session, d, s, length = placed.pop(rnd.randrange(len(placed)))
+                score.remove(session, d, s, length)
+                for k in range(length):
+                    grid[DAYS[d]][TIME_SLOTS[s + k]] = None
+            else:
+                session, length = (lab, 2) if rnd.random() < 0.2 else (rnd.choice(sessions), 1)
+                d, s = rnd.randrange(len(DAYS)), rnd.randrange(len(TIME_SLOTS) - length + 1)
+                if any(grid[DAYS[d]][TIME_SLOTS[s + k]] for k in range(length)):
+                    continue
+                score.add(session, d, s, length)
+                placed.append((session, d, s, length))
+                for k in range(length):
+                    grid[DAYS[d]][TIME_SLOTS[s + k]] = session
+
+            fresh = WeekScore(grid)
+            breakdown = score.breakdown()
+            for term, value in fresh.breakdown().items():
+                self.assertAlmostEqual(breakdown[term], value, msg=term)
+            self.assertAlmostEqual(score.total(), fresh.total())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import contextlib
+import gzip
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+import bson
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import EmbeddedClient
+from snapshot import (SNAPSHOT_COLLECTIONS, SNAPSHOT_FORMAT, SNAPSHOT_MAGIC, SnapshotError, export_snapshot,
+                      import_snapshot)
+from test_institution_generator import populate, generate_all
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "dataset.ttsnap")
+        self.db = EmbeddedClient()["timetable_db"]
+        populate(self.db)
+        generate_all(self.db)
+
+    def contents(self):
+        return {name: list(self.db[name].find()) for name in SNAPSHOT_COLLECTIONS}
+
+    def export(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return export_snapshot(self.db, self.path)
+
+    def restore(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return import_snapshot(self.db, self.path)
+
+    def test_round_trip_restores_every_collection(self):
+        exported = self.contents()
+        counts = self.export()
+        self.assertEqual(counts, {name: len(documents) for name, documents in exported.items()})
+
+        self.db["timetable"].delete_one({"year": 1, "batch": 1})
+        self.db["rooms"].insert_one({"room_no": "R99", "capacity": 10})
+        self.db["reservations"].delete_many({})
+
+        self.assertEqual(self.restore(), counts)
+        self.assertEqual(self.contents(), exported)
+
+    def test_truncated_file_is_rejected_before_anything_is_deleted(self):
+        self.export()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:len(data) // 2])
+        self.assert_rejected()
+
+        # Complete gzip stream, but the documents stop before the trailer
+        with gzip.open(self.path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + bson.encode({"format": SNAPSHOT_FORMAT}) + bson.encode({"$collection": "rooms"}))
+            for room in self.db["rooms"].find():
+                f.write(bson.encode(room))
+        self.assert_rejected()
+
+    def test_newer_format_is_rejected(self):
+        with gzip.open(self.path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + bson.encode({"format": SNAPSHOT_FORMAT + 1}) + bson.encode({"$end": {}}))
+        self.assert_rejected()
+
+    def assert_rejected(self):
+        before = self.contents()
+        with self.assertRaises(SnapshotError):
+            self.restore()
+        self.assertEqual(self.contents(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from occupancy import DAYS, TIME_SLOTS, BitsetOccupancy
+from solver import TimetableSolver, SchedulingError, LUNCH_SLOT_INDEX, LECTURES_PER_SUBJECT
+
+
+def cohort(theories, labs=0, tutorials=0):
+    """Subject documents: theories alternate between Prof0 and Prof1, labs and tutorials between TA0 and TA1."""
+    subjects = [{"subject": f"T{i}", "type": "Theory", "faculty": f"Prof{i % 2}"} for i in range(theories)]
+    subjects += [{"subject": f"L{i}", "type": "Lab", "ta": f"TA{i % 2}"} for i in range(labs)]
+    subjects += [{"subject": f"T{i}", "type": "Tutorial", "ta": f"TA{i % 2}"} for i in range(tutorials)]
+    return subjects
+
+
+def masks(occupancy):
+    return {name: occupancy.mask(name) for name in occupancy.names if occupancy.mask(name)}
+
+
+class TimetableSolverTest(unittest.TestCase):
+
+    def setUp(self):
+        # Prof0 and TA0 are tracked (they teach other cohorts too); Prof0 is already booked on Monday morning
+        self.tracked = {"Prof0": "Theory", "TA0": "Lab"}
+        self.occupancy = BitsetOccupancy()
+        for s in range(3):
+            self.occupancy.book("Prof0", 0, s)
+
+    def solve(self, subjects, num_batches, **kwargs):
+        solver = TimetableSolver(subjects, num_batches, self.tracked, self.occupancy, seed=1, **kwargs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return solver, solver.solve()
+
+    def test_feasible_cohort_is_fully_placed(self):
+        before = self.occupancy.copy()
+        solver, schedules = self.solve(cohort(4, labs=2, tutorials=2), 3)
+
+        self.assertTrue(solver.complete)
+        tracked_cells = Counter()
+        for schedule in schedules:
+            counts = Counter()
+            lab_days = []
+            for d, day in enumerate(DAYS):
+                theory_subjects = []
+                for s, slot in enumerate(TIME_SLOTS):
+                    cell = schedule[day][slot]
+                    if not cell:
+                        continue
+                    counts[(cell["type"], cell["subject"])] += 1
+                    if cell["instructor"] in self.tracked:
+                        tracked_cells[(cell["instructor"], d, s)] += 1
+                    if cell["type"] == "Theory":
+                        theory_subjects.append(cell["subject"])
+                    if cell["type"] == "Lab" and (s == 0 or schedule[day][TIME_SLOTS[s - 1]] != cell):
+                        # A lab is one two-slot block that does not run across lunch
+                        self.assertNotEqual(s, LUNCH_SLOT_INDEX)
+                        self.assertEqual(schedule[day][TIME_SLOTS[s + 1]], cell)
+                        lab_days.append(d)
+                self.assertEqual(len(theory_subjects), len(set(theory_subjects)))
+            self.assertEqual(len(lab_days), len(set(lab_days)))
+            self.assertEqual(counts, Counter({**{("Theory", f"T{i}"): LECTURES_PER_SUBJECT for i in range(4)},
+                                              ("Lab", "L0"): 2, ("Lab", "L1"): 2,
+                                              ("Tutorial", "T0"): 1, ("Tutorial", "T1"): 1}))
+
+        # A tracked instructor is never in two places at once, nor booked over their earlier bookings,
+        # and every one of their sessions is booked into the shared occupancy
+        self.assertEqual([key for key, count in tracked_cells.items() if count > 1], [])
+        self.assertEqual([key for key in tracked_cells if not before.is_free(*key)], [])
+        expected = before.copy()
+        for key in tracked_cells:
+            expected.book(*key)
+        self.assertEqual(masks(self.occupancy), masks(expected))
+
+    def test_impossible_cohort_leaves_the_occupancy_unchanged(self):
+        before = masks(self.occupancy)
+        # 12 subjects need 36 lectures a week, one more than there are slots; the search gives up
+        # with sessions placed, and has to take their bookings back out
+        with self.assertRaises(SchedulingError):
+            self.solve(cohort(12), 1, max_backtracks=200)
+        self.assertEqual(masks(self.occupancy), before)
+
+    def test_should_stop_returns_the_best_partial_result(self):
+        before = self.occupancy.copy()
+        solver, schedules = self.solve(cohort(12), 1, should_stop=lambda: True)
+
+        self.assertFalse(solver.complete)
+        cells = [(d, s, cell) for d, day in enumerate(DAYS) for s, slot in enumerate(TIME_SLOTS)
+                 for cell in [schedules[0][day][slot]] if cell]
+        self.assertEqual(len(cells), solver.best_placed)
+        self.assertGreater(len(cells), 30)
+        self.assertLess(len(cells), 12 * LECTURES_PER_SUBJECT)
+        # The partial result's tracked sessions, and only those, are booked
+        expected = before.copy()
+        for d, s, cell in cells:
+            if cell["instructor"] in self.tracked:
+                expected.book(cell["instructor"], d, s)
+        self.assertEqual(masks(self.occupancy), masks(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+
+from storage import EmbeddedClient, DUPLICATE_KEY
+
+
+class EmbeddedClientTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "timetable.sqlite3")
+        self.client = self.open()
+
+    def open(self):
+        client = EmbeddedClient(self.path)
+        self.addCleanup(client.close)
+        return client
+
+    def reopen(self):
+        self.client.close()
+        self.client = self.open()
+        return self.client["timetable_db"]
+
+    def test_unique_index_rejects_duplicates(self):
+        rooms = self.client["timetable_db"]["rooms"]
+        rooms.create_index([("room_no", 1)], name="room_no", unique=True)
+        rooms.insert_one({"room_no": "R1", "capacity": 60})
+
+        with self.assertRaises(DuplicateKeyError):
+            rooms.insert_one({"room_no": "R1", "capacity": 40})
+        rooms.update_one({"room_no": "R2"}, {"$set": {"capacity": 30}}, upsert=True)
+        with self.assertRaises(DuplicateKeyError):
+            rooms.update_one({"room_no": "R2"}, {"$set": {"room_no": "R1"}})
+        with self.assertRaises(BulkWriteError) as raised:
+            rooms.bulk_write([InsertOne({"room_no": "R3"}), InsertOne({"room_no": "R1"})], ordered=False)
+        self.assertEqual([(error["index"], error["code"]) for error in raised.exception.details["writeErrors"]],
+                         [(1, DUPLICATE_KEY)])
+        self.assertEqual(sorted(room["room_no"] for room in rooms.find()), ["R1", "R2", "R3"])
+
+    def test_with_transaction_rolls_back_on_error(self):
+        db = self.client["timetable_db"]
+        db["timetable"].insert_one({"batch": 1, "version": 1})
+
+        def write(session):
+            db["timetable"].update_one({"batch": 1}, {"$set": {"version": 2}}, session=session)
+            db["timetable"].bulk_write([InsertOne({"batch": 2}), UpdateOne({"batch": 2}, {"$unset": {"batch": ""}})],
+                                       session=session)
+            db["timetable"].delete_one({"batch": 1}, session=session)
+            raise RuntimeError("interrupted")
+
+        with self.client.start_session() as session, self.assertRaises(RuntimeError):
+            session.with_transaction(write)
+
+        expected = [{"batch": 1, "version": 1}]
+        self.assertEqual(list(db["timetable"].find({}, {"_id": 0})), expected)
+        self.assertEqual(list(self.reopen()["timetable"].find({}, {"_id": 0})), expected)
+
+    def test_reload_from_the_sqlite_file(self):
+        db = self.client["timetable_db"]
+        ids = db["rooms"].insert_many([{"room_no": f"R{i}", "capacity": 60} for i in range(3)])
+        db["rooms"].update_one({"room_no": "R1"}, {"$set": {"capacity": 30}})
+        db["rooms"].delete_one({"room_no": "R2"})
+        db["labs"].insert_one({"lab_no": "L1", "strength": {"batch": [1, 2]}})
+
+        db = self.reopen()
+        self.assertEqual(list(db["rooms"].find()), [{"_id": ids[0], "room_no": "R0", "capacity": 60},
+                                                    {"_id": ids[1], "room_no": "R1", "capacity": 30}])
+        self.assertEqual(db["labs"].find_one({"lab_no": "L1"}, {"_id": 0}),
+                         {"lab_no": "L1", "strength": {"batch": [1, 2]}})
+
+    def test_file_is_locked_to_one_client(self):
+        with self.assertRaises(ConnectionFailure):
+            EmbeddedClient(self.path)
+        self.client.close()
+        self.open()["timetable_db"]["rooms"].insert_one({"room_no": "R1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
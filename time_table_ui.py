@@ -6,7 +6,7 @@ from PyQt6.QtGui import QFont, QColor, QBrush, QPixmap, QPainter, QPageSize, QPa
 from PyQt6.QtCore import Qt, QMarginsF
 from PyQt6.QtPrintSupport import QPrinter
 import sys
-import pymongo
+from repository import Repository
 
 class TimetableSelectionDialog(QDialog):
     """Dialog to select batch, year, semester, and specialization before showing the timetable"""
@@ -176,10 +176,6 @@ class Timetable(QWidget):
     def populate_table(self):
         """Fetch and display timetable from MongoDB"""
         try:
-            client = pymongo.MongoClient("mongodb://localhost:27017/")
-            db = client["timetable_db"]
-            collection = db["timetable"]
-
             YEAR_MAPPING = {"First": 1, "Second": 2, "Third": 3, "Final": 4}
             SEMESTER_MAPPING = {str(i): i for i in range(1, 9)}
 
@@ -195,15 +191,13 @@ class Timetable(QWidget):
                 query["specialization"] = "None"
 
             print(f"Fetching timetable with query: {query}")
-            timetable_data = collection.find_one(query)
+            data = Repository().timetable_data(query)
 
-            if not timetable_data:
+            if data is None:
                 print(f"No timetable found for Year {year}, Semester {semester}, Batch {batch}, Specialization {self.specialization}")
                 QMessageBox.warning(self, "No Data", f"No timetable found for Batch {batch}, {self.year} Year - Semester {semester}, Specialization {self.specialization}")
                 return
 
-            data = timetable_data.get("data", {})
-
             self.table.clearContents()
 
             for day, sessions in data.items():
@@ -1,7 +1,102 @@
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QComboBox, QPushButton,QMessageBox
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QComboBox, QPushButton,QMessageBox, QProgressDialog, QApplication
 from PyQt6.QtCore import pyqtSignal
-import pymongo,random
+import random
 import traceback
+import time
+import hashlib
+import json
+from pymongo import DeleteOne
+from solver import TimetableSolver, SchedulingError, GenerationCancelled, GenerationIncomplete
+from occupancy import DAYS, TIME_SLOTS
+from room_assignment import VectorizedRoomAssigner, MatchingRoomAssigner, HAS_NUMPY
+from multistart import run_multistart
+from annealing import ScheduleAnnealer
+from problem import ProblemModel
+from feasibility import feasibility_problems, InfeasibleInputError
+from backends import get_backend
+from scoring import evaluate_timetables
+from progress import ProgressEvent, CancellationToken
+from database import get_db
+from repository import Repository
+from schema import bootstrap
+from persistence import persist, timetable_upserts, timetable_identity, VersionConflictError
+from reservations import ReservationStore, DoubleBookingError, book_reservations, release_reservations
+from snapshot import take_snapshot
+
+GENERATION_ATTEMPTS = 8  # seeded attempts per Generate click; the best-scoring one is saved
+GENERATION_TIME_BUDGET = 30  # seconds
+SAVE_ATTEMPTS = 3  # saves per generation; after a conflicting concurrent save the clashing sessions are re-planned
+
+
+def find_faculty_ta_to_track(all_subjects):
+    """Faculty/TAs teaching multiple subjects or across years/specializations, mapped to their subject type."""
+    faculty_ta_counts = {}
+
+    for subject in all_subjects:
+        year = subject["year"]
+        specialization = subject.get("specialization", "None")
+        subject_name = subject["subject"]
+        subject_type = subject["type"]
+        instructor = subject.get("faculty", subject.get("ta", "N/A"))
+
+        if instructor == "N/A":
+            continue
+
+        key = (instructor, subject_type)
+        if key not in faculty_ta_counts:
+            faculty_ta_counts[key] = []
+        faculty_ta_counts[key].append({
+            "subject": subject_name,
+            "year": year,
+            "specialization": specialization
+        })
+
+    faculty_ta_to_track = {}
+    for (instructor, subject_type), assignments in faculty_ta_counts.items():
+        subjects = set(assignment["subject"] for assignment in assignments)
+        year_spec_pairs = set((assignment["year"], assignment["specialization"]) for assignment in assignments)
+
+        if len(subjects) > 1 or len(year_spec_pairs) > 1:
+            faculty_ta_to_track[instructor] = subject_type
+
+    return faculty_ta_to_track
+
+
+def unroomed_sessions(timetables):
+    """The timetables with only their sessions that have no room or lab, for place_rooms_and_labs.
+
+    The cells are shared, so the rooms and labs assigned land in `timetables`.
+    """
+    return [
+        {
+            "batch_strength": timetable["batch_strength"],
+            "data": {
+                day: {
+                    slot: cell if cell and not cell.get("room") and not cell.get("lab") else None
+                    for slot, cell in slots.items()
+                }
+                for day, slots in timetable["data"].items()
+            }
+        }
+        for timetable in timetables
+    ]
+
+
+def report_saved(timetables, claims, releases, moves, atomic):
+    """Log what one persist() call of a generation wrote."""
+    print(f"Saved {len(timetables)} timetables, {len(claims)} new, {len(moves)} moved and {len(releases)} released "
+          f"reservations{' in one transaction' if atomic else ' (standalone server, no transaction)'}.")
+
+
+def parse_cohort(year_text, semester_text, specialization=None):
+    """Map Subject_collection fields ("3rd Year", "Semester 5", "AI") to generator arguments, or None."""
+    year = {"1st Year": 1, "2nd Year": 2, "3rd Year": 3, "4th Year": 4}.get(year_text)
+    semester = str(semester_text or "").replace("Semester", "").strip()
+    if year is None or not semester.isdigit():
+        return None
+    # Only 3rd and 4th year timetables are split by specialization
+    spec = specialization or None if year in [3, 4] else None
+    return year, int(semester), spec
 
 
 class TimetableDialog(QDialog):
@@ -42,6 +137,11 @@ class TimetableDialog(QDialog):
             self.generate_button.clicked.connect(self.generate_timetable)
             layout.addWidget(self.generate_button)
 
+            # Generate every cohort in one run
+            self.generate_all_button = QPushButton("Generate All Timetables")
+            self.generate_all_button.clicked.connect(self.generate_all_timetables)
+            layout.addWidget(self.generate_all_button)
+
             self.setLayout(layout)
 
             # Now connect the signal
@@ -105,10 +205,29 @@ class TimetableDialog(QDialog):
     def generate_timetable(self):
         """Trigger timetable generation when button is clicked"""
         year, semester, selected_spec = self.get_selected_year_sem()  # Get year & semester as integers
+        self.snapshot_before_generation()
+
+        progress_dialog = QProgressDialog("Generating timetable...", "Cancel", 0, 0, self)
+        progress_dialog.setWindowTitle("Generating")
+        progress_dialog.setMinimumDuration(0)
+        cancel_token = CancellationToken()
+
+        def show_progress(event):
+            """Update the progress dialog; Cancel stops the search and keeps the best result so far"""
+            if event.total:
+                progress_dialog.setMaximum(event.total)
+                progress_dialog.setValue(min(event.placed or 0, event.total))
+            batch_note = f" (batch {event.batch})" if event.batch else ""
+            progress_dialog.setLabelText(f"Generating timetable: {event.phase}{batch_note}")
+            QApplication.processEvents()
+            if progress_dialog.wasCanceled():
+                cancel_token.cancel()
 
         try:
-            generator = TimetableGenerator(year, semester , selected_spec)
-            timetable = generator.generate_timetable()  # Store generated timetable
+            generator = TimetableGenerator(year, semester , selected_spec, attempts=GENERATION_ATTEMPTS,
+                                           time_budget=GENERATION_TIME_BUDGET)
+            timetable = generator.generate_timetable(progress=show_progress, cancel_token=cancel_token)
+            progress_dialog.close()
 
             if timetable:
                 QMessageBox.information(
@@ -121,50 +240,184 @@ class TimetableDialog(QDialog):
                     self, "No Data", 
                     "No subjects or faculty data found for the selected year and semester."
                 )
+        except GenerationIncomplete as e:
+            progress_dialog.close()
+            confirm = QMessageBox.question(
+                self, "Timetable Incomplete",
+                f"Generation stopped before it finished and {e.unassigned} sessions are unassigned. "
+                f"The stored timetables were not changed.\n\nSave the incomplete timetable anyway?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if confirm == QMessageBox.StandardButton.Yes and generator.save_partial_result():
+                QMessageBox.warning(
+                    self, "Saved Incomplete",
+                    f"Timetable for Year {year}, Semester {semester} saved with {e.unassigned} sessions unassigned."
+                )
+                self.timetable_generated.emit()
+        except GenerationCancelled as e:
+            progress_dialog.close()
+            QMessageBox.warning(self, "Cancelled", str(e))
         except Exception as e:
+            progress_dialog.close()
             print(f"{e}")
             QMessageBox.critical(
                 self, "Error", f"An error occurred while generating the timetable:\n{str(e)}"
             )
 
+    def snapshot_before_generation(self):
+        """Snapshot the dataset so a generation can be rolled back (python snapshot.py restore); never blocks it"""
+        try:
+            take_snapshot(get_db())
+        except Exception as e:
+            print(f"Could not snapshot the dataset before generating: {e}")
+
+    def generate_all_timetables(self):
+        """Generate timetables for every year, semester and specialization in one run"""
+        self.snapshot_before_generation()
+        try:
+            timetables = InstitutionGenerator().generate_all()
+
+            if timetables:
+                cohorts = {(t["year"], t["semester"], t["specialization"]) for t in timetables}
+                QMessageBox.information(
+                    self, "Success",
+                    f"Generated {len(timetables)} timetables for {len(cohorts)} cohorts!"
+                )
+                self.timetable_generated.emit()
+            else:
+                QMessageBox.warning(
+                    self, "No Data",
+                    "No cohorts with both subjects and strength details were found."
+                )
+        except Exception as e:
+            print(f"{e}")
+            QMessageBox.critical(
+                self, "Error", f"An error occurred while generating the timetables:\n{str(e)}"
+            )
+
 
 class TimetableGenerator:
 
-    def __init__(self, year, semester, specialization=None):
+    def __init__(self, year, semester, specialization=None, engine="solver", seed=None, room_assignment="matching",
+                 db=None, attempts=1, workers=None, time_budget=None, use_cache=True, anneal=False,
+                 anneal_iterations=20000, anneal_time_budget=None):
         self.year = year
         self.semester = semester
         self.specialization = specialization
+        self.engine = engine  # name of a registered backend (backends.BACKENDS): "solver" or "greedy"
+        self.seed = seed
+        self.room_assignment = room_assignment  # "matching" (best fit per slot), "vectorized" (numpy) or "loop"
+        self.attempts = attempts  # > 1 runs seeded attempts on a process pool and keeps the best
+        self.workers = workers  # pool size, defaults to the number of cores
+        self.time_budget = time_budget  # seconds for the whole generation; the best result so far is kept
+        self.use_cache = use_cache  # return the stored timetables when the input fingerprint is unchanged
+        self.anneal = anneal  # run the simulated-annealing improvement pass on each attempt
+        self.anneal_iterations = anneal_iterations
+        self.anneal_time_budget = anneal_time_budget  # seconds, per attempt
+        self.stored_timetables = []
+        self.deadline = None  # wall-clock time.time() at which the running generation stops
+        self.cancel_token = None  # progress.CancellationToken of the running generation
+        self.progress = None  # callable receiving ProgressEvent objects
+        self.complete = True  # False when the last search stopped before placing every batch
+        self.partial_result = None  # (result, inputs) of a stopped generation, kept unsaved for save_partial_result
         print(f"Generator initialized with Year: {year}, Semester: {semester}, Specialization: {specialization}")
-        self.client = pymongo.MongoClient("mongodb://localhost:27017/")
-        self.db = self.client["timetable_db"]
+        if db is None:
+            db = get_db()
+        self.db = db
+        bootstrap(db)
+        self.repository = Repository(db)
+        self.reservations = ReservationStore(db)
         self.timetable = {}
 
+    def __getstate__(self):
+        # Multi-start workers receive the generator without its database handle, callback or token;
+        # they get a token of their own from the pool (the deadline is kept)
+        state = dict(self.__dict__)
+        state.pop("db", None)
+        state.pop("repository", None)
+        state.pop("reservations", None)
+        state["progress"] = None
+        state["cancel_token"] = None
+        return state
+
+    def should_stop(self):
+        """True once the generation's time budget is spent or its cancellation token has fired."""
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            return True
+        return self.deadline is not None and time.time() > self.deadline
+
+    def report(self, phase, **fields):
+        if self.progress is not None:
+            self.progress(ProgressEvent(phase, **fields))
+
+    def subject_query(self):
+        """Subject_collection filter for this cohort."""
+        # Map year to match DB format
+        year_map = {
+            "1": "1st Year",
+            "2": "2nd Year",
+            "3": "3rd Year",
+            "4": "4th Year"
+        }
+        year_str = year_map.get(str(self.year), f"{self.year} Year")
+
+        # Convert semester value to DB format if needed
+        semester_str = f"Semester {self.semester}"  # Match "Semester 1" style
+
+        # Build query
+        query = {"year": year_str, "semester": semester_str}
+        if self.specialization and self.specialization != "None":  # Only add if specialization is provided and not "None"
+            query["specialization"] = self.specialization
+        return query
+
+    def strength_query(self):
+        """strength_details filter for this cohort's year and specialization."""
+        strength_query = {"year": str(self.year)}
+        if self.year in [3, 4] and self.specialization and self.specialization != "None":
+            strength_query["specialization"] = self.specialization
+        else:
+            strength_query["specialization"] = None
+        return strength_query
+
+    def label(self):
+        """Human-readable name of this cohort for messages."""
+        spec = self.stored_specialization()
+        return f"Year {self.year} Semester {self.semester}" + (f" ({spec})" if spec != "None" else "")
+
+    def stored_specialization(self):
+        """Specialization value stored on this cohort's timetable documents."""
+        if self.year in [3, 4] and self.specialization and self.specialization != "None":
+            return self.specialization
+        return "None"
+
+    def build_timetables(self, schedules, total_students, batch_strength):
+        """Wrap per-batch weekly schedules into timetable documents."""
+        timetables = []
+        for batch, weekly_schedule in enumerate(schedules, start=1):
+            batch_timetable = {
+                "year": self.year,
+                "semester": self.semester,
+                "batch": batch,
+                "specialization": self.stored_specialization(),
+                "total_students": total_students,
+                "batch_strength": batch_strength,
+                "data": weekly_schedule
+            }
+            timetables.append(batch_timetable)
+        return timetables
+
     def fetch_data(self):
         """Fetch all required data from the database with proper formatting and error handling."""
         try:
-            self.rooms = list(self.db["rooms"].find())
-            self.labs = list(self.db["labs"].find())
-
-            # Map year to match DB format
-            year_map = {
-                "1": "1st Year",
-                "2": "2nd Year",
-                "3": "3rd Year",
-                "4": "4th Year"
-            }
-            year_str = year_map.get(str(self.year), f"{self.year} Year")
-
-            # Convert semester value to DB format if needed
-            semester_str = f"Semester {self.semester}"  # Match "Semester 1" style
+            self.rooms = self.repository.room_documents()
+            self.labs = self.repository.lab_documents()
 
-            # Build query
-            query = {"year": year_str, "semester": semester_str}
-            if self.specialization and self.specialization != "None":  # Only add if specialization is provided and not "None"
-                query["specialization"] = self.specialization
+            query = self.subject_query()
+            year_str, semester_str = query["year"], query["semester"]
 
             print(f"Fetching subjects with query: {query}")
 
-            self.subjects = list(self.db["Subject_collection"].find(query))
+            self.subjects = self.repository.subject_documents(query)
 
             # Debug: Print fetched subjects to verify
             print(f"Fetched subjects: {[sub for sub in self.subjects]}")
@@ -181,100 +434,165 @@ class TimetableGenerator:
 
         return True
 
+    @staticmethod
     def delete_timetable(db, year, semester, batch, specialization):
-        """Delete a timetable and update room, lab, and faculty/TA occupancy."""
+        """Delete a timetable and release its room, lab, and faculty/TA reservations."""
+        timetable_query = {
+            "year": year,  # Integer, e.g., 3
+            "semester": semester,  # Integer, e.g., 5
+            "batch": batch,  # Integer, e.g., 1
+            "specialization": specialization if specialization != "None" else "None"  # String, e.g., "AI"
+        }
+        return TimetableGenerator.delete_timetables(db, timetable_query) > 0
+
+    @staticmethod
+    def delete_timetables(db, query):
+        """Delete the timetables matching `query` (a batch, a cohort or {}) and the reservations they hold;
+        returns the number deleted (0 when none matched or on error)."""
         try:
-            # Step 1: Fetch all timetables to debug the structure
-            all_timetables = list(db["timetable"].find())
-            print("All timetables in database:", all_timetables)
-
-            # Step 2: Construct the query with correct types
-            timetable_query = {
-                "year": year,  # Integer, e.g., 3
-                "semester": semester,  # Integer, e.g., 5
-                "batch": batch,  # Integer, e.g., 1
-                "specialization": specialization if specialization != "None" else "None"  # String, e.g., "AI"
-            }
-            print(f"Fetching timetable with query: {timetable_query}")
-            timetable_data = db["timetable"].find_one(timetable_query)
-
-            if not timetable_data:
-                print(f"No timetable found for {timetable_query}")
-                return False
-
-            # Step 3: Update room and lab occupancy
-            room_lab_occupancy_collection = db["room_lab_occupancy"]
-            room_lab_occupancy = room_lab_occupancy_collection.find_one() or {
-                day: {slot: {"rooms": [], "labs": []} for slot in [
-                    "9:30 - 10:30", "10:30 - 11:30", "11:30 - 12:30",
-                    "1:30 - 2:30", "2:30 - 3:30", "3:30 - 4:30", "4:30 - 5:30"
-                ]} for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-            }
+            print(f"Fetching timetables with query: {query}")
+            timetables = list(db["timetable"].find(query, {"_id": 1, "year": 1, "semester": 1, "batch": 1,
+                                                           "specialization": 1}))
+            if not timetables:
+                print(f"No timetable found for {query}")
+                return 0
+
+            releases = ReservationStore(db).held(timetables)
+            persist(db, [DeleteOne({"_id": timetable_data["_id"]}) for timetable_data in timetables],
+                    releases=releases)
+            print(f"Deleted {len(timetables)} timetables for {query} and released their reservations")
+            return len(timetables)
 
-            for day, slots in timetable_data.get("data", {}).items():
-                for slot, session in slots.items():
-                    if session and session["type"] in ["Theory", "Tutorial"]:
-                        room = session.get("room")
-                        if room and day in room_lab_occupancy and slot in room_lab_occupancy[day]:
-                            if room in room_lab_occupancy[day][slot]["rooms"]:
-                                room_lab_occupancy[day][slot]["rooms"].remove(room)
-                    elif session and session["type"] == "Lab":
-                        lab = session.get("lab")
-                        if lab and day in room_lab_occupancy and slot in room_lab_occupancy[day]:
-                            if lab in room_lab_occupancy[day][slot]["labs"]:
-                                room_lab_occupancy[day][slot]["labs"].remove(lab)
-
-            room_lab_occupancy_collection.update_one(
-                {}, {"$set": room_lab_occupancy}, upsert=True
-            )
-            print(f"Updated room_lab_occupancy for deleted timetable: {timetable_query}")
-
-            # Step 4: Update faculty and TA occupancy
-            faculty_ta_occupancy_collection = db["faculty_ta_occupancy"]
-            faculty_ta_occupancy = faculty_ta_occupancy_collection.find_one() or {
-                day: {slot: [] for slot in [
-                    "9:30 - 10:30", "10:30 - 11:30", "11:30 - 12:30",
-                    "1:30 - 2:30", "2:30 - 3:30", "3:30 - 4:30", "4:30 - 5:30"
-                ]} for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-            }
+        except Exception as e:
+            print(f"Error deleting timetable: {e}")
+            return 0
 
-            for day, slots in timetable_data.get("data", {}).items():
-                for slot, session in slots.items():
-                    if session and "instructor" in session:
-                        instructor = session["instructor"]
-                        if day in faculty_ta_occupancy and slot in faculty_ta_occupancy[day]:
-                            if instructor in faculty_ta_occupancy[day][slot]:
-                                faculty_ta_occupancy[day][slot].remove(instructor)
+    def generate_timetable(self, progress=None, cancel_token=None, save_partial=False):
+        """Generate and save the timetable; a stopped search raises GenerationIncomplete unless `save_partial`."""
+        self.progress = progress
+        self.cancel_token = cancel_token
+        self.deadline = time.time() + self.time_budget if self.time_budget else None
+
+        self.report("load")
+        inputs = self.load_inputs()
+        if inputs is None:
+            return None
+
+        fingerprint = self.input_fingerprint(inputs)
+        if self.use_cache:
+            cached = self.cached_timetables(fingerprint, inputs["num_batches"])
+            if cached:
+                print(f"Inputs unchanged since the last run (fingerprint {fingerprint[:12]}); returning stored timetables.")
+                self.report("done", placed=len(cached), total=inputs["num_batches"])
+                return cached
+
+        self.report("feasibility")
+        self.check_feasibility(inputs)
+        if self.should_stop():
+            raise GenerationCancelled("Generation was cancelled before scheduling started.")
+
+        if self.attempts > 1:
+            result = run_multistart(self, inputs, self.attempts, workers=self.workers, base_seed=self.seed,
+                                    cancel_token=cancel_token, progress=progress)
+        else:
+            result = self.run_attempt(inputs, self.seed)
+
+        report = evaluate_timetables(result[0], inputs["subjects"], result[1], inputs["faculty_ta_to_track"],
+                                     inputs["rooms"], inputs["labs"])
+        if not self.complete and not save_partial:
+            self.partial_result = (result, inputs)
+            self.report("done", placed=len(result[0]), total=inputs["num_batches"], best_score=report["total"])
+            print(f"Generation stopped early with {report['unassigned']} sessions unassigned; nothing was saved.")
+            raise GenerationIncomplete(
+                f"Generation stopped before it finished: {report['unassigned']} sessions are unassigned. "
+                f"The stored timetables were left unchanged.", result[0], report["unassigned"])
+        if report["unassigned"] == 0:
+            # Partial results saved on request are never served from the cache
+            for timetable in result[0]:
+                timetable["input_fingerprint"] = fingerprint
+        timetables = self.save_with_replan(result, inputs)
+        self.report("done", placed=len(result[0]), total=inputs["num_batches"], best_score=report["total"])
+        return timetables
 
-            faculty_ta_occupancy_collection.update_one(
-                {}, {"$set": faculty_ta_occupancy}, upsert=True
+    def save_with_replan(self, result, inputs):
+        """save_result, re-planning around a concurrent save up to SAVE_ATTEMPTS times; returns the timetables."""
+        for save_attempt in range(1, SAVE_ATTEMPTS + 1):
+            self.report("save")
+            try:
+                return self.save_result(result[0])
+            except (DoubleBookingError, VersionConflictError) as e:
+                if save_attempt == SAVE_ATTEMPTS:
+                    raise
+                print(f"Save conflicted with another generation ({e}); re-planning the affected sessions.")
+                self.report("replan")
+                result = self.replan_conflicts(result[0], inputs)
+
+    def save_partial_result(self):
+        """Save the result a stopped generation kept unsaved (see generate_timetable); returns the timetables."""
+        if self.partial_result is None:
+            return None
+        result, inputs = self.partial_result
+        self.partial_result = None
+        return self.save_with_replan(result, inputs)
+
+    def check_feasibility(self, inputs):
+        """Refuse to schedule when capacity or load bounds show this cohort cannot fit (InfeasibleInputError)."""
+        model = ProblemModel(inputs["subjects"], inputs["faculty_ta_to_track"], inputs["faculty_ta_occupancy"],
+                             inputs["rooms"], inputs["labs"])
+        problems = feasibility_problems(
+            [(self.label(), model, inputs["num_batches"], inputs["batch_strength"])],
+            inputs["faculty_ta_occupancy"], inputs["room_occupancy"], inputs["lab_occupancy"]
+        )
+        if problems:
+            print(f"Feasibility check failed: {problems}")
+            raise InfeasibleInputError("This timetable cannot be generated:\n" + "\n".join(problems))
+
+    def input_fingerprint(self, inputs):
+        """Hash of everything that determines this cohort's result: subjects, strength, rooms, labs,
+        the occupancy held by other cohorts, and the generation settings."""
+        def plain(docs):
+            return sorted(
+                json.dumps({k: v for k, v in doc.items() if k != "_id"}, sort_keys=True, default=str)
+                for doc in docs
             )
-            print(f"Updated faculty_ta_occupancy for deleted timetable: {timetable_query}")
 
-            # Step 5: Delete the timetable entry
-            db["timetable"].delete_one(timetable_query)
-            print(f"Timetable deleted for {timetable_query}")
-            return True
+        def masks(occupancy):
+            return sorted((name, mask) for name, mask in zip(occupancy.names, occupancy.masks) if mask)
+
+        payload = {
+            "subjects": plain(inputs["subjects"]),
+            "strength": [inputs["num_batches"], inputs["total_students"]],
+            "tracked": sorted(inputs["faculty_ta_to_track"]),
+            "rooms": plain(inputs["rooms"]),
+            "labs": plain(inputs["labs"]),
+            "faculty_ta_occupancy": masks(inputs["faculty_ta_occupancy"]),
+            "room_occupancy": masks(inputs["room_occupancy"]),
+            "lab_occupancy": masks(inputs["lab_occupancy"]),
+            "settings": [self.engine, self.seed, self.room_assignment, self.attempts,
+                         self.anneal and (self.anneal_iterations, self.anneal_time_budget)]
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
 
-        except Exception as e:
-            print(f"Error deleting timetable: {e}")
-            return False
+    def cached_timetables(self, fingerprint, num_batches):
+        """Stored timetables of this cohort if every batch was generated from the same inputs, else None."""
+        stored = sorted(self.stored_timetables, key=lambda timetable: timetable["batch"])
+        if [timetable["batch"] for timetable in stored] != list(range(1, num_batches + 1)):
+            return None
+        if any(timetable.get("input_fingerprint") != fingerprint for timetable in stored):
+            return None
+        return stored
 
-    def generate_timetable(self):
-        """Generate and save the timetable ensuring no faculty/TA conflicts across batches, years, or specializations."""
+    def load_inputs(self):
+        """Read everything one attempt needs from the database into a plain (picklable) dict."""
         if not self.fetch_data():
             print("Failed to generate timetable due to missing data.")
             return None
 
         # Fetch strength details for the given year and specialization
-        strength_query = {"year": str(self.year)}
-        if self.year in [3, 4] and self.specialization and self.specialization != "None":
-            strength_query["specialization"] = self.specialization
-        else:
-            strength_query["specialization"] = None
+        strength_query = self.strength_query()
 
         print(f"Fetching strength details with query: {strength_query}")
-        strength_info = self.db["strength_details"].find_one(strength_query)
+        strength_info = self.repository.strength_document(strength_query)
 
         if not strength_info:
             print(f"No section details found for year {self.year}, specialization {self.specialization or 'None'}.")
@@ -284,518 +602,430 @@ class TimetableGenerator:
 
         num_batches = int(strength_info["sections"])
         total_students = int(strength_info["students"])
-        batch_strength = round(total_students / num_batches)
-
-        time_slots = [
-            "9:30 - 10:30", "10:30 - 11:30", "11:30 - 12:30",
-            "1:30 - 2:30", "2:30 - 3:30", "3:30 - 4:30", "4:30 - 5:30"
-        ]
-
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
 
         # Identify faculty and TAs teaching multiple subjects or across specializations/years
-        all_subjects = list(self.db["Subject_collection"].find())
-        faculty_ta_counts = {}
-
-        for subject in all_subjects:
-            year = subject["year"]
-            specialization = subject.get("specialization", "None")
-            subject_name = subject["subject"]
-            subject_type = subject["type"]
-            instructor = subject.get("faculty", subject.get("ta", "N/A"))
-
-            if instructor == "N/A":
-                continue
-
-            key = (instructor, subject_type)
-            if key not in faculty_ta_counts:
-                faculty_ta_counts[key] = []
-            faculty_ta_counts[key].append({
-                "subject": subject_name,
-                "year": year,
-                "specialization": specialization
-            })
-
-        faculty_ta_to_track = {}
-        for (instructor, subject_type), assignments in faculty_ta_counts.items():
-            subjects = set(assignment["subject"] for assignment in assignments)
-            year_spec_pairs = set((assignment["year"], assignment["specialization"]) for assignment in assignments)
-
-            if len(subjects) > 1 or len(year_spec_pairs) > 1:
-                faculty_ta_to_track[instructor] = subject_type
+        all_subjects = self.repository.subject_documents()
+        faculty_ta_to_track = find_faculty_ta_to_track(all_subjects)
 
         print(f"Faculty/TA to track for conflicts: {faculty_ta_to_track}")
 
-        # Initialize or update the faculty_ta_occupancy collection
-        faculty_ta_occupancy_collection = self.db["faculty_ta_occupancy"]
-        faculty_ta_occupancy = {day: {slot: set() for slot in time_slots} for day in days}
-
-        existing_occupancy = faculty_ta_occupancy_collection.find_one()
-        if existing_occupancy:
-            for day in days:
-                for slot in time_slots:
-                    faculty_ta_occupancy[day][slot] = set(existing_occupancy.get(day, {}).get(slot, []))
-
-        timetables = []
-
-        if self.year in [3, 4] and self.specialization and self.specialization != "None":
-            spec = self.specialization
-
-            for batch in range(1, num_batches + 1):
-                weekly_schedule = {day: {slot: None for slot in time_slots} for day in days}
-
-                lab_subjects = [sub for sub in self.subjects if sub["type"] == "Lab"]
-                assigned_labs = set()
-
-                for lab in lab_subjects:
-                    assigned = False
-                    attempts = 0
-                    ta = lab.get("ta", "N/A")
-                    while not assigned and attempts < 100:
-                        day = random.choice(days)
-                        slot_index = random.randint(0, len(time_slots) - 2)
-
-                        ta_conflict = (
-                            ta in faculty_ta_to_track and
-                            (ta in faculty_ta_occupancy[day][time_slots[slot_index]] or
-                            ta in faculty_ta_occupancy[day][time_slots[slot_index + 1]])
-                        )
-
-                        if (slot_index != 2 and
-                            not weekly_schedule[day][time_slots[slot_index]] and 
-                            not weekly_schedule[day][time_slots[slot_index + 1]] and
-                            not ta_conflict and
-                            lab["subject"] not in assigned_labs and
-                            not any(s and s.get("type") == "Lab" for s in weekly_schedule[day].values())):
-                            
-                            weekly_schedule[day][time_slots[slot_index]] = {
-                                "subject": lab["subject"],
-                                "type": "Lab",
-                                "instructor": ta
-                            }
-                            weekly_schedule[day][time_slots[slot_index + 1]] = {
-                                "subject": lab["subject"],
-                                "type": "Lab",
-                                "instructor": ta
-                            }
-                            
-                            if ta in faculty_ta_to_track:
-                                faculty_ta_occupancy[day][time_slots[slot_index]].add(ta)
-                                faculty_ta_occupancy[day][time_slots[slot_index + 1]].add(ta)
-                            
-                            assigned_labs.add(lab["subject"])
-                            assigned = True
-                        attempts += 1
-
-                    if not assigned:
-                        print(f"Warning: Could not assign lab {lab['subject']} for batch {batch}, specialization {spec}.")
-
-                tutorial_subjects = [sub for sub in self.subjects if sub["type"] == "Tutorial"]
-
-                for tutorial in tutorial_subjects:
-                    assigned = False
-                    attempts = 0
-                    ta = tutorial.get("ta", "N/A")
-                    while not assigned and attempts < 100:
-                        day = random.choice(days)
-                        slot = random.choice(time_slots)
-
-                        ta_conflict = (
-                            ta in faculty_ta_to_track and
-                            ta in faculty_ta_occupancy[day][slot]
-                        )
-
-                        if not weekly_schedule[day][slot] and not ta_conflict:
-                            weekly_schedule[day][slot] = {
-                                "subject": tutorial["subject"],
-                                "type": "Tutorial",
-                                "instructor": ta
-                            }
-                            if ta in faculty_ta_to_track:
-                                faculty_ta_occupancy[day][slot].add(ta)
-                            assigned = True
-                        attempts += 1
-
-                    if not assigned:
-                        print(f"Warning: Could not assign tutorial {tutorial['subject']} for batch {batch}, specialization {spec}.")
-
-                theory_subjects = [sub for sub in self.subjects if sub["type"] == "Theory"]
-                subject_counts = {sub["subject"]: 0 for sub in theory_subjects}
-
-                for day in days:
-                    lecture_count = 0
-                    for slot_index, slot in enumerate(time_slots):
-                        if not weekly_schedule[day][slot]:
-                            available_subjects = [
-                                sub for sub in theory_subjects 
-                                if subject_counts[sub["subject"]] < 3 and 
-                                sub["subject"] not in [s["subject"] for s in weekly_schedule[day].values() if s] and
-                                sub["subject"] not in [s["subject"] for s in weekly_schedule[day].values() if s and s["type"] == "Theory"]
-                            ]
-
-                            available_subjects = [
-                                sub for sub in available_subjects
-                                if not (sub.get("faculty", "N/A") in faculty_ta_to_track and (
-                                    sub.get("faculty", "N/A") in faculty_ta_occupancy[day][slot] or
-                                    (slot_index > 0 and sub.get("faculty", "N/A") in faculty_ta_occupancy[day][time_slots[slot_index - 1]]) or
-                                    (slot_index < len(time_slots) - 1 and sub.get("faculty", "N/A") in faculty_ta_occupancy[day][time_slots[slot_index + 1]])
-                                ))
-                            ]
-                            
-                            if available_subjects and lecture_count < 3:
-                                subject = random.choice(available_subjects)
-                                faculty = subject.get("faculty", "N/A")
-                                weekly_schedule[day][slot] = {
-                                    "subject": subject["subject"],
-                                    "type": "Theory",
-                                    "instructor": faculty
-                                }
-                                subject_counts[subject["subject"]] += 1
-                                lecture_count += 1
-
-                                if faculty in faculty_ta_to_track:
-                                    faculty_ta_occupancy[day][slot].add(faculty)
-                            elif lecture_count >= 3:
-                                weekly_schedule[day][slot] = {"subject": "Office Hour", "type": "Office"}
-
-                    if lecture_count < 3:
-                        print(f"Warning: Less than 3 lectures assigned on {day} for batch {batch}, specialization {spec}.")
-
-                for day in days:
-                    if all(slot is None for slot in weekly_schedule[day].values()):
-                        slot = random.choice(time_slots)
-                        available_subjects = [
-                            sub for sub in theory_subjects if subject_counts[sub["subject"]] < 3
-                            if not (sub.get("faculty", "N/A") in faculty_ta_to_track and
-                                    sub.get("faculty", "N/A") in faculty_ta_occupancy[day][slot])
-                        ]
-                        if available_subjects:
-                            subject = random.choice(available_subjects)
-                            faculty = subject.get("faculty", "N/A")
-                            weekly_schedule[day][slot] = {
-                                "subject": subject["subject"],
-                                "type": "Theory",
-                                "instructor": faculty
-                            }
-                            subject_counts[subject["subject"]] += 1
-                            if faculty in faculty_ta_to_track:
-                                faculty_ta_occupancy[day][slot].add(faculty)
-
-                for day in days:
-                    for slot in time_slots[3:]:
-                        if not weekly_schedule[day][slot]:
-                            for sub in theory_subjects:
-                                if subject_counts[sub["subject"]] < 3:
-                                    faculty = sub.get("faculty", "N/A")
-                                    if not (faculty in faculty_ta_to_track and faculty in faculty_ta_occupancy[day][slot]):
-                                        weekly_schedule[day][slot] = {
-                                            "subject": sub["subject"],
-                                            "type": "Theory",
-                                            "instructor": faculty
-                                        }
-                                        subject_counts[sub["subject"]] += 1
-                                        if faculty in faculty_ta_to_track:
-                                            faculty_ta_occupancy[day][slot].add(faculty)
-                                        break
-
-                batch_timetable = {
-                    "year": self.year,
-                    "semester": self.semester,
-                    "batch": batch,
-                    "specialization": spec,
-                    "total_students": total_students,
-                    "batch_strength": batch_strength,
-                    "data": weekly_schedule
-                }
-                timetables.append(batch_timetable)
-
-        else:
-            for batch in range(1, num_batches + 1):
-                weekly_schedule = {day: {slot: None for slot in time_slots} for day in days}
-
-                lab_subjects = [sub for sub in self.subjects if sub["type"] == "Lab"]
-                assigned_labs = set()
-
-                for lab in lab_subjects:
-                    assigned = False
-                    attempts = 0
-                    ta = lab.get("ta", "N/A")
-                    while not assigned and attempts < 100:
-                        day = random.choice(days)
-                        slot_index = random.randint(0, len(time_slots) - 2)
-
-                        ta_conflict = (
-                            ta in faculty_ta_to_track and
-                            (ta in faculty_ta_occupancy[day][time_slots[slot_index]] or
-                            ta in faculty_ta_occupancy[day][time_slots[slot_index + 1]])
-                        )
-
-                        if (slot_index != 2 and
-                            not weekly_schedule[day][time_slots[slot_index]] and 
-                            not weekly_schedule[day][time_slots[slot_index + 1]] and
-                            not ta_conflict and
-                            lab["subject"] not in assigned_labs and
-                            not any(s and s.get("type") == "Lab" for s in weekly_schedule[day].values())):
-                            
-                            weekly_schedule[day][time_slots[slot_index]] = {
-                                "subject": lab["subject"],
-                                "type": "Lab",
-                                "instructor": ta
-                            }
-                            weekly_schedule[day][time_slots[slot_index + 1]] = {
-                                "subject": lab["subject"],
-                                "type": "Lab",
-                                "instructor": ta
-                            }
-                            
-                            if ta in faculty_ta_to_track:
-                                faculty_ta_occupancy[day][time_slots[slot_index]].add(ta)
-                                faculty_ta_occupancy[day][time_slots[slot_index + 1]].add(ta)
-                            
-                            assigned_labs.add(lab["subject"])
-                            assigned = True
-                        attempts += 1
-
-                    if not assigned:
-                        print(f"Warning: Could not assign lab {lab['subject']} for batch {batch}.")
-
-                tutorial_subjects = [sub for sub in self.subjects if sub["type"] == "Tutorial"]
-
-                for tutorial in tutorial_subjects:
-                    assigned = False
-                    attempts = 0
-                    ta = tutorial.get("ta", "N/A")
-                    while not assigned and attempts < 100:
-                        day = random.choice(days)
-                        slot = random.choice(time_slots)
-
-                        ta_conflict = (
-                            ta in faculty_ta_to_track and
-                            ta in faculty_ta_occupancy[day][slot]
-                        )
-
-                        if not weekly_schedule[day][slot] and not ta_conflict:
-                            weekly_schedule[day][slot] = {
-                                "subject": tutorial["subject"],
-                                "type": "Tutorial",
-                                "instructor": ta
-                            }
-                            if ta in faculty_ta_to_track:
-                                faculty_ta_occupancy[day][slot].add(ta)
-                            assigned = True
-                        attempts += 1
-
-                    if not assigned:
-                        print(f"Warning: Could not assign tutorial {tutorial['subject']} for batch {batch}.")
-
-                theory_subjects = [sub for sub in self.subjects if sub["type"] == "Theory"]
-                subject_counts = {sub["subject"]: 0 for sub in theory_subjects}
-
-                for day in days:
-                    lecture_count = 0
-                    for slot_index, slot in enumerate(time_slots):
-                        if not weekly_schedule[day][slot]:
-                            available_subjects = [
-                                sub for sub in theory_subjects 
-                                if subject_counts[sub["subject"]] < 3 and 
-                                sub["subject"] not in [s["subject"] for s in weekly_schedule[day].values() if s] and
-                                sub["subject"] not in [s["subject"] for s in weekly_schedule[day].values() if s and s["type"] == "Theory"]
-                            ]
-
-                            available_subjects = [
-                                sub for sub in available_subjects
-                                if not (sub.get("faculty", "N/A") in faculty_ta_to_track and (
-                                    sub.get("faculty", "N/A") in faculty_ta_occupancy[day][slot] or
-                                    (slot_index > 0 and sub.get("faculty", "N/A") in faculty_ta_occupancy[day][time_slots[slot_index - 1]]) or
-                                    (slot_index < len(time_slots) - 1 and sub.get("faculty", "N/A") in faculty_ta_occupancy[day][time_slots[slot_index + 1]])
-                                ))
-                            ]
-                            
-                            if available_subjects and lecture_count < 3:
-                                subject = random.choice(available_subjects)
-                                faculty = subject.get("faculty", "N/A")
-                                weekly_schedule[day][slot] = {
-                                    "subject": subject["subject"],
-                                    "type": "Theory",
-                                    "instructor": faculty
-                                }
-                                subject_counts[subject["subject"]] += 1
-                                lecture_count += 1
-
-                                if faculty in faculty_ta_to_track:
-                                    faculty_ta_occupancy[day][slot].add(faculty)
-                            elif lecture_count >= 3:
-                                weekly_schedule[day][slot] = {"subject": "Office Hour", "type": "Office"}
-
-                    if lecture_count < 3:
-                        print(f"Warning: Less than 3 lectures assigned on {day} for batch {batch}.")
-
-                for day in days:
-                    if all(slot is None for slot in weekly_schedule[day].values()):
-                        slot = random.choice(time_slots)
-                        available_subjects = [
-                            sub for sub in theory_subjects if subject_counts[sub["subject"]] < 3
-                            if not (sub.get("faculty", "N/A") in faculty_ta_to_track and
-                                    sub.get("faculty", "N/A") in faculty_ta_occupancy[day][slot])
-                        ]
-                        if available_subjects:
-                            subject = random.choice(available_subjects)
-                            faculty = subject.get("faculty", "N/A")
-                            weekly_schedule[day][slot] = {
-                                "subject": subject["subject"],
-                                "type": "Theory",
-                                "instructor": faculty
-                            }
-                            subject_counts[subject["subject"]] += 1
-                            if faculty in faculty_ta_to_track:
-                                faculty_ta_occupancy[day][slot].add(faculty)
-
-                for day in days:
-                    for slot in time_slots[3:]:
-                        if not weekly_schedule[day][slot]:
-                            for sub in theory_subjects:
-                                if subject_counts[sub["subject"]] < 3:
-                                    faculty = sub.get("faculty", "N/A")
-                                    if not (faculty in faculty_ta_to_track and faculty in faculty_ta_occupancy[day][slot]):
-                                        weekly_schedule[day][slot] = {
-                                            "subject": sub["subject"],
-                                            "type": "Theory",
-                                            "instructor": faculty
-                                        }
-                                        subject_counts[sub["subject"]] += 1
-                                        if faculty in faculty_ta_to_track:
-                                            faculty_ta_occupancy[day][slot].add(faculty)
-                                        break
-
-                batch_timetable = {
-                    "year": self.year,
-                    "semester": self.semester,
-                    "batch": batch,
-                    "specialization": "None",
-                    "total_students": total_students,
-                    "batch_strength": batch_strength,
-                    "data": weekly_schedule
-                }
-                timetables.append(batch_timetable)
-
-        self.assign_rooms_and_labs(timetables)
+        # Load the reservations into a bitset per instructor, room and lab
+        self.faculty_ta_to_track = faculty_ta_to_track
+        faculty_ta_occupancy, room_occupancy, lab_occupancy = self.load_occupancy(num_batches)
+
+        return {
+            "subjects": self.subjects,
+            "num_batches": num_batches,
+            "total_students": total_students,
+            "batch_strength": round(total_students / num_batches),
+            "faculty_ta_to_track": faculty_ta_to_track,
+            "faculty_ta_occupancy": faculty_ta_occupancy,
+            "rooms": self.rooms,
+            "labs": self.labs,
+            "room_occupancy": room_occupancy,
+            "lab_occupancy": lab_occupancy
+        }
 
+    def load_occupancy(self, num_batches):
+        """Occupancy without the reservations of the first `num_batches` stored batches (self.held), plus
+        stored sessions of newly tracked instructors (self.backfill, claimed by save_result)."""
+        cohort_query = {"year": self.year, "semester": self.semester, "specialization": self.stored_specialization()}
+        self.stored_timetables = list(self.db["timetable"].find(cohort_query))
+        self.held = self.reservations.held(
+            [timetable for timetable in self.stored_timetables if timetable["batch"] <= num_batches]
+        )
+        reserved = self.reservations.load()
+        instructors = {sub[field] for sub in self.subjects for field in ("faculty", "ta")
+                       if sub.get(field) in self.faculty_ta_to_track}
+        self.backfill = self.reservations.unreserved(
+            reserved[0], instructors,
+            skip=lambda timetable: (all(timetable.get(key) == value for key, value in cohort_query.items())
+                                    and timetable.get("batch", 0) <= num_batches))
+        occupancies = tuple(occupancy.copy() for occupancy in reserved)
+        release_reservations(occupancies, self.held)
+        book_reservations(occupancies, self.backfill)
+        return occupancies
+
+    def run_attempt(self, inputs, seed):
+        """One seeded generation attempt; works on copies of the occupancy and never touches the database.
+
+        Returns (timetables, faculty_ta_occupancy, room_occupancy, lab_occupancy).
+        """
+        random.seed(seed)
+        self.seed = seed
+        self.subjects = inputs["subjects"]
+        faculty_ta_occupancy = inputs["faculty_ta_occupancy"].copy()
+        room_occupancy = inputs["room_occupancy"].copy()
+        lab_occupancy = inputs["lab_occupancy"].copy()
+        num_batches = inputs["num_batches"]
+
+        # Compile the documents into dense ids once; every phase below shares it
+        model = ProblemModel(self.subjects, inputs["faculty_ta_to_track"], faculty_ta_occupancy,
+                             inputs["rooms"], inputs["labs"])
+
+        backend = get_backend(self.engine)
         try:
-            for timetable in timetables:
-                print(f"Saving timetable entry: {timetable}")
-                self.db["timetable"].update_one(
-                    {"year": timetable["year"], "semester": timetable["semester"], "batch": timetable["batch"], "specialization": timetable["specialization"]},
-                    {"$set": timetable},
-                    upsert=True
-                )
-            print("Timetable generated and updated successfully for all batches!")
+            schedules = backend.schedule([(self.label(), model, num_batches)], inputs["faculty_ta_to_track"],
+                                         faculty_ta_occupancy, seed=seed, should_stop=self.should_stop,
+                                         progress=self.progress)[0]
+        except SchedulingError as e:
+            print(f"Failed to generate timetable: {e}")
+            raise
+        self.complete = backend.complete
+        print(backend.summary)
+
+        if self.anneal and not self.should_stop():
+            time_budget = self.anneal_time_budget
+            if self.deadline is not None:
+                remaining = max(0, self.deadline - time.time())
+                time_budget = remaining if time_budget is None else min(time_budget, remaining)
+            annealer = ScheduleAnnealer(inputs["faculty_ta_to_track"], faculty_ta_occupancy, seed=seed,
+                                        iterations=self.anneal_iterations, time_budget=time_budget,
+                                        should_stop=self.should_stop, progress=self.progress)
+            initial_cost, final_cost = annealer.improve(schedules)
+            print(f"Annealing reduced the schedule penalty from {initial_cost:.1f} to {final_cost:.1f}.")
+
+        timetables = self.build_timetables(schedules, inputs["total_students"], inputs["batch_strength"])
+
+        self.report("rooms")
+        self.place_rooms_and_labs(timetables, inputs["rooms"], inputs["labs"], room_occupancy, lab_occupancy, model)
+
+        report = evaluate_timetables(timetables, self.subjects, faculty_ta_occupancy, inputs["faculty_ta_to_track"],
+                                     inputs["rooms"], inputs["labs"])
+        print(f"Timetable quality: {report}")
+
+        return timetables, faculty_ta_occupancy, room_occupancy, lab_occupancy
+
+    def save_result(self, timetables):
+        """Save the timetables with their reservation changes in one persist() call; returns the timetables."""
+        try:
+            wanted = [reservation for timetable in timetables
+                      for reservation in self.reservations.timetable_reservations(timetable, self.faculty_ta_to_track)]
+            claims, releases, moves = self.reservations.changes(self.held, wanted)
+            claims += self.backfill
+            versions = {timetable_identity(stored): stored.get("version") for stored in self.stored_timetables}
+            atomic = persist(self.db, timetable_upserts(timetables, versions), claims, releases, moves)
+            report_saved(timetables, claims, releases, moves, atomic)
+        except (DoubleBookingError, VersionConflictError) as e:
+            print(f"Error saving timetable to database: {e}")
+            raise
         except Exception as e:
             print(f"Error saving timetable to database: {e}")
             return None
 
-        try:
-            faculty_ta_occupancy_for_db = {
-                day: {slot: list(instructors) for slot, instructors in day_slots.items()}
-                for day, day_slots in faculty_ta_occupancy.items()
-            }
-            faculty_ta_occupancy_collection.update_one(
-                {}, {"$set": faculty_ta_occupancy_for_db}, upsert=True
-            )
-            print("Faculty/TA occupancy updated successfully!")
-        except Exception as e:
-            print(f"Error saving faculty/TA occupancy: {e}")
-
         return timetables
 
-    def assign_rooms_and_labs(self, timetables):
-        """Assign classrooms and labs to each lecture and lab in the timetable."""
-        # Define time slots and days
-        time_slots = [
-            "9:30 - 10:30", "10:30 - 11:30", "11:30 - 12:30",
-            "1:30 - 2:30", "2:30 - 3:30", "3:30 - 4:30", "4:30 - 5:30"
-        ]
-
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-
-        # Fetch room and lab details from the database
-        rooms = list(self.db["rooms"].find())
-        labs = list(self.db["labs"].find())
-
-        # Debug: Log available rooms and labs
-        print(f"Available rooms: {[room for room in rooms]}")
-        print(f"Available labs: {[lab for lab in labs]}")
-
-        # Initialize occupancy tracking
-        occupancy_collection = self.db["room_lab_occupancy"]
-        occupancy = occupancy_collection.find_one() or {day: {slot: {"rooms": [], "labs": []} for slot in time_slots} for day in days}
-
-        for timetable in timetables:
-            # Use the pre-calculated batch strength from the timetable
-            batch_strength = timetable["batch_strength"]
-            print(f"Assigning rooms/labs for batch_strength: {batch_strength}")
-
-            for day, slots in timetable["data"].items():
-                for slot_index, slot in enumerate(time_slots):
-                    session = slots.get(slot)
-                    if session and session["type"] == "Lab":
-                        # Ensure two consecutive slots are available in the same lab
-                        if slot_index < len(time_slots) - 1:
-                            next_slot = time_slots[slot_index + 1]
-                            next_session = slots.get(next_slot)
-                            if next_session and next_session["type"] == "Lab":
-                                assigned_lab = None
-                                available_labs = [
-                                    lab for lab in labs
-                                    if lab.get("strength", 0) >= batch_strength  # Use "strength" for labs
-                                    and lab["lab_no"] not in occupancy[day][slot]["labs"]
-                                    and lab["lab_no"] not in occupancy[day][next_slot]["labs"]
-                                ]
-                                print(f"Available labs for {session['subject']} on {day} at {slot}: {available_labs}")
-                                if available_labs:
-                                    lab = random.choice(available_labs)
-                                    assigned_lab = lab["lab_no"]
-                                    occupancy[day][slot]["labs"].append(assigned_lab)
-                                    occupancy[day][next_slot]["labs"].append(assigned_lab)
-                                    session["lab"] = assigned_lab
-                                    next_session["lab"] = assigned_lab
-                                else:
-                                    print(f"Warning: No available lab for {session['subject']} on {day} at {slot} and {next_slot} with capacity >= {batch_strength}.")
-
-                    elif session and session["type"] in ["Theory", "Tutorial"]:
-                        # Assign a classroom
-                        assigned_room = None
-                        available_rooms = [
-                            room for room in rooms
-                            if room.get("capacity", 0) >= batch_strength
-                            and room["room_no"] not in occupancy[day][slot]["rooms"]
-                        ]
-                        print(f"Available rooms for {session['subject']} on {day} at {slot}: {available_rooms}")
-                        if available_rooms:
-                            room = random.choice(available_rooms)
-                            assigned_room = room["room_no"]
-                            occupancy[day][slot]["rooms"].append(assigned_room)
-                            session["room"] = assigned_room
-                        else:
-                            print(f"Warning: No available room for {session['subject']} on {day} at {slot} with capacity >= {batch_strength}.")
-
-        # Update the occupancy collection
-        occupancy_collection.update_one(
-            {},
-            {"$set": occupancy},
-            upsert=True
+    def replan_conflicts(self, timetables, inputs):
+        """Re-place the sessions of an unsaved result that clash with the reservations saved since; returns a result."""
+        faculty_ta_occupancy, room_occupancy, lab_occupancy = self.load_occupancy(inputs["num_batches"])
+
+        solver = TimetableSolver(inputs["subjects"], inputs["num_batches"], inputs["faculty_ta_to_track"],
+                                 faculty_ta_occupancy, seed=self.seed)
+        schedules, changed = solver.repair([timetable["data"] for timetable in timetables])
+
+        # Rooms and labs taken in the meantime are dropped (a lab for its whole session) before booking the rest
+        taken = set()
+        for schedule in schedules:
+            for day_index, day in enumerate(DAYS):
+                for slot_index, slot in enumerate(TIME_SLOTS):
+                    cell = schedule.get(day, {}).get(slot)
+                    if cell and cell.get("room") and not room_occupancy.is_free(cell["room"], day_index, slot_index):
+                        taken.add(id(cell))
+                    if cell and cell.get("lab") and not lab_occupancy.is_free(cell["lab"], day_index, slot_index):
+                        taken.add((id(schedule), day, cell["subject"]))
+        moved = 0
+        for schedule in schedules:
+            for day_index, day in enumerate(DAYS):
+                for slot_index, slot in enumerate(TIME_SLOTS):
+                    cell = schedule.get(day, {}).get(slot)
+                    if not cell:
+                        continue
+                    if id(cell) in taken or (cell.get("lab") and (id(schedule), day, cell["subject"]) in taken):
+                        cell.pop("room", None)
+                        cell.pop("lab", None)
+                        moved += 1
+                    elif cell.get("room"):
+                        room_occupancy.book(cell["room"], day_index, slot_index)
+                    elif cell.get("lab"):
+                        lab_occupancy.book(cell["lab"], day_index, slot_index)
+
+        replanned = []
+        for timetable, schedule in zip(timetables, schedules):
+            timetable = {key: value for key, value in timetable.items() if key != "input_fingerprint"}
+            timetable["data"] = schedule
+            replanned.append(timetable)
+        self.place_rooms_and_labs(unroomed_sessions(replanned), inputs["rooms"], inputs["labs"], room_occupancy,
+                                  lab_occupancy)
+
+        print(f"Re-planned batches {[replanned[index]['batch'] for index in sorted(changed)]} and "
+              f"{moved} room/lab bookings against the latest reservations.")
+        return replanned, faculty_ta_occupancy, room_occupancy, lab_occupancy
+
+    def repair_timetable(self, changed_subject=None):
+        """Repair this cohort's stored timetables after a subject edit, moving only sessions that became invalid.
+
+        Returns the rewritten timetable documents (empty when nothing changed), or
+        None when the cohort has no stored timetables. Raises SchedulingError when
+        the invalid sessions cannot be re-placed.
+        """
+        cohort_query = {"year": self.year, "semester": self.semester, "specialization": self.stored_specialization()}
+        stored = sorted(self.db["timetable"].find(cohort_query), key=lambda timetable: timetable["batch"])
+        if not stored:
+            return None
+        print(f"Repairing {len(stored)} stored timetables for {cohort_query} after editing {changed_subject or 'subjects'}")
+
+        all_subjects = self.repository.subject_documents()
+        self.subjects = self.repository.subject_documents(self.subject_query())
+        faculty_ta_to_track = find_faculty_ta_to_track(all_subjects)
+
+        # Only the instructors this cohort books, before or after the edit, are read and can change:
+        # their reservations without this cohort's own are the bookings the repair has to fit around
+        instructors = {session["instructor"] for timetable in stored for slots in timetable["data"].values()
+                       for session in slots.values() if session and session.get("instructor")}
+        instructors |= {sub[field] for sub in self.subjects for field in ("faculty", "ta")
+                        if sub.get(field) in faculty_ta_to_track}
+        reserved_faculty = self.reservations.load(kinds=("faculty_ta",), resources=instructors)[0]
+        held = self.reservations.held(stored)
+        # An instructor tracked only since the edit has no reservations for the sessions in other cohorts;
+        # book them from the stored timetables, so the repair moves around them and the save reserves them
+        backfill = self.reservations.unreserved(
+            reserved_faculty, instructors & set(faculty_ta_to_track),
+            skip=lambda timetable: all(timetable.get(key) == value for key, value in cohort_query.items()))
+        faculty_ta_occupancy = reserved_faculty.copy()
+        release_reservations((faculty_ta_occupancy, None, None), held)
+        book_reservations((faculty_ta_occupancy, None, None), backfill)
+
+        solver = TimetableSolver(self.subjects, len(stored), faculty_ta_to_track, faculty_ta_occupancy, seed=self.seed)
+        try:
+            schedules, changed = solver.repair([timetable["data"] for timetable in stored])
+        except SchedulingError as e:
+            print(f"Failed to repair timetable: {e}")
+            raise
+
+        room_occupancy, lab_occupancy = self.reservations.load(kinds=("room", "lab"))[1:]
+        repaired = []
+        for batch_index in sorted(changed):
+            timetable = stored[batch_index]
+            kept = {id(cell) for slots in schedules[batch_index].values() for cell in slots.values() if cell}
+            # Rooms and labs of dropped or moved sessions go back to the pool
+            for day_index, day in enumerate(DAYS):
+                for slot_index, slot in enumerate(TIME_SLOTS):
+                    cell = timetable["data"].get(day, {}).get(slot)
+                    if not cell or id(cell) in kept:
+                        continue
+                    if cell.get("room"):
+                        room_occupancy.release(cell["room"], day_index, slot_index)
+                    if cell.get("lab"):
+                        lab_occupancy.release(cell["lab"], day_index, slot_index)
+            timetable["data"] = schedules[batch_index]
+            repaired.append(timetable)
+
+        # Only sessions without a room or lab (the re-placed ones) go through room assignment
+        self.place_rooms_and_labs(unroomed_sessions(repaired), self.repository.room_documents(),
+                                  self.repository.lab_documents(), room_occupancy, lab_occupancy)
+
+        versions = {timetable_identity(timetable): timetable.get("version") for timetable in repaired}
+        for timetable in repaired:
+            timetable.pop("input_fingerprint", None)
+
+        # The repaired batches are written back in `stored`; the others hold what they held
+        wanted = [reservation for timetable in stored
+                  for reservation in self.reservations.timetable_reservations(timetable, faculty_ta_to_track)]
+        claims, releases, moves = self.reservations.changes(held, wanted)
+        claims += backfill
+        persist(self.db, timetable_upserts(repaired, versions), claims, releases, moves)
+
+        print(f"Repaired batches {[timetable['batch'] for timetable in repaired]}; "
+              f"{len(claims) + len(releases) + len(moves)} reservations updated.")
+        return repaired
+
+    def place_rooms_and_labs(self, timetables, rooms, labs, room_occupancy, lab_occupancy, model=None):
+        """Assign rooms and labs in memory, booking them into the given occupancy bitsets."""
+        time_slots = TIME_SLOTS
+        days = DAYS
+        if model is None:
+            model = ProblemModel(rooms=rooms, labs=labs)
+
+        if self.room_assignment == "matching":
+            MatchingRoomAssigner(model, room_occupancy, lab_occupancy).assign(timetables)
+        elif self.room_assignment == "vectorized" and HAS_NUMPY:
+            VectorizedRoomAssigner(model, room_occupancy, lab_occupancy).assign(timetables)
+        else:
+            room_names, room_capacity = model.room_names, model.room_capacity
+            lab_names, lab_capacity = model.lab_names, model.lab_capacity
+            for timetable in timetables:
+                # Use the pre-calculated batch strength from the timetable
+                batch_strength = timetable["batch_strength"]
+                print(f"Assigning rooms/labs for batch_strength: {batch_strength}")
+                room_fits = [index for index, capacity in enumerate(room_capacity) if capacity >= batch_strength]
+                lab_fits = [index for index, capacity in enumerate(lab_capacity) if capacity >= batch_strength]
+
+                for day, slots in timetable["data"].items():
+                    day_index = days.index(day)
+                    for slot_index, slot in enumerate(time_slots):
+                        session = slots.get(slot)
+                        if session and session["type"] == "Lab":
+                            # Ensure two consecutive slots are available in the same lab
+                            if slot_index < len(time_slots) - 1:
+                                next_slot = time_slots[slot_index + 1]
+                                next_session = slots.get(next_slot)
+                                if next_session and next_session["type"] == "Lab":
+                                    available_labs = [
+                                        index for index in lab_fits
+                                        if lab_occupancy.is_free_window(lab_names[index], day_index, slot_index)
+                                    ]
+                                    print(f"Available labs for {session['subject']} on {day} at {slot}: {[lab_names[index] for index in available_labs]}")
+                                    if available_labs:
+                                        assigned_lab = lab_names[random.choice(available_labs)]
+                                        lab_occupancy.book(assigned_lab, day_index, slot_index, 2)
+                                        session["lab"] = assigned_lab
+                                        next_session["lab"] = assigned_lab
+                                    else:
+                                        print(f"Warning: No available lab for {session['subject']} on {day} at {slot} and {next_slot} with capacity >= {batch_strength}.")
+
+                        elif session and session["type"] in ["Theory", "Tutorial"]:
+                            # Assign a classroom
+                            available_rooms = [
+                                index for index in room_fits
+                                if room_occupancy.is_free(room_names[index], day_index, slot_index)
+                            ]
+                            print(f"Available rooms for {session['subject']} on {day} at {slot}: {[room_names[index] for index in available_rooms]}")
+                            if available_rooms:
+                                assigned_room = room_names[random.choice(available_rooms)]
+                                room_occupancy.book(assigned_room, day_index, slot_index)
+                                session["room"] = assigned_room
+                            else:
+                                print(f"Warning: No available room for {session['subject']} on {day} at {slot} with capacity >= {batch_strength}.")
+
+
+class InstitutionGenerator:
+    """Generate the timetables of every cohort (year, semester, specialization) in one run.
+
+    The dataset is read once, every cohort is scheduled against one shared
+    in-memory occupancy in one backend call, and the results are written back
+    in a single pass.
+    """
+
+    def __init__(self, semesters=None, engine="solver", seed=None, room_assignment="matching", db=None):
+        self.semesters = set(semesters) if semesters else None  # restrict to these semester numbers
+        self.engine = engine
+        self.seed = seed
+        self.room_assignment = room_assignment
+        if db is None:
+            db = get_db()
+        self.db = db
+        bootstrap(db)
+
+    def load_dataset(self):
+        """Read rooms, labs, subjects, strength details, timetables and both occupancy documents once."""
+        repository = Repository(self.db)
+        self.rooms = repository.room_documents()
+        self.labs = repository.lab_documents()
+        self.all_subjects = repository.subject_documents()
+        self.strength_details = repository.strength_documents()
+        self.existing_timetables = list(self.db["timetable"].find())
+        self.reservations = ReservationStore(self.db)
+        self.reserved = self.reservations.load()
+        self.faculty_ta_occupancy, self.room_occupancy, self.lab_occupancy = (
+            occupancy.copy() for occupancy in self.reserved
         )
 
+    def cohort_generators(self):
+        """One TimetableGenerator (sharing this db) per distinct cohort found in the subjects."""
+        keys = set()
+        for sub in self.all_subjects:
+            cohort = parse_cohort(sub.get("year"), sub.get("semester"), sub.get("specialization"))
+            if cohort is None or (self.semesters and cohort[1] not in self.semesters):
+                continue
+            keys.add(cohort)
 
+        return [
+            TimetableGenerator(year, semester, spec, engine=self.engine, seed=self.seed,
+                               room_assignment=self.room_assignment, db=self.db)
+            for year, semester, spec in sorted(keys, key=lambda key: (key[0], key[1], key[2] or ""))
+        ]
 
+    def generate_all(self):
+        """Generate, assign rooms for and save every cohort; return all timetable documents."""
+        self.load_dataset()
+        if not self.rooms:
+            print("No rooms found in the database.")
+            return None
 
+        faculty_ta_to_track = find_faculty_ta_to_track(self.all_subjects)
+        plan = []
+        for generator in self.cohort_generators():
+            query = generator.subject_query()
+            generator.subjects = [
+                sub for sub in self.all_subjects if all(sub.get(key) == value for key, value in query.items())
+            ]
+            strength = generator.strength_query()
+            strength_info = next(
+                (row for row in self.strength_details
+                 if row.get("year") == strength["year"] and row.get("specialization") == strength["specialization"]),
+                None
+            )
+            if not strength_info:
+                print(f"No section details found for year {generator.year}, specialization "
+                      f"{generator.specialization or 'None'}; skipping semester {generator.semester}.")
+                continue
+            num_batches = int(strength_info["sections"])
+            total_students = int(strength_info["students"])
+            plan.append((generator, num_batches, total_students, round(total_students / num_batches)))
 
+        if not plan:
+            print("No cohorts with both subjects and strength details were found.")
+            return None
 
-       
-               
-
-
-
+        # Reservations held by the batches we are about to replace go back to the pool; batches above a
+        # cohort's new section count stay stored, so they keep theirs (as in load_occupancy)
+        batch_counts = {(generator.year, generator.semester, generator.stored_specialization()): num_batches
+                        for generator, num_batches, *_ in plan}
+
+        def replaced(timetable_data):
+            key = (timetable_data.get("year"), timetable_data.get("semester"), timetable_data.get("specialization"))
+            return key in batch_counts and timetable_data.get("batch", 0) <= batch_counts[key]
+
+        self.faculty_ta_to_track = faculty_ta_to_track
+        self.held = self.reservations.held([timetable for timetable in self.existing_timetables if replaced(timetable)])
+        # Stored sessions of instructors tracked since they were saved get their reservations now
+        self.backfill = self.reservations.unreserved(self.reserved[0], set(faculty_ta_to_track),
+                                                     timetables=self.existing_timetables, skip=replaced)
+        occupancies = (self.faculty_ta_occupancy, self.room_occupancy, self.lab_occupancy)
+        release_reservations(occupancies, self.held)
+        book_reservations(occupancies, self.backfill)
+
+        cohorts = [
+            (generator.label(),
+             ProblemModel(generator.subjects, faculty_ta_to_track, self.faculty_ta_occupancy, self.rooms, self.labs),
+             num_batches, batch_strength)
+            for generator, num_batches, _, batch_strength in plan
+        ]
+        problems = feasibility_problems(cohorts, self.faculty_ta_occupancy, self.room_occupancy, self.lab_occupancy)
+        if problems:
+            print(f"Feasibility check failed: {problems}")
+            raise InfeasibleInputError("The timetables cannot be generated:\n" + "\n".join(problems))
 
+        backend = get_backend(self.engine)
+        all_schedules = backend.schedule(
+            [(label, model, num_batches) for (label, model, num_batches, _) in cohorts],
+            faculty_ta_to_track, self.faculty_ta_occupancy, seed=self.seed)
+        print(backend.summary)
 
+        timetables = []
+        for (generator, _, total_students, batch_strength), schedules in zip(plan, all_schedules):
+            timetables.extend(generator.build_timetables(schedules, total_students, batch_strength))
 
+        plan[0][0].place_rooms_and_labs(timetables, self.rooms, self.labs, self.room_occupancy, self.lab_occupancy)
+        self.save(timetables)
+        return timetables
 
+    def save(self, timetables):
+        """Upsert every timetable and claim/release the changed reservations in one persist() call."""
+        wanted = [reservation for timetable in timetables
+                  for reservation in self.reservations.timetable_reservations(timetable, self.faculty_ta_to_track)]
+        claims, releases, moves = self.reservations.changes(self.held, wanted)
+        claims += self.backfill
+        versions = {timetable_identity(stored): stored.get("version") for stored in self.existing_timetables}
+        atomic = persist(self.db, timetable_upserts(timetables, versions), claims, releases, moves)
+        report_saved(timetables, claims, releases, moves, atomic)